@@ -0,0 +1,145 @@
+import os
+import json
+import numpy as np
+
+# Deterministic candlestick pattern engine (NumPy).
+# Computes the same reversal signals the vision prompt asks Gemini for,
+# straight from OHLCV arrays. All functions take 2D arrays shaped
+# (n_symbols, n_candles), oldest -> newest, so a whole batch of symbols is
+# scored with a handful of vectorized ops.
+#
+# Used by the DecisionEngine as a pre-gate (reject obvious non-setups before
+# rendering + model call) and as the fallback score when the model is down.
+
+LOCAL_PATTERN_MIN_SCORE = float(os.getenv("LOCAL_PATTERN_MIN_SCORE", 0.2))
+
+HIGH_LOOKBACK = 12 # Candles used to decide whether a candle is "at the highs"
+STRUCTURE_WINDOW = 16 # 15m candles (4h) searched for HH -> LH
+TAG_THRESHOLD = 0.5
+
+# Weight of each signal in the combined score (same tags as the vision prompt)
+PATTERN_WEIGHTS = {
+    "blow-off-top": 0.35,
+    "shooting-star": 0.30,
+    "doji": 0.15,
+    "bearish-engulfing": 0.35,
+    "structure-break": 0.40,
+}
+
+_EPS = 1e-12
+
+
+def _at_highs(h, lookback=HIGH_LOOKBACK):
+    # 1.0 when the candle's high is (near) the highest high of the lookback
+    window = h[:, -lookback:]
+    top = np.nanmax(window, axis=1, keepdims=True)
+    bottom = np.nanmin(window, axis=1, keepdims=True)
+    return np.clip((h - bottom) / (top - bottom + _EPS), 0, 1) ** 2
+
+
+def candle_signals(o, h, l, c):
+    """Per-candle confidences for the last two candles. Returns {tag: (n, 2)}."""
+    o, h, l, c = (np.asarray(x, dtype=float) for x in (o, h, l, c))
+    at_high = _at_highs(h)[:, -2:]
+    o2, h2, l2, c2 = o[:, -2:], h[:, -2:], l[:, -2:], c[:, -2:]
+
+    rng = h2 - l2 + _EPS
+    body = np.abs(c2 - o2)
+    upper = h2 - np.maximum(o2, c2)
+    lower = np.minimum(o2, c2) - l2
+
+    upper_ratio = upper / rng
+    body_ratio = body / rng
+    lower_ratio = lower / rng
+
+    blow_off = np.clip((upper_ratio - 0.3) / 0.4, 0, 1) * at_high
+    shooting_star = (
+        np.clip((upper_ratio - 0.5) / 0.3, 0, 1)
+        * (lower_ratio <= 0.25)
+        * (upper >= 2 * body)
+        * at_high
+    )
+    doji = np.clip(1 - body_ratio / 0.1, 0, 1) * at_high
+
+    # Engulfing needs the candle before each of the last two
+    po, pc = o[:, -3:-1], c[:, -3:-1]
+    prev_body = np.abs(pc - po)
+    engulf = (pc > po) & (c2 < o2) & (o2 >= pc) & (c2 <= po)
+    engulfing = engulf * np.clip(body / (1.5 * prev_body + _EPS), 0, 1) * np.maximum(at_high, 0.5)
+
+    return {
+        "blow-off-top": blow_off,
+        "shooting-star": shooting_star,
+        "doji": doji,
+        "bearish-engulfing": engulfing,
+    }
+
+
+def _swing_highs(h, c):
+    # Local max of the highs confirmed by a lower close on the next candle, shape (n, k)
+    swing = np.zeros(h.shape, dtype=bool)
+    swing[:, 1:-1] = (h[:, 1:-1] > h[:, :-2]) & (h[:, 1:-1] >= h[:, 2:]) & (c[:, 2:] < c[:, 1:-1])
+    return swing
+
+
+def structure_shift(h, l, c, window=STRUCTURE_WINDOW):
+    """Higher High -> Lower High on 15m: confidence per symbol, shape (n,).
+
+    The peak must break a prior swing high (HH) and be followed by a swing high
+    below it (LH); a straight pullback from the peak is not a shift.
+    """
+    h, l, c = (np.asarray(x, dtype=float)[:, -window:] for x in (h, l, c))
+    n, k = h.shape
+    peak_idx = np.argmax(np.where(np.isnan(h), -np.inf, h), axis=1)
+    rows = np.arange(n)
+    peak_high = h[rows, peak_idx]
+    peak_low = l[rows, peak_idx]
+
+    idx = np.arange(k)[None, :]
+    swing = _swing_highs(h, c) & (h < peak_high[:, None])
+    prior_high = np.where(swing & (idx < peak_idx[:, None]), h, -np.inf).max(axis=1)
+    lower_high = np.where(swing & (idx > peak_idx[:, None]), h, -np.inf).max(axis=1)
+    window_low = np.nanmin(l, axis=1)
+    last_close = c[:, -1]
+
+    valid = np.isfinite(prior_high) & np.isfinite(lower_high)
+    # Deeper pullback from the peak (and a break of the peak candle's low) = stronger shift
+    depth = np.clip((peak_high - last_close) / (peak_high - window_low + _EPS) * 2, 0, 1)
+    broke_low = np.where(last_close < peak_low, 1.0, 0.6)
+    return valid * depth * broke_low
+
+
+def score_batch(ohlc_1h, ohlc_15m):
+    """Scores a batch. ohlc_* = (open, high, low, close) 2D arrays. Returns (scores, confidences)."""
+    conf = {tag: sig.max(axis=1) for tag, sig in candle_signals(*ohlc_1h).items()}
+    conf["structure-break"] = structure_shift(*ohlc_15m[1:])
+
+    # Noisy-OR of weighted signals: any strong signal lifts the score, several compound
+    miss = np.ones_like(conf["structure-break"])
+    for tag, w in PATTERN_WEIGHTS.items():
+        miss *= 1 - w * np.nan_to_num(conf[tag])
+    return 1 - miss, conf
+
+
+def _ohlc(rows):
+    a = np.asarray(rows, dtype=float)
+    return a[None, :, 1], a[None, :, 2], a[None, :, 3], a[None, :, 4]
+
+
+def local_pattern_score(klines_1h, klines_15m):
+    """Single symbol from raw [t, o, h, l, c, v] rows (or their JSON). Same shape as the model's JSON."""
+    if isinstance(klines_1h, str): klines_1h = json.loads(klines_1h)
+    if isinstance(klines_15m, str): klines_15m = json.loads(klines_15m)
+    if len(klines_1h) < 3 or len(klines_15m) < 4:
+        return {"pattern_score": 0.0, "reversal_detected": False, "tags": [], "confidence": {}, "source": "local"}
+
+    scores, conf = score_batch(_ohlc(klines_1h), _ohlc(klines_15m))
+    confidence = {tag: round(float(v[0]), 3) for tag, v in conf.items()}
+    score = float(scores[0])
+    return {
+        "pattern_score": round(score, 3),
+        "reversal_detected": score >= TAG_THRESHOLD,
+        "tags": [tag for tag, v in confidence.items() if v >= TAG_THRESHOLD],
+        "confidence": confidence,
+        "source": "local"
+    }
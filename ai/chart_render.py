@@ -0,0 +1,42 @@
+import os
+import io
+import matplotlib
+matplotlib.use("Agg") # Headless backend, safe inside worker processes
+import matplotlib.pyplot as plt
+import mplfinance as mpf
+import pandas as pd
+
+# Chart rendering for the vision model.
+# Runs inside a ProcessPoolExecutor worker: module-level state (style, plot
+# template) is built once per worker process and reused for every chart.
+
+CHART_DPI = int(os.getenv("CHART_DPI", 100))
+CHART_WIDTH = float(os.getenv("CHART_WIDTH", 8)) # inches
+CHART_HEIGHT = float(os.getenv("CHART_HEIGHT", 5.75))
+CHART_CANDLES = int(os.getenv("CHART_CANDLES", 50))
+
+# Pre-built style + plot kwargs (template) shared by all renders in this process
+_STYLE = mpf.make_mpf_style(base_mpf_style="yahoo")
+_PLOT_KWARGS = dict(
+    type="candle",
+    style=_STYLE,
+    volume=True,
+    figsize=(CHART_WIDTH, CHART_HEIGHT),
+    returnfig=True,
+    warn_too_much_data=10_000,
+)
+
+
+def render_chart_png(rows, dpi=CHART_DPI, candles=CHART_CANDLES):
+    """Renders [t, o, h, l, c, v] rows to PNG bytes (no disk I/O)."""
+    df = pd.DataFrame(rows, columns=["time", "open", "high", "low", "close", "volume"])
+    df.index = pd.to_datetime(df["time"], unit="ms")
+    subset = df.tail(candles) # Last N candles for clarity
+
+    fig, _ = mpf.plot(subset, **_PLOT_KWARGS)
+    try:
+        buf = io.BytesIO()
+        fig.savefig(buf, format="png", dpi=dpi)
+        return buf.getvalue()
+    finally:
+        plt.close(fig) # Workers are long-lived, don't leak figures
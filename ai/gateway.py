@@ -0,0 +1,357 @@
+import os
+import json
+import time
+import random
+import asyncio
+from collections import deque
+from dotenv import load_dotenv
+
+from monitoring import metrics
+
+load_dotenv()
+
+# Shared async gateway for all Gemini calls (pattern + news).
+# Per model: concurrency semaphore, requests/tokens-per-minute budget,
+# timeout + retry with full jitter, circuit breaker and latency histogram.
+# Any object with `generate_content_async(contents)` can be registered,
+# including StubModel below for offline load tests (AI_STUB_MODEL=1).
+
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", 4))
+AI_RPM = int(os.getenv("AI_RPM", 15)) # Gemini free tier
+AI_TPM = int(os.getenv("AI_TPM", 1_000_000))
+AI_TIMEOUT = float(os.getenv("AI_TIMEOUT", 30))
+AI_MAX_RETRIES = int(os.getenv("AI_MAX_RETRIES", 3))
+AI_BUDGET_WAIT = float(os.getenv("AI_BUDGET_WAIT", 10)) # Max seconds to queue for budget
+AI_BREAKER_THRESHOLD = int(os.getenv("AI_BREAKER_THRESHOLD", 5)) # Consecutive failures
+AI_BREAKER_RESET = float(os.getenv("AI_BREAKER_RESET", 60)) # Seconds open before a trial call
+AI_STUB_MODEL = os.getenv("AI_STUB_MODEL", "0") == "1"
+
+IMAGE_TOKEN_COST = 258 # Gemini bills each inline image as ~258 tokens
+
+
+class ModelGatewayError(Exception):
+    pass
+
+class CircuitOpenError(ModelGatewayError):
+    pass
+
+class BudgetExceededError(ModelGatewayError):
+    pass
+
+
+def is_retryable(exc):
+    # Quota / transient provider errors. Matched by name so google.api_core
+    # is not a hard dependency of the gateway (stub runs without it).
+    if isinstance(exc, asyncio.TimeoutError):
+        return True
+    name = type(exc).__name__
+    if name in ("ResourceExhausted", "ServiceUnavailable", "InternalServerError",
+                "DeadlineExceeded", "TooManyRequests", "StubProviderError"):
+        return True
+    text = str(exc)
+    return "429" in text or "503" in text or "quota" in text.lower()
+
+
+def estimate_tokens(contents):
+    if isinstance(contents, str):
+        contents = [contents]
+    tokens = 0
+    for part in contents:
+        if isinstance(part, str):
+            tokens += len(part) // 4 + 1
+        else:
+            tokens += IMAGE_TOKEN_COST
+    return tokens
+
+
+AI_REQUEST_SECONDS = metrics.histogram(
+    "ai_request_seconds", "Model call latency per attempt (incl. timeouts / errors)", ["model"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+AI_REQUESTS = metrics.counter("ai_requests_total", "Gateway calls by outcome", ["model", "outcome"])
+
+
+def latency_snapshot(hist):
+    """Summary of a histogram child in ms (gateway snapshot / debug endpoint)."""
+    return {
+        "count": hist.count,
+        "avg_ms": round(hist.sum / hist.count * 1000, 1) if hist.count else 0.0,
+        "p50_ms": hist.quantile(0.5) * 1000,
+        "p95_ms": hist.quantile(0.95) * 1000,
+        "buckets": {("+Inf" if b == float("inf") else str(int(b * 1000))): n for b, n in zip(hist.bounds, hist.counts)}
+    }
+
+
+class CircuitBreaker:
+    def __init__(self, threshold=AI_BREAKER_THRESHOLD, reset_timeout=AI_BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        """None = rejected, "probe" = the single half-open trial (release with end_trial), else "call"."""
+        state = self.state
+        if state == "closed":
+            return "call"
+        if state == "half_open" and not self.trial_in_flight:
+            self.trial_in_flight = True # Exactly one probe request
+            return "probe"
+        return None
+
+    def end_trial(self):
+        # However the probe ended (incl. cancellation): let the next call probe again
+        self.trial_in_flight = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1 # The probe's slot is released by end_trial, not by any failure
+        if self.opened_at is not None or self.failures >= self.threshold:
+            self.opened_at = time.monotonic() # (Re)open
+
+
+class RateBudget:
+    # Sliding 60s window over requests and tokens
+    def __init__(self, rpm=AI_RPM, tpm=AI_TPM):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.window = deque() # [ts, tokens]
+        self.tokens_in_window = 0
+        self.lock = asyncio.Lock()
+
+    def _expire(self, now):
+        while self.window and now - self.window[0][0] >= 60:
+            _, tokens = self.window.popleft()
+            self.tokens_in_window -= tokens
+
+    def _wait_time(self, now, tokens):
+        if len(self.window) < self.rpm and self.tokens_in_window + tokens <= self.tpm:
+            return 0.0
+        # Wait until enough of the oldest entries have left the window
+        remaining_tokens = self.tokens_in_window
+        for i, (ts, t) in enumerate(self.window):
+            remaining_tokens -= t
+            remaining_requests = len(self.window) - (i + 1)
+            if remaining_requests < self.rpm and remaining_tokens + tokens <= self.tpm:
+                return max(0.0, ts + 60 - now)
+        # Single request larger than the whole token budget
+        return float("inf")
+
+    async def acquire(self, tokens, max_wait=AI_BUDGET_WAIT):
+        # The wait is computed under the lock but slept outside it: a queued caller
+        # never holds up one that fits now. Re-checked after every sleep.
+        deadline = time.monotonic() + max_wait
+        while True:
+            async with self.lock:
+                now = time.monotonic()
+                self._expire(now)
+                wait = self._wait_time(now, tokens)
+                if wait <= 0:
+                    entry = [now, tokens]
+                    self.window.append(entry)
+                    self.tokens_in_window += tokens
+                    return entry
+                if now + wait > deadline:
+                    raise BudgetExceededError(f"AI budget exhausted (next slot in {wait:.1f}s)")
+            await asyncio.sleep(wait)
+
+    def correct(self, entry, actual):
+        # Replace the estimate with real usage once the response reports it
+        self.tokens_in_window += actual - entry[1]
+        entry[1] = actual
+
+
+class _ModelStats(dict):
+    # Plain counts for snapshot(), mirrored into ai_requests_total
+    def __init__(self, model):
+        super().__init__(ok=0, errors=0, retries=0, timeouts=0, rejected=0)
+        self.counters = {k: AI_REQUESTS.labels(model, k) for k in self}
+
+    def __setitem__(self, key, value):
+        self.counters[key].inc(value - self[key])
+        super().__setitem__(key, value)
+
+
+class _ModelSlot:
+    def __init__(self, name, model, max_concurrency, rpm, tpm):
+        self.model = model
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.budget = RateBudget(rpm, tpm)
+        self.breaker = CircuitBreaker()
+        self.latency = AI_REQUEST_SECONDS.labels(name)
+        self.stats = _ModelStats(name)
+
+
+class ModelGateway:
+    def __init__(self, max_concurrency=AI_MAX_CONCURRENCY, rpm=AI_RPM, tpm=AI_TPM,
+                 timeout=AI_TIMEOUT, max_retries=AI_MAX_RETRIES):
+        self.max_concurrency = max_concurrency
+        self.rpm = rpm
+        self.tpm = tpm
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.slots = {}
+
+    def register(self, name, model):
+        if name not in self.slots:
+            self.slots[name] = _ModelSlot(name, model, self.max_concurrency, self.rpm, self.tpm)
+        return self.slots[name]
+
+    async def generate(self, name, contents):
+        slot = self.slots[name]
+        tokens = estimate_tokens(contents)
+        last_exc = None
+
+        for attempt in range(self.max_retries + 1):
+            permit = slot.breaker.allow()
+            if permit is None:
+                slot.stats["rejected"] += 1
+                raise CircuitOpenError(f"{name}: circuit open, provider degraded")
+
+            try:
+                try:
+                    budget_entry = await slot.budget.acquire(tokens)
+                except BudgetExceededError:
+                    slot.stats["rejected"] += 1
+                    raise
+
+                async with slot.semaphore:
+                    start = time.perf_counter()
+                    try:
+                        response = await asyncio.wait_for(
+                            slot.model.generate_content_async(contents), timeout=self.timeout
+                        )
+                    except Exception as e:
+                        slot.latency.observe(time.perf_counter() - start)
+                        last_exc = e
+                        if isinstance(e, asyncio.TimeoutError):
+                            slot.stats["timeouts"] += 1
+                        if not is_retryable(e):
+                            # Caller error (bad prompt etc.), provider is fine
+                            slot.stats["errors"] += 1
+                            raise ModelGatewayError(f"{name}: {e}") from e
+                        slot.breaker.record_failure()
+                    else:
+                        slot.latency.observe(time.perf_counter() - start)
+                        slot.breaker.record_success()
+                        slot.stats["ok"] += 1
+                        usage = getattr(response, "usage_metadata", None)
+                        actual = getattr(usage, "total_token_count", None) if usage else None
+                        if actual:
+                            slot.budget.correct(budget_entry, actual)
+                        return response
+            finally:
+                # Also on CancelledError (caller timeout, shutdown), which `except Exception` misses
+                if permit == "probe":
+                    slot.breaker.end_trial()
+
+            if attempt < self.max_retries:
+                slot.stats["retries"] += 1
+                # Full jitter exponential backoff
+                await asyncio.sleep(random.uniform(0, min(10.0, 0.5 * 2 ** attempt)))
+
+        slot.stats["errors"] += 1
+        raise ModelGatewayError(f"{name}: gave up after {self.max_retries + 1} attempts: {last_exc}") from last_exc
+
+    def snapshot(self):
+        return {
+            name: {
+                "state": slot.breaker.state,
+                "in_flight": self.max_concurrency - slot.semaphore._value,
+                "requests_last_min": len(slot.budget.window),
+                "tokens_last_min": slot.budget.tokens_in_window,
+                "latency": latency_snapshot(slot.latency),
+                **slot.stats
+            }
+            for name, slot in self.slots.items()
+        }
+
+
+# --- Offline stub (load tests, CI, no API key) ---
+class StubProviderError(Exception):
+    pass
+
+class _StubUsage:
+    def __init__(self, total):
+        self.total_token_count = total
+
+class _StubResponse:
+    def __init__(self, text, tokens):
+        self.text = text
+        self.usage_metadata = _StubUsage(tokens)
+
+class StubModel:
+    def __init__(self, response=None, latency=0.2, jitter=0.1, failure_rate=0.0):
+        self.response = response or {"pattern_score": 0.5, "news_score": 50, "news_driven": False,
+                                     "sentiment": "neutral", "tags": [], "reasoning": "stub"}
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+
+    async def generate_content_async(self, contents):
+        await asyncio.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+        if random.random() < self.failure_rate:
+            raise StubProviderError("429 stub quota exceeded")
+        return _StubResponse(json.dumps(self.response), estimate_tokens(contents) + 50)
+
+
+def build_model(name):
+    if AI_STUB_MODEL:
+        return StubModel()
+    import google.generativeai as genai
+    return genai.GenerativeModel(name)
+
+
+_gateway = None
+
+def get_gateway():
+    global _gateway
+    if _gateway is None:
+        _gateway = ModelGateway()
+    return _gateway
+
+
+async def load_test(requests=200, concurrency=50, failure_rate=0.05, latency=0.2, rpm=100000):
+    gateway = ModelGateway(rpm=rpm, tpm=10**9, timeout=5)
+    gateway.register("stub", StubModel(latency=latency, failure_rate=failure_rate))
+    sem = asyncio.Semaphore(concurrency)
+    outcomes = {"ok": 0, "failed": 0}
+
+    async def one(i):
+        async with sem:
+            try:
+                await gateway.generate("stub", f"load test prompt {i}")
+                outcomes["ok"] += 1
+            except ModelGatewayError:
+                outcomes["failed"] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    print(f"{requests} requests in {elapsed:.2f}s ({requests / elapsed:.0f} req/s): {outcomes}")
+    print(json.dumps(gateway.snapshot(), indent=2))
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Offline load test of the model gateway against StubModel")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--failure-rate", type=float, default=0.05)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--rpm", type=int, default=100000)
+    args = parser.parse_args()
+    asyncio.run(load_test(args.requests, args.concurrency, args.failure_rate, args.latency, args.rpm))
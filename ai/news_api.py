@@ -1,10 +1,11 @@
 import os
 import json
-import feedparser
-import urllib.parse
 import google.generativeai as genai
 from dotenv import load_dotenv
 
+from ai.gateway import get_gateway, build_model
+from ai.news_feed import coin_from_symbol
+
 load_dotenv()
 
 # Use the same GENAI_KEY as pattern_api
@@ -13,32 +14,33 @@ if GENAI_KEY:
     genai.configure(api_key=GENAI_KEY)
 
 class NewsAnalyzer:
-    def __init__(self):
+    def __init__(self, feed, cache=None):
+        # NewsFeed (ai/news_feed.py): shared headline cache + background prefetch
+        self.feed = feed
+        # Optional ScoreCache (ai/score_cache.py) keyed by coin + headline set
+        self.cache = cache
         # Gemini 1.5 Flash is highly efficient and free-tier friendly
         # Using alias found in model list
-        self.model = genai.GenerativeModel('gemini-flash-latest')
+        self.model_name = 'gemini-flash-latest'
+        self.gateway = get_gateway()
+        self.gateway.register(self.model_name, build_model(self.model_name))
 
-    def fetch_news(self, symbol):
-        # Construct search query
-        # Remove /USDT or similar if present
-        coin = symbol.split('/')[0]
-        query = f"{coin} crypto news"
-        encoded_query = urllib.parse.quote(query)
-        rss_url = f"https://news.google.com/rss/search?q={encoded_query}&hl=en-US&gl=US&ceid=US:en"
-        
-        feed = feedparser.parse(rss_url)
-        
-        # Take top 5 headlines
-        headlines = []
-        for entry in feed.entries[:5]:
-            headlines.append(f"- {entry.title} ({entry.published})")
-        
-        return "\n".join(headlines)
+    async def fetch_news(self, symbol):
+        # Cache read via NewsFeed (ai/news_feed.py); network only on a cold/stale coin
+        return await self.feed.get_headlines(symbol)
 
     async def get_news_score(self, symbol):
-        headlines = self.fetch_news(symbol)
+        headlines = await self.fetch_news(symbol)
         if not headlines:
             return {"news_driven": False, "news_score": 0, "sentiment": "neutral"}
+
+        coin = coin_from_symbol(symbol)
+        # Order-independent hash of the headline set
+        cache_key = self.cache.key(coin, *sorted(headlines.split("\n"))) if self.cache else None
+        if cache_key:
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                return cached
         
         prompt = f"""
         Analyze these news headlines for {symbol}:
@@ -57,18 +59,18 @@ class NewsAnalyzer:
         """
         
         try:
-            # Gemini async generation or synchronous run in executor
-            # google.generativeai supports async generate_content_async since roughly 0.3.0
-            # If not available, we wrap sync call.
-            # Assuming recent library version.
-            response = await self.model.generate_content_async(prompt)
+            # Shared gateway: timeout, retry w/ jitter, RPM/token budget, circuit breaker
+            response = await self.gateway.generate(self.model_name, prompt)
             
             text = response.text
             # Clean markdown
             text = text.replace("```json", "").replace("```", "")
-            return json.loads(text)
+            result = json.loads(text)
+            if cache_key:
+                await self.cache.set(cache_key, result)
+            return result
                 
         except Exception as e:
             print(f"News Analysis Error (Gemini): {e}")
-            return {"news_driven": False, "news_score": 50, "sentiment": "neutral"}
+            return {"news_driven": False, "news_score": 50, "sentiment": "neutral", "error": str(e)}
 
@@ -0,0 +1,135 @@
+import os
+import time
+import asyncio
+import urllib.parse
+import aiohttp
+import feedparser
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Async news ingestion (Google News RSS).
+# Headlines are cached per coin in Redis (shared across replicas) and fetched
+# with conditional requests (ETag / Last-Modified), so a 304 costs no parsing.
+# A background loop prefetches feeds for the current top movers, which makes
+# the decision-time lookup a cache read in the common case.
+
+NEWS_HEADLINES_TTL = int(os.getenv("NEWS_HEADLINES_TTL", 900)) # Fresh for 15 min
+NEWS_PREFETCH_TOP_N = int(os.getenv("NEWS_PREFETCH_TOP_N", 30))
+NEWS_PREFETCH_INTERVAL = int(os.getenv("NEWS_PREFETCH_INTERVAL", 120))
+NEWS_MAX_HEADLINES = 5
+NEWS_FETCH_CONCURRENCY = 4
+
+MOVERS_KEY = "market:movers" # ZSET symbol -> |24h change|, maintained by the collector
+
+
+def coin_from_symbol(symbol):
+    # BTC/USDT, BTC/USDT:USDT, BTCUSDT -> BTC
+    coin = symbol.split('/')[0].split(':')[0]
+    if coin.endswith("USDT") and len(coin) > 4:
+        coin = coin[:-4]
+    return coin
+
+
+def rss_url(coin):
+    query = urllib.parse.quote(f"{coin} crypto news")
+    return f"https://news.google.com/rss/search?q={query}&hl=en-US&gl=US&ceid=US:en"
+
+
+class NewsFeed:
+    def __init__(self, redis_client, ttl=NEWS_HEADLINES_TTL):
+        self.redis = redis_client
+        self.ttl = ttl
+        self.session = None
+        self.sem = asyncio.Semaphore(NEWS_FETCH_CONCURRENCY)
+        self.inflight = {} # coin -> Task, dedupes concurrent fetches
+
+    async def get_session(self):
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                trust_env=True, timeout=aiohttp.ClientTimeout(total=10)
+            )
+        return self.session
+
+    def _key(self, coin):
+        return f"news:headlines:{coin}"
+
+    async def get_headlines(self, symbol):
+        """Newline-joined top headlines. Cache read unless missing/stale."""
+        coin = coin_from_symbol(symbol)
+        cached = await self.redis.hgetall(self._key(coin))
+        if cached and time.time() - float(cached.get("fetched_at", 0)) < self.ttl:
+            return cached.get("headlines", "")
+        return await self.refresh(coin, cached)
+
+    async def refresh(self, coin, cached=None):
+        task = self.inflight.get(coin)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(coin, cached))
+            self.inflight[coin] = task
+            task.add_done_callback(lambda _: self.inflight.pop(coin, None))
+        return await task
+
+    async def _fetch(self, coin, cached=None):
+        if cached is None:
+            cached = await self.redis.hgetall(self._key(coin))
+        cached = cached or {}
+
+        headers = {}
+        if cached.get("etag"): headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"): headers["If-Modified-Since"] = cached["last_modified"]
+
+        try:
+            session = await self.get_session()
+            async with self.sem:
+                async with session.get(rss_url(coin), headers=headers) as resp:
+                    if resp.status == 304:
+                        # Unchanged: just extend freshness
+                        await self.redis.hset(self._key(coin), "fetched_at", str(time.time()))
+                        await self.redis.expire(self._key(coin), self.ttl * 4)
+                        return cached.get("headlines", "")
+                    if resp.status >= 400:
+                        raise Exception(f"HTTP {resp.status}")
+                    body = await resp.read()
+                    etag = resp.headers.get("ETag", "")
+                    last_modified = resp.headers.get("Last-Modified", "")
+        except Exception as e:
+            print(f"News Fetch Error ({coin}): {e}")
+            # Serve stale headlines rather than nothing
+            return cached.get("headlines", "")
+
+        feed = await asyncio.to_thread(feedparser.parse, body)
+        headlines = "\n".join(
+            f"- {entry.title} ({entry.get('published', '')})" for entry in feed.entries[:NEWS_MAX_HEADLINES]
+        )
+
+        await self.redis.hset(self._key(coin), mapping={
+            "headlines": headlines,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": str(time.time())
+        })
+        # Keep stale copies (and validators) around a while for conditional requests
+        await self.redis.expire(self._key(coin), self.ttl * 4)
+        return headlines
+
+    async def prefetch_loop(self):
+        print("News Prefetch Loop Started")
+        while True:
+            try:
+                movers = await self.redis.zrevrange(MOVERS_KEY, 0, NEWS_PREFETCH_TOP_N - 1)
+                coins = {coin_from_symbol(s) for s in movers}
+                stale = []
+                for coin in coins:
+                    fetched_at = await self.redis.hget(self._key(coin), "fetched_at")
+                    # Refresh a bit before expiry so lookups never wait on the network
+                    if not fetched_at or time.time() - float(fetched_at) > self.ttl * 0.8:
+                        stale.append(coin)
+                await asyncio.gather(*(self.refresh(c) for c in stale))
+            except Exception as e:
+                print(f"News Prefetch Error: {e}")
+            await asyncio.sleep(NEWS_PREFETCH_INTERVAL)
+
+    async def close(self):
+        if self.session:
+            await self.session.close()
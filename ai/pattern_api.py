@@ -1,10 +1,13 @@
 import os
 import json
-import mplfinance as mpf
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import google.generativeai as genai
 from dotenv import load_dotenv
-import pathlib
+
+from ai.chart_render import render_chart_png, CHART_DPI
+from ai.gateway import get_gateway, build_model
 
 load_dotenv()
 
@@ -12,37 +15,40 @@ GENAI_KEY = os.getenv("GENAI_KEY")
 if GENAI_KEY:
     genai.configure(api_key=GENAI_KEY)
 
+CHART_RENDER_WORKERS = int(os.getenv("CHART_RENDER_WORKERS", 2))
+
+# One render pool per process, shared by every analyzer instance
+_render_pool = None
+
+def get_render_pool():
+    global _render_pool
+    if _render_pool is None:
+        _render_pool = ProcessPoolExecutor(max_workers=CHART_RENDER_WORKERS)
+    return _render_pool
+
 class PatternAnalyzer:
-    def __init__(self):
-        self.model = genai.GenerativeModel('gemini-pro-vision') 
+    def __init__(self, cache=None):
+        # Optional ScoreCache (ai/score_cache.py): skips Gemini for unchanged candles
+        self.cache = cache
         # Pattern Analysis (Vision)
         # Switching to Gemini 2.0 Flash for better multimodal support
-        self.model = genai.GenerativeModel('gemini-2.0-flash')
+        self.model_name = 'gemini-2.0-flash'
+        # All calls go through the shared gateway (concurrency, budget, breaker)
+        self.gateway = get_gateway()
+        self.gateway.register(self.model_name, build_model(self.model_name))
 
-    def generate_chart_image(self, symbol, df, output_path="chart.png"):
-        # Configure mplfinance style
-        # We need a clear chart for AI
-        df.index = pd.to_datetime(df['time'], unit='ms')
-        
-        # Plot last 50 candles for clarity
-        subset = df.tail(50)
-        
-        mpf.plot(
-            subset, 
-            type='candle',
-            style='yahoo',
-            volume=True,
-            savefig=dict(fname=output_path, dpi=100)
-        )
-        return output_path
+    async def generate_chart_image(self, symbol, df, dpi=CHART_DPI):
+        # Render in a worker process into an in-memory PNG.
+        # Keeps mplfinance off the event loop and avoids shared chart_*.png files.
+        rows = df[['time','open','high','low','close','volume']].values.tolist()
+        loop = asyncio.get_running_loop()
+        png = await loop.run_in_executor(get_render_pool(), render_chart_png, rows, dpi)
+        return {"mime_type": "image/png", "data": png}
 
     async def analyze_chart(self, symbol, df_1h, df_15m):
         # We will combine both charts or just send 1H? User said "Take chart screenshot (1H+15m)"
         # Let's generate one image or two. Multi-image prompt is supported.
         
-        img_1h = self.generate_chart_image(symbol, df_1h, "chart_1h.png")
-        img_15m = self.generate_chart_image(symbol, df_15m, "chart_15m.png")
-
         prompt = """
         Analyze these crypto charts (1H and 15m) for a "Blow-off Top" or "Reversal" setup.
         
@@ -64,18 +70,14 @@ class PatternAnalyzer:
         """
 
         try:
-            # Load images
-            # Gemini API accepts path or data
-            # Using genai file API or just simple PIL
-            import PIL.Image
-            p_img_1h = PIL.Image.open(img_1h)
-            p_img_15m = PIL.Image.open(img_15m)
-            
-            response = self.model.generate_content([prompt, p_img_1h, p_img_15m])
-            
-            # Clean up
-            os.remove(img_1h)
-            os.remove(img_15m)
+            # Both timeframes render in parallel (and in parallel with other candidates)
+            img_1h, img_15m = await asyncio.gather(
+                self.generate_chart_image(symbol, df_1h),
+                self.generate_chart_image(symbol, df_15m)
+            )
+
+            # PNG buffers go straight to the model as inline blobs
+            response = await self.gateway.generate(self.model_name, [prompt, img_1h, img_15m])
             
             # Extract JSON
             text = response.text
@@ -86,19 +88,32 @@ class PatternAnalyzer:
             
         except Exception as e:
             print(f"Pattern Analysis Error: {e}")
-            return {"pattern_score": 0, "tags": [], "reasoning": "Error"}
+            return {"pattern_score": 0, "tags": [], "reasoning": "Error", "error": str(e)}
 
 # Helper specific for redis data structure
-    async def get_pattern_score(self, symbol, redis_client):
-        # Fetch data
-        import json
-        k_1h = await redis_client.get(f"klines:{symbol}:1h")
-        k_15m = await redis_client.get(f"klines:{symbol}:15m")
+    async def get_pattern_score(self, symbol, redis_client, klines=None):
+        # Fetch data (unless the caller already has the raw 1h/15m JSON)
+        if klines:
+            k_1h, k_15m = klines
+        else:
+            k_1h = await redis_client.get(f"klines:{symbol}:1h")
+            k_15m = await redis_client.get(f"klines:{symbol}:15m")
         
         if not k_1h or not k_15m:
             return {"pattern_score": 0}
+
+        # Cache key = hash of the exact candle data the chart is drawn from
+        cache_key = self.cache.key(symbol, k_1h, k_15m) if self.cache else None
+        if cache_key:
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                return cached
             
         df_1h = pd.DataFrame(json.loads(k_1h), columns=['time','open','high','low','close','volume'])
         df_15m = pd.DataFrame(json.loads(k_15m), columns=['time','open','high','low','close','volume'])
         
-        return await self.analyze_chart(symbol, df_1h, df_15m)
+        result = await self.analyze_chart(symbol, df_1h, df_15m)
+        # Never cache fallbacks, the next attempt should retry the model
+        if cache_key and "error" not in result:
+            await self.cache.set(cache_key, result)
+        return result
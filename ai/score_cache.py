@@ -0,0 +1,110 @@
+import os
+import json
+import time
+import hashlib
+from collections import OrderedDict, Counter
+
+# Content-addressed cache for Gemini scores.
+# Key = namespace + hash of exactly what the model would see (candles / headlines),
+# so a re-queued symbol with unchanged data never hits the model twice.
+# Redis holds the shared copy (all engine replicas, TTL eviction); a small
+# in-process LRU in front of it avoids the round trip for hot keys.
+
+PATTERN_CACHE_TTL = int(os.getenv("PATTERN_CACHE_TTL", 3600))
+NEWS_CACHE_TTL = int(os.getenv("NEWS_CACHE_TTL", 1800))
+SCORE_CACHE_LOCAL_SIZE = int(os.getenv("SCORE_CACHE_LOCAL_SIZE", 512))
+
+
+def content_hash(*parts):
+    h = hashlib.sha1()
+    for p in parts:
+        h.update(str(p).encode("utf-8"))
+        h.update(b"\x00") # Separator so ("ab","c") != ("a","bc")
+    return h.hexdigest()
+
+
+class ScoreCache:
+    def __init__(self, redis_client, namespace, ttl, local_size=SCORE_CACHE_LOCAL_SIZE):
+        self.redis = redis_client
+        self.namespace = namespace
+        self.ttl = ttl
+        self.local_size = local_size
+        self.local = OrderedDict() # key -> (expires_at, value)
+        self.hits = 0
+        self.misses = 0
+        self._pending = Counter()
+        self._last_flush = 0.0
+
+    def key(self, *parts):
+        return f"ai_cache:{self.namespace}:{content_hash(*parts)}"
+
+    async def _record(self, outcome):
+        # Shared counters (ai_cache:stats) so hit rate is visible across replicas.
+        # Batched: one HINCRBY pipeline every few seconds, never per lookup.
+        if outcome == "hit": self.hits += 1
+        else: self.misses += 1
+        self._pending[outcome] += 1
+        now = time.monotonic()
+        if now - self._last_flush < 5:
+            return
+        self._last_flush = now
+        pending, self._pending = self._pending, Counter()
+        try:
+            pipe = self.redis.pipeline()
+            for name, n in pending.items():
+                pipe.hincrby("ai_cache:stats", f"{self.namespace}:{name}", n)
+            await pipe.execute()
+        except Exception:
+            pass
+
+    async def get(self, key):
+        entry = self.local.get(key)
+        if entry:
+            expires_at, value = entry
+            if expires_at > time.time():
+                self.local.move_to_end(key)
+                await self._record("hit")
+                return value
+            del self.local[key]
+
+        raw, ttl = None, -1
+        try:
+            # GET + TTL in one round trip so the local copy expires with the shared one
+            pipe = self.redis.pipeline()
+            pipe.get(key)
+            pipe.ttl(key)
+            raw, ttl = await pipe.execute()
+        except Exception as e:
+            print(f"Score Cache Read Error ({self.namespace}): {e}")
+
+        if raw:
+            value = json.loads(raw)
+            self._store_local(key, value, ttl if ttl and ttl > 0 else self.ttl)
+            await self._record("hit")
+            return value
+
+        await self._record("miss")
+        return None
+
+    async def set(self, key, value):
+        self._store_local(key, value)
+        try:
+            await self.redis.set(key, json.dumps(value), ex=self.ttl)
+        except Exception as e:
+            print(f"Score Cache Write Error ({self.namespace}): {e}")
+
+    def _store_local(self, key, value, ttl=None):
+        self.local[key] = (time.time() + (ttl or self.ttl), value)
+        self.local.move_to_end(key)
+        while len(self.local) > self.local_size:
+            self.local.popitem(last=False) # LRU eviction
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "namespace": self.namespace,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "local_entries": len(self.local)
+        }
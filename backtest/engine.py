@@ -0,0 +1,428 @@
+import os
+import json
+import time
+import asyncio
+import fnmatch
+import contextlib
+from bisect import bisect_right
+import numpy as np
+from dotenv import load_dotenv
+
+from common.sqlite_pool import ReadOnlyPool
+from common.kill_switch import KillSwitch
+from scanner.rules import (
+    RULES, WINDOW, OI_HISTORY_LEN, BTC_TREND_KEYS, skip_symbol, btc_strongly_bullish, compute_features, feature_vector, evaluate
+)
+from ai.score_cache import PATTERN_CACHE_TTL
+from engine.decision import DecisionEngine
+from engine.ml_model import CandidateModel, ML_MODEL_PATH
+from execution.executor import TradeExecutor, BASE_URL
+from execution.accounts import load_accounts
+from execution.filters import ExchangeFilters
+from execution.journal import OrderJournal
+from execution.ledger import TradeLedger, ledger_stats
+from execution.paper_exchange import PaperExchange, PAPER_START_BALANCE
+
+load_dotenv()
+
+# Event-driven backtest over the collector's SQLite klines.
+# A virtual clock steps through history; at every step the universe is scanned
+# with the scanner's own rules table, candidates go through
+# DecisionEngine.process_candidate and signals through TradeExecutor.execute_trade
+# on a PaperExchange, i.e. the code we trade with. Engine and executor talk to
+# MemoryRedis, which holds what the collector would have written at that time.
+# Between steps the exit-timeframe candles of every symbol with open orders are
+# replayed as ticks (open, then the nearer extreme, then the other, then close),
+# so SL / TP1 / TP2 fill inside the book exactly as in DRY_RUN. Results land in
+# a TradeLedger (same analytics as live).
+#
+# Differences from live, by construction:
+#   - only closed candles are visible (live keys include the forming candle)
+#   - funding and OI have no history in SQLite: BACKTEST_FUNDING_RATE /
+#     BACKTEST_OI_INCREASE are assumed for every symbol
+#   - no Gemini calls: recorded AI scores if given, otherwise the engine's own
+#     fallback (local pattern score, neutral news)
+#   - trailing / breakeven / time stops (PositionManager) are not replayed
+#
+# Speed: the 1h history of the universe is loaded once and the scan reads array
+# slices (no JSON); SQLite is only queried for candidates and open positions.
+
+DB_PATH = os.getenv("DB_PATH", "exhaustion_bot.db")
+BACKTEST_FUNDING_RATE = float(os.getenv("BACKTEST_FUNDING_RATE", 0.0001))
+BACKTEST_OI_INCREASE = float(os.getenv("BACKTEST_OI_INCREASE", 10.0)) # %
+BACKTEST_EXIT_TIMEFRAME = os.getenv("BACKTEST_EXIT_TIMEFRAME", "5m")
+
+KLINES_LIMIT = 100 # Candles per klines:{symbol}:{tf} key (collector fetch limit)
+TF_MS = {"5m": 300_000, "15m": 900_000, "1h": 3_600_000, "4h": 14_400_000}
+HOUR_MS = TF_MS["1h"]
+
+CANDLES_SQL = "SELECT timestamp, open, high, low, close, volume FROM klines WHERE symbol = ? AND timeframe = ?"
+
+
+def _range(values, start, end):
+    # Redis LRANGE / LTRIM indices: inclusive end, negatives from the tail
+    n = len(values)
+    start = max(start + n if start < 0 else start, 0)
+    end = end + n if end < 0 else end
+    return values[start:end + 1]
+
+
+class MemoryPipeline:
+    def __init__(self, redis_client):
+        self.redis = redis_client
+        self.calls = []
+
+    def __getattr__(self, name):
+        method = getattr(self.redis, name)
+        def queue(*args, **kwargs):
+            self.calls.append((method, args, kwargs))
+            return self
+        return queue
+
+    async def execute(self):
+        calls, self.calls = self.calls, []
+        return [await method(*args, **kwargs) for method, args, kwargs in calls]
+
+
+class MemoryRedis:
+    """In-memory stand-in for the redis.asyncio calls the scanner, engine and executor make (decode_responses)."""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        value = self.data.get(key)
+        return value if isinstance(value, str) else None
+
+    async def set(self, key, value):
+        self.data[key] = str(value)
+        return True
+
+    async def strlen(self, key):
+        return len(await self.get(key) or "")
+
+    async def delete(self, *keys):
+        return sum(1 for k in keys if self.data.pop(k, None) is not None)
+
+    async def keys(self, pattern="*"):
+        return [k for k in self.data if fnmatch.fnmatchcase(k, pattern)]
+
+    async def hget(self, key, field):
+        return self.data.get(key, {}).get(field)
+
+    async def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    async def hset(self, key, field=None, value=None, mapping=None):
+        h = self.data.setdefault(key, {})
+        items = dict(mapping or {})
+        if field is not None:
+            items[field] = value
+        added = sum(1 for f in items if f not in h)
+        h.update({f: str(v) for f, v in items.items()})
+        return added
+
+    async def hdel(self, key, *fields):
+        h = self.data.get(key, {})
+        return sum(1 for f in fields if h.pop(f, None) is not None)
+
+    async def lpush(self, key, *values):
+        lst = self.data.setdefault(key, [])
+        lst[:0] = [str(v) for v in reversed(values)]
+        return len(lst)
+
+    async def ltrim(self, key, start, end):
+        if key in self.data:
+            self.data[key] = _range(self.data[key], start, end)
+        return True
+
+    async def lrange(self, key, start, end):
+        return _range(self.data.get(key, []), start, end)
+
+    async def publish(self, channel, message):
+        return 0 # Nobody subscribed
+
+    def pipeline(self):
+        return MemoryPipeline(self)
+
+    async def close(self):
+        pass
+
+
+class KlineHistory:
+    """The collector's SQLite klines as of a virtual time: only candles closed by then are visible."""
+
+    def __init__(self, db_path=DB_PATH):
+        self.pool = ReadOnlyPool(db_path, size=1)
+
+    def close(self):
+        self.pool.close()
+
+    def symbols(self, timeframe="1h"):
+        with self.pool.connection() as conn:
+            return [r[0] for r in conn.execute("SELECT DISTINCT symbol FROM klines WHERE timeframe = ?", (timeframe,))]
+
+    def span(self, timeframe="1h"):
+        """(first, last) candle open time of the timeframe, in ms."""
+        with self.pool.connection() as conn:
+            return conn.execute("SELECT MIN(timestamp), MAX(timestamp) FROM klines WHERE timeframe = ?", (timeframe,)).fetchone()
+
+    def first_close(self, symbol, timeframe):
+        with self.pool.connection() as conn:
+            first = conn.execute("SELECT MIN(timestamp) FROM klines WHERE symbol = ? AND timeframe = ?",
+                                 (symbol, timeframe)).fetchone()[0]
+        return None if first is None else first + TF_MS[timeframe]
+
+    def load(self, symbol, timeframe, start, end):
+        """Candles opened in [start, end] as an (n, 6) float array."""
+        with self.pool.connection() as conn:
+            rows = conn.execute(CANDLES_SQL + " AND timestamp BETWEEN ? AND ? ORDER BY timestamp",
+                                (symbol, timeframe, start, end)).fetchall()
+        return np.array(rows, dtype=float).reshape(-1, 6)
+
+    def last(self, symbol, timeframe, now_ms, limit=KLINES_LIMIT):
+        """Last `limit` candles closed at now_ms, oldest first (the collector's klines key)."""
+        with self.pool.connection() as conn:
+            rows = conn.execute(CANDLES_SQL + " AND timestamp <= ? ORDER BY timestamp DESC LIMIT ?",
+                                (symbol, timeframe, now_ms - TF_MS[timeframe], limit)).fetchall()
+        return [list(r) for r in reversed(rows)]
+
+    def closed_between(self, symbol, timeframe, start_ms, end_ms):
+        """Candles that closed in (start_ms, end_ms]."""
+        tf = TF_MS[timeframe]
+        with self.pool.connection() as conn:
+            return conn.execute(CANDLES_SQL + " AND timestamp > ? AND timestamp <= ? ORDER BY timestamp",
+                                (symbol, timeframe, start_ms - tf, end_ms - tf)).fetchall()
+
+
+class RecordedScores:
+    """
+    Stands in for PatternAnalyzer and NewsAnalyzer (a backtest never calls Gemini).
+    scores: {symbol: [[ts_ms, pattern_score, news_score], ...]}. The latest entry no older than
+    PATTERN_CACHE_TTL is used. Without one the pattern call reports an error, so the engine falls
+    back to the local pattern score as it does when the model is down; news is then neutral (50).
+    """
+
+    def __init__(self, scores=None):
+        self.scores = {s: sorted(rows) for s, rows in (scores or {}).items()}
+        self.now_ms = 0
+
+    def lookup(self, symbol):
+        rows = self.scores.get(symbol)
+        if not rows:
+            return None
+        i = bisect_right(rows, [self.now_ms, float("inf"), float("inf")]) - 1
+        if i < 0 or self.now_ms - rows[i][0] > PATTERN_CACHE_TTL * 1000:
+            return None
+        return rows[i]
+
+    async def get_pattern_score(self, symbol, redis_client=None, klines=None):
+        row = self.lookup(symbol)
+        if row is None:
+            return {"error": "no recorded score"}
+        return {"pattern_score": row[1], "source": "recorded"}
+
+    async def get_news_score(self, symbol):
+        row = self.lookup(symbol)
+        return {"news_score": row[2] if row else 50}
+
+
+class Backtest:
+    def __init__(self, db_path=DB_PATH, symbols=None, start=None, end=None, step_minutes=60,
+                 exit_timeframe=BACKTEST_EXIT_TIMEFRAME, start_balance=PAPER_START_BALANCE,
+                 funding_rate=BACKTEST_FUNDING_RATE, oi_increase=BACKTEST_OI_INCREASE,
+                 scores=None, ml_model=True, ledger_path=":memory:", rules=RULES, verbose=False):
+        self.history = KlineHistory(db_path)
+        all_symbols = set(self.history.symbols())
+        self.symbols = sorted(s for s in (symbols or all_symbols) if s in all_symbols and not skip_symbol(s))
+        first, last = self.history.span()
+        self.start = start if start is not None else (first or 0) + WINDOW * HOUR_MS
+        self.end = end if end is not None else (last or 0) + HOUR_MS
+        self.step_ms = int(step_minutes * 60_000)
+        self.exit_timeframe = exit_timeframe
+        self.rules = rules # Scanner thresholds (backtest/sweep.py rules_for to try others)
+        self.verbose = verbose
+        self.devnull = open(os.devnull, "w")
+
+        # Scanner inputs that SQLite has no history for (same values for every symbol)
+        self.funding_rate, self.oi_increase = funding_rate, oi_increase
+        self.metrics = {"funding_rate": str(funding_rate), "open_interest": str(100 * (1 + oi_increase / 100))}
+        self.oi_history = [{"ts": 0, "oi": 100.0}] * OI_HISTORY_LEN
+
+        # The trend keys the scanner reads, if the collector stored that symbol
+        self.btc = next((s for s in (k[len("klines:"):-len(":15m")] for k in BTC_TREND_KEYS) if s in all_symbols), None)
+
+        self.redis = MemoryRedis()
+        self.paper = PaperExchange(start_balance=start_balance)
+        self.scores = RecordedScores(scores)
+        self.engine = self.build_engine(ml_model)
+        self.executor = self.build_executor(ledger_path)
+        self.counts = {"steps": 0, "btc_skipped": 0, "candidates": 0, "signals": 0}
+
+    def build_engine(self, ml_model):
+        engine = DecisionEngine.__new__(DecisionEngine) # No Redis connection, feeds or Gemini clients
+        engine.redis = self.redis
+        engine.pattern_analyzer = engine.news_analyzer = self.scores
+        engine.ml_model = CandidateModel.load(ML_MODEL_PATH) if ml_model is True else ml_model or None
+        engine.kill_switch = KillSwitch(self.redis)
+        return engine
+
+    def build_executor(self, ledger_path):
+        executor = TradeExecutor.__new__(TradeExecutor)
+        executor.redis = self.redis
+        executor.paper = self.paper
+        executor.accounts = load_accounts(BASE_URL, paper=self.paper)
+        executor.primary = executor.accounts[0]
+        executor.filters = ExchangeFilters(unrounded=True) # No exchangeInfo offline: the paper exchange takes unrounded orders
+        executor.journal = OrderJournal(":memory:")
+        executor.ledger = TradeLedger(ledger_path)
+        executor.kill_switch = KillSwitch(self.redis)
+        self.paper.add_listener(executor.on_ledger_event)
+        return executor
+
+    def close(self):
+        self.history.close()
+        self.executor.journal.close()
+        self.executor.ledger.close()
+        self.devnull.close()
+
+    def quiet(self):
+        # Engine and executor narrate every candidate / order; a year of that is noise
+        if self.verbose:
+            return contextlib.nullcontext()
+        return contextlib.redirect_stdout(self.devnull)
+
+    # --- Data ---
+    def load(self):
+        warmup = self.start - (KLINES_LIMIT + 1) * HOUR_MS
+        self.k1h = [self.history.load(s, "1h", warmup, self.end) for s in self.symbols]
+        self.closes = [k[:, 0] + HOUR_MS for k in self.k1h]
+        # Close times padded with inf: all cursors move with one vectorized compare per step
+        self.close_grid = np.full((len(self.symbols), max((len(c) for c in self.closes), default=0) + 1), np.inf)
+        for i, closes in enumerate(self.closes):
+            self.close_grid[i, :len(closes)] = closes
+        self.cursor = np.zeros(len(self.symbols), dtype=int)
+        first_4h = [self.history.first_close(s, "4h") for s in self.symbols]
+        self.first_4h = np.array([np.inf if f is None else f for f in first_4h])
+
+    def advance(self, now_ms):
+        """Moves every symbol's cursor past the 1h candles closed by now_ms."""
+        rows = np.arange(len(self.symbols))
+        while True:
+            moved = self.close_grid[rows, self.cursor] <= now_ms
+            if not moved.any():
+                break
+            self.cursor += moved
+
+    def universe(self, now_ms):
+        """load_universe() as of now_ms, straight from the arrays."""
+        klines_1h, metrics = [], []
+        for k, n in zip(self.k1h, self.cursor):
+            klines_1h.append(k[max(n - WINDOW, 0):n] if n else None) # Array slices: no JSON, no lists
+            metrics.append(self.metrics if n else None)
+        btc = self.history.last(self.btc, "15m", now_ms, limit=5) if self.btc else None
+        return {"symbols": self.symbols, "btc_bullish": btc_strongly_bullish(btc), "klines_1h": klines_1h,
+                "has_4h": list(self.first_4h <= now_ms), "metrics": metrics,
+                "oi_history": [self.oi_history] * len(self.symbols)}
+
+    async def publish_symbol(self, symbol, now_ms):
+        """Writes one symbol's collector keys into MemoryRedis as of now_ms."""
+        r = self.redis
+        i = self.symbols.index(symbol)
+        k1 = self.k1h[i][max(self.cursor[i] - KLINES_LIMIT, 0):self.cursor[i]]
+        await r.set(f"klines:{symbol}:1h", json.dumps(k1.tolist()))
+        for tf in ("4h", "15m", "5m"):
+            await r.set(f"klines:{symbol}:{tf}", json.dumps(self.history.last(symbol, tf, now_ms)))
+        await r.hset(f"metrics:{symbol}", mapping=self.metrics)
+        await r.delete(f"oi_history:{symbol}")
+        await r.lpush(f"oi_history:{symbol}", *(json.dumps(x) for x in self.oi_history))
+
+    # --- Simulation ---
+    def price_path(self, candle):
+        # Open, the nearer extreme first, then the other one, then close
+        o, h, l, c = candle[1:5]
+        return (o, h, l, c) if h - o <= o - l else (o, l, h, c)
+
+    async def replay_exits(self, start_ms, end_ms):
+        symbols = {o['symbol'] for o in self.paper.orders.values()}
+        symbols |= {s for a in self.paper.accounts.values() for s in a.positions}
+        tf = self.exit_timeframe
+        for symbol in sorted(symbols):
+            candles = self.history.closed_between(symbol, tf, start_ms, end_ms)
+            if not candles and symbol in self.symbols: # No finer data: the 1h candles
+                i = self.symbols.index(symbol)
+                lo, hi = np.searchsorted(self.closes[i], [start_ms, end_ms], side="right")
+                tf_ms, candles = HOUR_MS, self.k1h[i][lo:hi].tolist()
+            else:
+                tf_ms = TF_MS[tf]
+            for candle in candles:
+                self.paper.now_ms = int(candle[0]) + tf_ms
+                for price in self.price_path(candle):
+                    await self.paper.on_tick(symbol, float(price))
+
+    async def step(self, now_ms):
+        self.paper.now_ms = self.scores.now_ms = now_ms
+        self.advance(now_ms)
+        acct = self.paper.account(self.executor.primary.name)
+        await self.redis.hset("account:balance", "balance", str(acct.balance)) # Engine sizing compounds
+
+        universe = self.universe(now_ms)
+        if universe["btc_bullish"]:
+            self.counts["btc_skipped"] += 1
+            return
+        columns = compute_features(universe)
+        _, _, passed = evaluate(columns, self.rules)
+        for i in np.flatnonzero(passed):
+            symbol = self.symbols[i]
+            self.counts["candidates"] += 1
+            await self.publish_symbol(symbol, now_ms)
+            await self.redis.hset("scanner:features", symbol, json.dumps(feature_vector(columns, i)))
+            with self.quiet():
+                signal = await self.engine.process_candidate(symbol)
+            if not signal:
+                continue
+            self.counts["signals"] += 1
+            # Last tick = close of the candle the engine priced from
+            await self.paper.on_tick(symbol, float(signal['entry_price']))
+            with self.quiet():
+                await self.executor.execute_trade(signal, f"bt{now_ms}-{i}")
+
+    async def run(self, progress=None):
+        t0 = time.perf_counter()
+        self.load()
+        loaded = time.perf_counter() - t0
+        now = self.start - self.start % self.step_ms
+        previous = now
+        while now <= self.end:
+            if now > previous:
+                with self.quiet():
+                    await self.replay_exits(previous, now)
+            await self.step(now)
+            self.counts["steps"] += 1
+            if progress and self.counts["steps"] % progress == 0:
+                print(f"{time.strftime('%Y-%m-%d %H:%M', time.gmtime(now / 1000))}  "
+                      f"{self.counts['signals']} signals, balance {self.paper.account(self.executor.primary.name).balance:.2f}")
+            previous, now = now, now + self.step_ms
+        return self.report(loaded, time.perf_counter() - t0)
+
+    def report(self, load_seconds=0.0, seconds=0.0):
+        account = self.executor.primary.name
+        return {
+            "symbols": len(self.symbols),
+            "start": self.start,
+            "end": self.end,
+            **self.counts,
+            "assumed": {"funding_rate": self.funding_rate, "oi_increase": self.oi_increase},
+            "account": self.paper.stats(account),
+            "ledger": ledger_stats(self.executor.ledger.conn),
+            "load_seconds": round(load_seconds, 2),
+            "seconds": round(seconds, 2),
+        }
+
+
+def run_backtest(**kwargs):
+    backtest = Backtest(**kwargs)
+    try:
+        return asyncio.run(backtest.run())
+    finally:
+        backtest.close()
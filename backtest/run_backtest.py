@@ -1,64 +1,78 @@
-import vectorbt as vbt
-import numpy as np
-import pandas as pd
-import ccxt
+import json
+import asyncio
+import argparse
+from datetime import datetime, timezone
 
-# simple mock backtest
-# In real scenario, would fetch from database or CSV
-# Here fetching small sample from CCXT or generating mock data
+from backtest.engine import (
+    Backtest, DB_PATH, BACKTEST_FUNDING_RATE, BACKTEST_OI_INCREASE, BACKTEST_EXIT_TIMEFRAME, PAPER_START_BALANCE
+)
 
-def run_backtest():
-    print("Fetching historical data...")
-    # Fetch data (e.g. BTC/USDT 1h)
-    symbol = 'BTC/USDT'
-    # Need to block for async fetch or use vbt (vbt has wrapper for yfinance/ccxt sometimes, but ccxt is easier manually)
-    exchange = ccxt.binance()
-    ohlcv = exchange.fetch_ohlcv(symbol, '1h', limit=1000)
-    
-    df = pd.DataFrame(ohlcv, columns=['time', 'open', 'high', 'low', 'close', 'volume'])
-    df['time'] = pd.to_datetime(df['time'], unit='ms')
-    df.set_index('time', inplace=True)
-    
-    print(f"Data loaded: {len(df)} candles.")
-    
-    # Strategy Logic (Proxy for AI)
-    # Pump: Price > 1.05 * Price[4] (5% pump in 4 hours? User said 10-25% in 4H)
-    # Let's say we Short if Close > Open * 1.02 (2% up candle) AND Volume > Mean * 2
-    
-    close = df['close']
-    open_p = df['open']
-    volume = df['volume']
-    
-    # Conditions
-    pump_cond = close > close.shift(4) * 1.05 # 5% pump in 4h
-    vol_cond = volume > volume.rolling(20).mean() * 2
-    
-    entries = pump_cond & vol_cond
-    exits = entries.vbt.signals.fshift(1) # Exit after 1 bar? Or SL/TP?
-    
-    # vbt.Portfolio.from_signals
-    # Using SL/TP
-    # SL 1.5%, TP 2% (TP1), TP 5% (TP2)
-    # vbt supports SL/TP
-    
-    pf = vbt.Portfolio.from_signals(
-        close, 
-        entries, 
-        None, # No explicit exit signal, relying on SL/TP
-        sl_stop=0.015,
-        tp_stop=0.04, # Avg TP
-        fees=0.0004, # Binance Futures Taker
-        init_cash=1000,
-        freq='1h'
+# Replays the collector's SQLite history through the production scanner rules,
+# DecisionEngine and executor (paper fills). See backtest/engine.py.
+#   python -m backtest.run_backtest --start 2024-01-01 --end 2025-01-01
+#   python -m backtest.run_backtest --symbols LUNA2USDT,WIFUSDT --ledger backtest_ledger.db --json
+
+
+def to_ms(day):
+    return int(datetime.fromisoformat(day).replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def print_report(report):
+    fmt = lambda ms: datetime.fromtimestamp(ms / 1000, timezone.utc).strftime('%Y-%m-%d %H:%M')
+    acct, ledger = report['account'], report['ledger']
+    print(f"{fmt(report['start'])} -> {fmt(report['end'])}: {report['symbols']} symbols, {report['steps']} steps "
+          f"in {report['seconds']}s (load {report['load_seconds']}s)")
+    print(f"Candidates: {report['candidates']}, signals: {report['signals']}, "
+          f"scans skipped (BTC bullish): {report['btc_skipped']}")
+    print(f"Assumed funding {report['assumed']['funding_rate']}, OI increase {report['assumed']['oi_increase']}%")
+    win_rate = "-" if ledger['win_rate'] is None else f"{ledger['win_rate'] * 100:.1f}%"
+    avg_r = "-" if ledger['avg_r'] is None else f"{ledger['avg_r']:.2f}"
+    print(f"Trades closed: {ledger['closed']} (open {ledger['open']}), win rate {win_rate}, avg R {avg_r}")
+    print(f"Net PnL: {ledger['pnl']:.2f} (fees {ledger['fees']:.2f}), balance {acct['balance']}, equity {acct['equity']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest the live strategy on stored klines")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--start", help="UTC date (default: first stored candle + warmup)")
+    parser.add_argument("--end", help="UTC date (default: last stored candle)")
+    parser.add_argument("--symbols", help="Comma separated (default: every symbol with 1h candles)")
+    parser.add_argument("--step", type=int, default=60, help="Scan interval in minutes")
+    parser.add_argument("--exit-timeframe", default=BACKTEST_EXIT_TIMEFRAME, choices=("5m", "15m", "1h"))
+    parser.add_argument("--balance", type=float, default=PAPER_START_BALANCE)
+    parser.add_argument("--funding", type=float, default=BACKTEST_FUNDING_RATE, help="Assumed funding rate")
+    parser.add_argument("--oi-increase", type=float, default=BACKTEST_OI_INCREASE, help="Assumed OI increase (%%)")
+    parser.add_argument("--scores", help="Recorded AI scores JSON: {symbol: [[ts_ms, pattern, news], ...]}")
+    parser.add_argument("--no-ml", action="store_true", help="Skip the ML gate")
+    parser.add_argument("--ledger", default=":memory:", help="Trade ledger file to keep the trades in")
+    parser.add_argument("--progress", type=int, default=24 * 30, help="Print every N steps (0 = off)")
+    parser.add_argument("--json", action="store_true")
+    parser.add_argument("--verbose", action="store_true", help="Engine / executor output")
+    args = parser.parse_args()
+
+    scores = None
+    if args.scores:
+        with open(args.scores) as f:
+            scores = json.load(f)
+
+    backtest = Backtest(
+        db_path=args.db,
+        symbols=args.symbols.split(",") if args.symbols else None,
+        start=to_ms(args.start) if args.start else None,
+        end=to_ms(args.end) if args.end else None,
+        step_minutes=args.step, exit_timeframe=args.exit_timeframe, start_balance=args.balance,
+        funding_rate=args.funding, oi_increase=args.oi_increase, scores=scores,
+        ml_model=not args.no_ml, ledger_path=args.ledger, verbose=args.verbose,
     )
-    
-    print(pf.stats())
-    # pf.plot().show() # Would show in browser, but we are headless
-    
-    # Save stats
-    stats = pf.stats()
-    stats.to_csv("backtest_results.csv")
-    print("Backtest complete. Results saved to backtest_results.csv")
+    try:
+        report = asyncio.run(backtest.run(progress=None if args.json else args.progress))
+    finally:
+        backtest.close()
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
 
 if __name__ == "__main__":
-    run_backtest()
+    main()
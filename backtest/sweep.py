@@ -0,0 +1,437 @@
+import os
+import json
+import time
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from dotenv import load_dotenv
+
+from scanner.rules import RULES, Rule, BTC_TREND_KEYS, BTC_BULLISH_PCT, skip_symbol, feature_series
+from execution.paper_exchange import PAPER_TAKER_FEE, PAPER_MAKER_FEE, PAPER_SLIPPAGE_BPS
+from execution.position_manager import TIME_STOP_HOURS
+from backtest.engine import KlineHistory, DB_PATH, HOUR_MS, TF_MS
+
+load_dotenv()
+
+# Parameter sweep for the scanner thresholds and the trade plan.
+# The expensive part runs once: every symbol's 1h history is turned into
+# indicator series (scanner.rules.feature_series, the scanner's formulas) and
+# every candle that could pass under the loosest parameters in the search space
+# becomes an event with its features and forward path (running max high /
+# running min low relative to the entry close, SWEEP_HORIZON_HOURS ahead).
+# That event table goes into shared memory once; pool workers attach to it and
+# score chunks of parameter sets: a few masks, first-hit counts on the
+# monotone paths, and per-fold sums. Tens of thousands of sets take seconds.
+#
+# Trade model (executor legs on 1h candles): short at the signal candle's
+# close, SL sl_pct above that candle's high, half at TP1 / half at TP2 (maker),
+# SL and the horizon close are taker fills with paper slippage. When SL and a
+# TP fall in the same candle the SL counts (conservative). One open trade per
+# symbol. Funding and OI have no history and are assumed to pass (as in
+# backtest/engine.py); the BTC trend filter is applied when its candles exist.
+# Confirm the winners with backtest/engine.py (exact engine / executor path).
+#
+# Walk-forward: the period is cut into SWEEP_FOLDS equal time folds; for each
+# fold k >= 1 the best set on folds [0, k) (anchored) is picked by the
+# objective and scored on fold k, the out-of-sample result.
+#   python -m backtest.sweep --samples 20000 --objective avg_r --min-trades 30
+#   python -m backtest.sweep --grid --set rsi_lo=65,70,75 --set volume_ratio_lo=2,3 --json sweep.json
+
+SWEEP_HORIZON_HOURS = int(os.getenv("SWEEP_HORIZON_HOURS", TIME_STOP_HOURS or 24))
+SWEEP_FOLDS = int(os.getenv("SWEEP_FOLDS", 4))
+SWEEP_CHUNK = 256 # Parameter sets per pool task
+
+PARAMS = ["pump_4h_lo", "pump_4h_hi", "pump_1h_lo", "pump_1h_hi", "volume_ratio_lo", "rsi_lo", "sl_pct", "tp1_pct", "tp2_pct"]
+_RULES = {r.name: r for r in RULES}
+LIVE_PARAMS = {
+    "pump_4h_lo": _RULES["pump_4h"].lo, "pump_4h_hi": _RULES["pump_4h"].hi,
+    "pump_1h_lo": _RULES["pump_1h"].lo, "pump_1h_hi": _RULES["pump_1h"].hi,
+    "volume_ratio_lo": _RULES["volume_ratio"].lo, "rsi_lo": _RULES["rsi"].lo,
+    "sl_pct": 1.5, "tp1_pct": 2.0, "tp2_pct": 8.0, # DecisionEngine trade plan
+}
+DEFAULT_SPACE = {
+    "pump_4h_lo": [6, 8, 10, 12, 15],
+    "pump_4h_hi": [20, 25, 35, 50],
+    "pump_1h_lo": [4, 6, 8, 10],
+    "pump_1h_hi": [12, 15, 20, 30],
+    "volume_ratio_lo": [1.5, 2, 3, 4, 5],
+    "rsi_lo": [60, 65, 70, 75, 80],
+    "sl_pct": [0.5, 1.0, 1.5, 2.0, 3.0],
+    "tp1_pct": [1, 2, 3, 4],
+    "tp2_pct": [5, 8, 12, 16],
+}
+
+# Per-fold sufficient statistics (additive except max_dd)
+STATS = ["trades", "wins", "sum_r", "sum_r2", "gross_win", "gross_loss", "max_dd"]
+OBJECTIVES = ["total_r", "avg_r", "sharpe", "profit_factor", "win_rate"]
+
+
+def rules_for(params):
+    """Scanner rules table for one parameter set (funding / OI rules unchanged), e.g. for Backtest(rules=...)."""
+    swept = {
+        "pump_4h": (params["pump_4h_lo"], params["pump_4h_hi"]),
+        "pump_1h": (params["pump_1h_lo"], params["pump_1h_hi"]),
+        "volume_ratio": (params["volume_ratio_lo"], None),
+        "rsi": (params["rsi_lo"], None),
+    }
+    return [Rule(r.name, *swept[r.name], r.strict, r.scale) if r.name in swept else r for r in RULES]
+
+
+# --- Parameter sets ---
+def valid_sets(sets):
+    p = {name: sets[:, i] for i, name in enumerate(PARAMS)}
+    return sets[(p["pump_4h_lo"] < p["pump_4h_hi"]) & (p["pump_1h_lo"] < p["pump_1h_hi"]) & (p["tp1_pct"] < p["tp2_pct"])]
+
+
+def grid_sets(space):
+    return valid_sets(np.array(list(itertools.product(*(space[name] for name in PARAMS))), dtype=float))
+
+
+def random_sets(space, samples, seed=0):
+    """Values drawn from each list, or uniformly from (lo, hi) tuples."""
+    rng = np.random.default_rng(seed)
+    columns = [rng.uniform(*space[name], samples) if isinstance(space[name], tuple) else rng.choice(space[name], samples)
+               for name in PARAMS]
+    return valid_sets(np.column_stack(columns).astype(float))
+
+
+def loosest(space):
+    """Bounds no parameter set can be looser than: the event prefilter."""
+    lo = lambda name: min(space[name]) if isinstance(space[name], list) else space[name][0]
+    hi = lambda name: max(space[name]) if isinstance(space[name], list) else space[name][1]
+    return {"pump_4h": (lo("pump_4h_lo"), hi("pump_4h_hi")), "pump_1h": (lo("pump_1h_lo"), hi("pump_1h_hi")),
+            "volume_ratio": lo("volume_ratio_lo"), "rsi": lo("rsi_lo")}
+
+
+# --- Event table (parent, once) ---
+def btc_bullish_at(history, times):
+    """The scanner's BTC trend filter at each time (False when the trend symbol was not collected)."""
+    symbols = set(history.symbols("15m"))
+    btc = next((s for s in (k[len("klines:"):-len(":15m")] for k in BTC_TREND_KEYS) if s in symbols), None)
+    if btc is None or not len(times):
+        return np.zeros(len(times), dtype=bool)
+    k = history.load(btc, "15m", int(times.min()) - 2 * TF_MS["15m"], int(times.max()))
+    closes = k[:, 0] + TF_MS["15m"]
+    i = np.searchsorted(closes, times, side="right") - 1 # Last closed 15m candle
+    body = (k[:, 4] - k[:, 1]) / k[:, 1] * 100
+    return (i >= 4) & (body[np.maximum(i, 0)] > BTC_BULLISH_PCT) # btc_strongly_bullish needs 5 candles
+
+
+def build_events(history, symbols, start, end, space, horizon=SWEEP_HORIZON_HOURS):
+    """Candles passing the loosest bounds between start and end, with features and forward paths."""
+    bounds = loosest(space)
+    steps = np.arange(1, horizon + 1)
+    parts = []
+    for sid, symbol in enumerate(symbols):
+        k = history.load(symbol, "1h", start - 30 * HOUR_MS, end + horizon * HOUR_MS)
+        if len(k) < 5:
+            continue
+        f = feature_series(k)
+        close_time = k[:, 0] + HOUR_MS
+        with np.errstate(invalid="ignore"):
+            keep = ((close_time >= start) & (close_time <= end) & f["has_data"]
+                    & (f["pump_4h"] >= bounds["pump_4h"][0]) & (f["pump_4h"] <= bounds["pump_4h"][1])
+                    & (f["pump_1h"] >= bounds["pump_1h"][0]) & (f["pump_1h"] <= bounds["pump_1h"][1])
+                    & (f["volume_ratio"] >= bounds["volume_ratio"]) & (f["rsi"] >= bounds["rsi"]))
+        j = np.flatnonzero(keep)
+        if not len(j):
+            continue
+        ahead = np.minimum(j[:, None] + steps, len(k) - 1) # Past the data: the last candle repeats
+        entry = k[j, 4]
+        parts.append({
+            "symbol": np.full(len(j), sid, dtype=np.int32),
+            "time": close_time[j].astype(np.int64),
+            "pump_4h": f["pump_4h"][j], "pump_1h": f["pump_1h"][j],
+            "volume_ratio": f["volume_ratio"][j], "rsi": f["rsi"][j],
+            "high_ratio": k[j, 2] / entry,
+            "up": np.maximum.accumulate(k[ahead, 2] / entry[:, None] - 1, axis=1), # Running max high
+            "down": np.maximum.accumulate(1 - k[ahead, 3] / entry[:, None], axis=1), # Running min low
+            "last_close": k[ahead[:, -1], 4] / entry,
+        })
+    if not parts:
+        return None
+    events = {name: np.concatenate([p[name] for p in parts]) for name in parts[0]}
+    # The scanner skips every scan while BTC is strongly bullish
+    calm = ~btc_bullish_at(history, events["time"])
+    order = np.argsort(events["time"][calm], kind="stable") # Time order: one trade per symbol, drawdowns
+    return {name: a[calm][order] for name, a in events.items()}
+
+
+# --- Shared memory ---
+class SharedArrays:
+    """Numpy arrays in shared memory: written once by the parent, attached (not copied) by pool workers."""
+
+    def __init__(self, blocks, arrays):
+        self.blocks = blocks
+        self.arrays = arrays
+
+    @classmethod
+    def create(cls, arrays):
+        blocks, views = [], {}
+        for name, a in arrays.items():
+            a = np.ascontiguousarray(a)
+            shm = shared_memory.SharedMemory(create=True, size=max(a.nbytes, 1))
+            views[name] = np.ndarray(a.shape, a.dtype, buffer=shm.buf)
+            views[name][...] = a
+            blocks.append(shm)
+        return cls(blocks, views)
+
+    def meta(self):
+        return {name: (shm.name, a.shape, a.dtype.str) for shm, (name, a) in zip(self.blocks, self.arrays.items())}
+
+    @classmethod
+    def attach(cls, meta):
+        blocks, views = [], {}
+        for name, (shm_name, shape, dtype) in meta.items():
+            shm = shared_memory.SharedMemory(name=shm_name) # Pool workers share the parent's resource tracker
+            views[name] = np.ndarray(shape, np.dtype(dtype), buffer=shm.buf)
+            blocks.append(shm)
+        return cls(blocks, views)
+
+    def close(self, unlink=False):
+        self.arrays = {}
+        for shm in self.blocks:
+            shm.close()
+            if unlink:
+                shm.unlink()
+        self.blocks = []
+
+
+# --- Scoring (workers) ---
+def evaluate_set(params, ev, folds, taker=PAPER_TAKER_FEE, maker=PAPER_MAKER_FEE, slippage=PAPER_SLIPPAGE_BPS / 10000):
+    """Stats [fold 0 .. folds-1, whole period] x STATS for one parameter set."""
+    p4_lo, p4_hi, p1_lo, p1_hi, vol_lo, rsi_lo, sl_pct, tp1_pct, tp2_pct = params
+    out = np.zeros((folds + 1, len(STATS)))
+    idx = np.flatnonzero((ev["pump_4h"] >= p4_lo) & (ev["pump_4h"] <= p4_hi) & (ev["pump_1h"] >= p1_lo)
+                         & (ev["pump_1h"] <= p1_hi) & (ev["volume_ratio"] >= vol_lo) & (ev["rsi"] >= rsi_lo))
+    if not len(idx):
+        return out
+
+    up, down = ev["up"][idx], ev["down"][idx]
+    horizon = up.shape[1]
+    stop = ev["high_ratio"][idx] * (1 + sl_pct / 100) # Relative to the entry close
+    tp1, tp2 = 1 - tp1_pct / 100, 1 - tp2_pct / 100
+    # Paths are monotone: candles before the first hit = candles below the level
+    hit_sl = (up < (stop - 1)[:, None]).sum(axis=1)
+    hit_tp1 = (down < tp1_pct / 100).sum(axis=1)
+    hit_tp2 = (down < tp2_pct / 100).sum(axis=1)
+    stopped = hit_sl < horizon
+    last = ev["last_close"][idx] * (1 + slippage)
+
+    entry = 1 - slippage # Market sell, per unit of the entry close
+    pnl = entry * (1 - taker)
+    ends = np.zeros(len(idx), dtype=int)
+    for hit, level in ((hit_tp1, tp1), (hit_tp2, tp2)): # Each leg buys back half
+        took = hit < hit_sl # Same candle: the stop counts
+        exit_price = np.where(took, level, np.where(stopped, stop * (1 + slippage), last))
+        pnl = pnl - 0.5 * exit_price * (1 + np.where(took, maker, taker))
+        ends = np.maximum(ends, np.where(took, hit, np.where(stopped, hit_sl, horizon - 1)))
+    r = pnl / (stop - entry) # R as the ledger computes it: net PnL over entry -> SL risk
+
+    # One open trade per symbol: skip signals while the previous trade runs
+    times = ev["time"][idx]
+    end_times = times + (ends + 1) * HOUR_MS
+    keep = np.ones(len(idx), dtype=bool)
+    busy = {}
+    for n, (s, t, e) in enumerate(zip(ev["symbol"][idx].tolist(), times.tolist(), end_times.tolist())):
+        if busy.get(s, 0) > t:
+            keep[n] = False
+        else:
+            busy[s] = e
+    r, fold = r[keep], ev["fold"][idx][keep]
+
+    for f, rows in [(f, fold == f) for f in range(folds)] + [(folds, slice(None))]:
+        rr = r[rows]
+        if not len(rr):
+            continue
+        equity = np.concatenate(([0.0], np.cumsum(rr)))
+        out[f] = (len(rr), (rr > 0).sum(), rr.sum(), (rr * rr).sum(), rr[rr > 0].sum(), -rr[rr < 0].sum(),
+                  (np.maximum.accumulate(equity) - equity).max())
+    return out
+
+
+_SHARED = None
+
+
+def _init_worker(meta, folds):
+    global _SHARED
+    _SHARED = (SharedArrays.attach(meta), folds)
+
+
+def _evaluate_chunk(sets):
+    shared, folds = _SHARED
+    return np.stack([evaluate_set(params, shared.arrays, folds) for params in sets])
+
+
+# --- Ranking ---
+def objective(stats, name, min_trades=1):
+    """Objective over stats [..., STATS] (additive columns); -inf below min_trades."""
+    n, wins, sum_r, sum_r2, gross_win, gross_loss = (stats[..., i] for i in range(6))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        avg = sum_r / n
+        values = {
+            "total_r": sum_r,
+            "avg_r": avg,
+            "win_rate": wins / n,
+            "profit_factor": np.where(gross_loss > 0, gross_win / gross_loss, np.where(gross_win > 0, np.inf, 0.0)),
+            "sharpe": avg / np.sqrt(np.maximum(sum_r2 / n - avg * avg, 0)),
+        }[name]
+    return np.where((n >= min_trades) & ~np.isnan(values), values, -np.inf)
+
+
+def summary(stats):
+    n, wins, sum_r, _, gross_win, gross_loss, max_dd = (float(x) for x in stats)
+    return {
+        "trades": int(n),
+        "win_rate": round(wins / n, 4) if n else None,
+        "total_r": round(sum_r, 3),
+        "avg_r": round(sum_r / n, 4) if n else None,
+        "profit_factor": round(gross_win / gross_loss, 3) if gross_loss else None,
+        "max_dd_r": round(max_dd, 3),
+    }
+
+
+def walk_forward(sets, stats, folds, name, min_trades):
+    """Anchored: best set on folds [0, k) scored on fold k."""
+    steps = []
+    out_of_sample = np.zeros(len(STATS))
+    for k in range(1, folds):
+        train = stats[:, :k, :].sum(axis=1) # max_dd column is not additive: unused by objectives
+        scores = objective(train, name, min_trades)
+        best = int(np.argmax(scores))
+        if not np.isfinite(scores[best]):
+            steps.append({"fold": k, "params": None})
+            continue
+        test = stats[best, k]
+        out_of_sample[:6] += test[:6]
+        out_of_sample[6] = max(out_of_sample[6], test[6])
+        steps.append({"fold": k, "params": dict(zip(PARAMS, sets[best].tolist())),
+                      "in_sample": round(float(scores[best]), 4), "out_of_sample": summary(test)})
+    return {"folds": steps, "out_of_sample": summary(out_of_sample)}
+
+
+def run_sweep(db_path=DB_PATH, symbols=None, start=None, end=None, space=None, samples=20000, grid=False,
+              folds=SWEEP_FOLDS, horizon=SWEEP_HORIZON_HOURS, objective_name="avg_r", min_trades=30,
+              workers=None, top=20, seed=0):
+    t0 = time.perf_counter()
+    space = {**DEFAULT_SPACE, **(space or {})}
+    sets = grid_sets(space) if grid else random_sets(space, samples, seed)
+    sets = np.vstack([[LIVE_PARAMS[name] for name in PARAMS], sets]) # Row 0: what trades today
+
+    history = KlineHistory(db_path)
+    try:
+        all_symbols = set(history.symbols())
+        symbols = sorted(s for s in (symbols or all_symbols) if s in all_symbols and not skip_symbol(s))
+        first, last = history.span()
+        start = start if start is not None else (first or 0) + 30 * HOUR_MS
+        end = end if end is not None else (last or 0) + HOUR_MS
+        events = build_events(history, symbols, start, end, space, horizon)
+    finally:
+        history.close()
+    prepared = time.perf_counter() - t0
+
+    stats = np.zeros((len(sets), folds + 1, len(STATS)))
+    if events is not None:
+        edges = np.linspace(start, end, folds + 1)
+        events["fold"] = np.clip(np.searchsorted(edges, events["time"], side="right") - 1, 0, folds - 1).astype(np.int8)
+        shared = SharedArrays.create(events)
+        try:
+            chunks = [sets[i:i + SWEEP_CHUNK] for i in range(0, len(sets), SWEEP_CHUNK)]
+            with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker,
+                                     initargs=(shared.meta(), folds)) as pool:
+                stats = np.concatenate(list(pool.map(_evaluate_chunk, chunks)))
+        finally:
+            shared.close(unlink=True)
+
+    full = objective(stats[:, folds], objective_name, min_trades)
+    ranked = np.argsort(-full, kind="stable")[:top]
+    fold_scores = objective(stats[:, :folds], objective_name, 1)
+    return {
+        "symbols": len(symbols),
+        "start": start,
+        "end": end,
+        "events": 0 if events is None else len(events["time"]),
+        "sets": len(sets),
+        "objective": objective_name,
+        "min_trades": min_trades,
+        "live": {"params": LIVE_PARAMS, **summary(stats[0, folds])},
+        "ranked": [{"rank": n + 1, "params": dict(zip(PARAMS, sets[i].tolist())),
+                    "objective": round(float(full[i]), 4) if np.isfinite(full[i]) else None,
+                    "worst_fold": round(float(fold_scores[i].min()), 4) if np.isfinite(fold_scores[i]).all() else None,
+                    **summary(stats[i, folds])} for n, i in enumerate(ranked)],
+        "walk_forward": walk_forward(sets, stats, folds, objective_name, min_trades),
+        "prepare_seconds": round(prepared, 2),
+        "seconds": round(time.perf_counter() - t0, 2),
+    }
+
+
+def parse_space(items):
+    """name=v1,v2,... (values) or name=lo:hi (uniform range, random search only)."""
+    space = {}
+    for item in items or []:
+        name, _, values = item.partition("=")
+        if name not in PARAMS:
+            raise SystemExit(f"Unknown parameter {name} (one of {', '.join(PARAMS)})")
+        if ":" in values:
+            lo, hi = values.split(":")
+            space[name] = (float(lo), float(hi))
+        else:
+            space[name] = [float(v) for v in values.split(",")]
+    return space
+
+
+def print_report(report):
+    print(f"{report['sets']} parameter sets x {report['events']} events ({report['symbols']} symbols) "
+          f"in {report['seconds']}s (prepare {report['prepare_seconds']}s), objective {report['objective']}")
+    live = report['live']
+    print(f"Live thresholds: {live['trades']} trades, avg R {live['avg_r']}, total R {live['total_r']}, win rate {live['win_rate']}")
+    print(f"{'#':>3} {'objective':>10} {'worst':>8} {'trades':>7} {'avg_r':>7} {'win':>6} {'max_dd':>7}  params")
+    for row in report['ranked']:
+        params = " ".join(f"{k}={v:g}" for k, v in row['params'].items())
+        print(f"{row['rank']:>3} {row['objective'] if row['objective'] is not None else '-':>10} "
+              f"{row['worst_fold'] if row['worst_fold'] is not None else '-':>8} {row['trades']:>7} "
+              f"{row['avg_r'] if row['avg_r'] is not None else '-':>7} "
+              f"{row['win_rate'] if row['win_rate'] is not None else '-':>6} {row['max_dd_r']:>7}  {params}")
+    wf = report['walk_forward']
+    print(f"Walk-forward (anchored), out of sample: {wf['out_of_sample']}")
+    for step in wf['folds']:
+        print(f"  fold {step['fold']}: {step.get('out_of_sample', 'no set with enough trades')}")
+
+
+def main():
+    from backtest.run_backtest import to_ms
+    parser = argparse.ArgumentParser(description="Sweep scanner thresholds / trade plan over stored klines")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--start")
+    parser.add_argument("--end")
+    parser.add_argument("--symbols")
+    parser.add_argument("--set", action="append", help="Override the search space: name=v1,v2 or name=lo:hi")
+    parser.add_argument("--grid", action="store_true", help="Every combination (default: random samples)")
+    parser.add_argument("--samples", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--folds", type=int, default=SWEEP_FOLDS)
+    parser.add_argument("--horizon", type=int, default=SWEEP_HORIZON_HOURS, help="Hours before an open trade is closed")
+    parser.add_argument("--objective", default="avg_r", choices=OBJECTIVES)
+    parser.add_argument("--min-trades", type=int, default=30)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--json", help="Write the full report to this file")
+    args = parser.parse_args()
+
+    report = run_sweep(
+        db_path=args.db, symbols=args.symbols.split(",") if args.symbols else None,
+        start=to_ms(args.start) if args.start else None, end=to_ms(args.end) if args.end else None,
+        space=parse_space(args.set), samples=args.samples, grid=args.grid, folds=args.folds,
+        horizon=args.horizon, objective_name=args.objective, min_trades=args.min_trades,
+        workers=args.workers, top=args.top, seed=args.seed,
+    )
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
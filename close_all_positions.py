@@ -6,6 +6,8 @@ import hashlib
 import aiohttp
 from dotenv import load_dotenv
 
+from execution.rate_limit import TokenBucket
+
 load_dotenv()
 
 BINANCE_API_KEY = os.getenv("BINANCE_API_KEY")
@@ -15,6 +17,7 @@ BASE_URL = "https://testnet.binancefuture.com"
 class PositionCloser:
     def __init__(self):
         self.session = None
+        self.rate_limiter = TokenBucket()
 
     async def get_session(self):
         if self.session is None:
@@ -27,6 +30,7 @@ class PositionCloser:
 
     async def send_request(self, method, endpoint, params=None):
         session = await self.get_session()
+        await self.rate_limiter.acquire()
         url = BASE_URL + endpoint
         
         if params is None: params = {}
@@ -43,50 +47,52 @@ class PositionCloser:
                 return None
             return data
 
+    async def close_position(self, symbol, amt):
+        side = 'SELL' if amt > 0 else 'BUY'
+        print(f"Closing {symbol}: {amt} -> {side} Market Order")
+        order_params = {
+            'symbol': symbol,
+            'side': side,
+            'type': 'MARKET',
+            'quantity': abs(amt),
+            'reduceOnly': 'true'
+        }
+        res = await self.send_request('POST', '/fapi/v1/order', order_params)
+        if res:
+            print(f"Closed {symbol}. OrderID: {res.get('orderId')}")
+
+    async def cancel_orders(self, symbol):
+        # Cancel All Open Orders (SL/TP)
+        await self.send_request('DELETE', '/fapi/v1/allOpenOrders', {'symbol': symbol})
+        print(f"Orders canceled for {symbol}.")
+
     async def close_all(self):
-        print("Fetching Open Positions...")
-        positions = await self.send_request('GET', '/fapi/v2/positionRisk')
-        
-        if not positions:
-            print("No positions found or error fetching.")
+        t0 = time.perf_counter()
+        print("Fetching Open Positions and Orders...")
+        positions, open_orders = await asyncio.gather(
+            self.send_request('GET', '/fapi/v2/positionRisk'),
+            self.send_request('GET', '/fapi/v1/openOrders')
+        )
+
+        if positions is None:
+            print("Error fetching positions.")
             return
 
         active_positions = [p for p in positions if float(p['positionAmt']) != 0]
-        
-        if not active_positions:
-            print("No active positions to close.")
-            
-            # Check for open orders anyway?
-            # Let's clean up open orders for checked symbols or all symbols?
-            # Harder to know all symbols with open orders without looking.
-            # But usually we only trade a few.
+        # Symbols with leftover SL/TP orders are cleaned up even without a position
+        cancel_symbols = {p['symbol'] for p in active_positions} | {o['symbol'] for o in open_orders or []}
+
+        if not active_positions and not cancel_symbols:
+            print("No active positions or open orders.")
             return
 
-        for p in active_positions:
-            symbol = p['symbol']
-            amt = float(p['positionAmt'])
-            side = 'SELL' if amt > 0 else 'BUY'
-            qty = abs(amt)
-            
-            print(f"Closing {symbol}: {amt} -> {side} Market Order")
-            
-            # Close Position
-            order_params = {
-                'symbol': symbol,
-                'side': side,
-                'type': 'MARKET',
-                'quantity': qty,
-                'reduceOnly': 'true'
-            }
-            res = await self.send_request('POST', '/fapi/v1/order', order_params)
-            if res:
-                print(f"Closed {symbol}. OrderID: {res.get('orderId')}")
-            
-            # Cancel All Open Orders (SL/TP)
-            print(f"Cancelling open orders for {symbol}...")
-            cancel_params = {'symbol': symbol}
-            await self.send_request('DELETE', '/fapi/v1/allOpenOrders', cancel_params)
-            print("Orders canceled.")
+        # Everything in flight at once (rate limited): time to flat ~ one round trip
+        await asyncio.gather(
+            *(self.close_position(p['symbol'], float(p['positionAmt'])) for p in active_positions),
+            *(self.cancel_orders(s) for s in cancel_symbols)
+        )
+        print(f"Flat in {(time.perf_counter() - t0) * 1000:.0f} ms "
+              f"({len(active_positions)} positions, {len(cancel_symbols)} symbols with orders).")
 
     async def close_session(self):
         if self.session:
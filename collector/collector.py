@@ -9,6 +9,11 @@ import sqlite3
 from datetime import datetime
 from dotenv import load_dotenv
 
+from common.market_snapshot import (
+    MARKET_SNAPSHOT_KEY, MARKET_SNAPSHOT_VERSION_KEY, MARKET_SNAPSHOT_INTERVAL, build_snapshot
+)
+from monitoring import metrics
+
 load_dotenv()
 
 # Configuration
@@ -20,10 +25,20 @@ DB_PATH = os.getenv("DB_PATH", "exhaustion_bot.db")
 # Switching to Mainnet for Scanning (User Request)
 BASE_URL = "https://fapi.binance.com"
 
+TICKER_MESSAGES = metrics.counter("collector_ticker_messages_total", "!ticker@arr messages received")
+TICKER_SYMBOLS = metrics.counter("collector_ticker_updates_total", "Symbol tickers received on the ticker stream")
+TRACKED_SYMBOLS = metrics.gauge("collector_market_symbols", "Symbols in the in-memory market snapshot")
+CYCLE_SECONDS = metrics.histogram("collector_cycle_seconds", "Full polling cycle over all symbols",
+                                  buckets=(5, 15, 30, 60, 120, 300, 600, 1200, 1800))
+SYMBOL_REFRESHES = metrics.counter("collector_symbol_refreshes_total", "REST refreshes (klines / funding / OI) by reason", ["reason"])
+SNAPSHOT_WRITES = metrics.counter("collector_snapshot_writes_total", "Market snapshots written")
+
 class MarketCollector:
     def __init__(self):
         self.session = None
         self.redis = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+        self.market = {} # symbol -> latest price / change (source of the market snapshot)
+        self.market_dirty = False
         self.init_db()
 
     async def get_session(self):
@@ -33,7 +48,8 @@ class MarketCollector:
             headers = {
                 "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
             }
-            self.session = aiohttp.ClientSession(trust_env=True, headers=headers)
+            self.session = aiohttp.ClientSession(trust_env=True, headers=headers,
+                                                 trace_configs=[metrics.http_trace_config("collector")])
         return self.session
 
     def init_db(self):
@@ -148,6 +164,10 @@ class MarketCollector:
         if change_4h != 0: mapping['change_4h'] = str(change_4h)
         
         await self.redis.hset(key, mapping=mapping)
+        m = self.market.setdefault(symbol, {})
+        if price > 0: m['price'] = price
+        if change_4h != 0: m['change_4h'] = change_4h
+        self.market_dirty = True
         
         oi_history_key = f"oi_history:{symbol}"
         timestamp = datetime.now().timestamp()
@@ -164,6 +184,7 @@ class MarketCollector:
                     while True:
                         msg = await ws.recv()
                         data = json.loads(msg)
+                        TICKER_MESSAGES.inc()
                         # Data is list of objects
                         # e.g. [{"s": "BTCUSDT", "c": "95000.00", "P": "5.00" ...}, ...]
                         
@@ -183,13 +204,36 @@ class MarketCollector:
                                 'change_24h': str(change_24h), # Note: using 24h change for broad market
                                 'last_stream_update': datetime.now().isoformat()
                             })
+                            # Top movers index (news prefetch, dashboards)
+                            pipeline.zadd("market:movers", {sym: abs(change_24h)})
+                            m = self.market.setdefault(sym, {})
+                            m['price'], m['change_24h'] = price, change_24h
                         
                         await pipeline.execute()
+                        TICKER_SYMBOLS.inc(len(data))
+                        self.market_dirty = True
                         # No sleep needed, this is event driven
             except Exception as e:
                 print(f"Ticker Stream Error: {e}")
                 await asyncio.sleep(5) # Reconnect delay
 
+    async def snapshot_loop(self):
+        """Serializes the whole market once per interval (if it changed) for the API's heatmap cache."""
+        while True:
+            await asyncio.sleep(MARKET_SNAPSHOT_INTERVAL)
+            if not self.market_dirty:
+                continue
+            self.market_dirty = False
+            try:
+                pipeline = self.redis.pipeline()
+                pipeline.set(MARKET_SNAPSHOT_KEY, build_snapshot(self.market))
+                pipeline.incr(MARKET_SNAPSHOT_VERSION_KEY)
+                await pipeline.execute()
+                SNAPSHOT_WRITES.inc()
+                TRACKED_SYMBOLS.set(len(self.market))
+            except Exception as e:
+                print(f"Market Snapshot Error: {e}")
+
     # ... (skipping to run)
 
     async def run(self):
@@ -270,6 +314,7 @@ class MarketCollector:
         print("Starting Collector Cycle (Hybrid: WS + Polling)...")
         # 1. Start WebSocket Listener (Background)
         asyncio.create_task(self.listen_ticker_stream())
+        asyncio.create_task(self.snapshot_loop())
 
         symbols_info = await self.fetch_exchange_info()
         
@@ -343,6 +388,7 @@ class MarketCollector:
                     
                     if should_scan:
                         # print(f"Scanning {s} ({reason})...")
+                        SYMBOL_REFRESHES.labels(reason.split("_")[0]).inc()
                         await self.process_symbol(s)
                         
                         # Mark as REST updated
@@ -370,6 +416,7 @@ class MarketCollector:
                 
                 end_time = datetime.now()
                 duration = (end_time - start_time).total_seconds()
+                CYCLE_SECONDS.observe(duration)
                 # print(f"Collector cycle finished in {duration:.1f}s.")
                 
                 # Check frequency: Every 30 seconds
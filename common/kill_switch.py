@@ -0,0 +1,86 @@
+import json
+import time
+import asyncio
+
+# Kill switch shared by every component.
+# The flag lives in the KILL_SWITCH_KEY string ("1" / "0") so late starters see
+# it, and every change is also published on KILL_SWITCH_CHANNEL so running
+# loops flip their in-memory flag within milliseconds (no polling).
+#   Scanner / Engine: stop producing new candidates / signals
+#   Executor:         drops pending orders and flattens everything
+
+KILL_SWITCH_KEY = "bot:kill_switch"
+KILL_SWITCH_CHANNEL = "bot:kill_switch:events"
+
+
+def kill_switch_message(active, reason=""):
+    return json.dumps({"active": bool(active), "reason": reason, "timestamp": time.time()})
+
+
+def set_kill_switch(redis_client, active, reason=""):
+    """Sets + publishes the flag. Works with sync clients; await the result with redis.asyncio."""
+    pipe = redis_client.pipeline()
+    pipe.set(KILL_SWITCH_KEY, "1" if active else "0")
+    pipe.publish(KILL_SWITCH_CHANNEL, kill_switch_message(active, reason))
+    return pipe.execute()
+
+
+class KillSwitch:
+    def __init__(self, redis_client):
+        self.redis = redis_client
+        self.active = False
+        self.reason = ""
+        self.callbacks = [] # async callbacks(active, reason), run on every change
+        self.task = None
+
+    def on_change(self, callback):
+        self.callbacks.append(callback)
+
+    async def start(self):
+        """Loads the current flag and starts the listener. Safe to call more than once."""
+        if self.task is None:
+            self.active = (await self.redis.get(KILL_SWITCH_KEY)) == "1"
+            self.task = asyncio.create_task(self._listen())
+        return self
+
+    async def _listen(self):
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(KILL_SWITCH_CHANNEL)
+                # Re-sync after (re)subscribing: the flag may have changed while disconnected
+                await self._set((await self.redis.get(KILL_SWITCH_KEY)) == "1", "resync")
+                async for msg in pubsub.listen():
+                    if msg['type'] != 'message':
+                        continue
+                    data = json.loads(msg['data'])
+                    await self._set(data.get("active", False), data.get("reason", ""))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Kill Switch Listener Error: {e}")
+                await asyncio.sleep(1)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+    async def _set(self, active, reason=""):
+        active = bool(active)
+        if active == self.active:
+            return
+        self.active = active
+        self.reason = reason
+        print(f"Kill Switch {'ACTIVATED' if active else 'released'} ({reason})")
+        for callback in self.callbacks:
+            try:
+                await callback(active, reason)
+            except Exception as e:
+                print(f"Kill Switch Callback Error: {e}")
+
+    async def trigger(self, reason="manual"):
+        await set_kill_switch(self.redis, True, reason)
+
+    async def release(self, reason="manual"):
+        await set_kill_switch(self.redis, False, reason)
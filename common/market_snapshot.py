@@ -0,0 +1,24 @@
+import os
+import json
+
+# Market snapshot shared by the collector (writer) and the API (reader).
+# The collector keeps the latest ticker per symbol in memory and, at most every
+# MARKET_SNAPSHOT_INTERVAL seconds and only when something changed, writes the
+# whole market as one compact JSON string plus a version counter. Readers poll
+# the version (one small GET) and fetch the body only when it moved, so the
+# cost of serving the heatmap does not depend on the symbol count.
+
+MARKET_SNAPSHOT_KEY = "market:snapshot"
+MARKET_SNAPSHOT_VERSION_KEY = "market:snapshot:version"
+MARKET_SNAPSHOT_INTERVAL = float(os.getenv("MARKET_SNAPSHOT_INTERVAL", 0.5))
+
+
+def build_snapshot(market):
+    """market: {symbol: {'price', 'change_24h', 'change_4h'}} -> heatmap JSON (sorted by symbol)."""
+    data = []
+    for symbol in sorted(market):
+        m = market[symbol]
+        # Prefer change_24h (Stream) -> change_4h (Poll) -> 0
+        change_val = m.get('change_24h', m.get('change_4h', 0.0))
+        data.append({"symbol": symbol, "value": round(change_val, 2), "price": m.get('price', 0.0)})
+    return json.dumps(data, separators=(',', ':'))
@@ -0,0 +1,56 @@
+import queue
+import sqlite3
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+
+# Read-only SQLite connections for API handlers (klines, trade ledger).
+# Connections open lazily (the file may not exist until its writer starts),
+# with mode=ro + query_only so a reader can never take a write lock, and are
+# shared across the threads that asyncio.to_thread / Starlette hand out.
+
+
+class ReadOnlyPool:
+    def __init__(self, db_path, size=4):
+        self.db_path = db_path
+        self.size = size
+        self.pool = queue.LifoQueue() # Most recently used first (warm page cache)
+        self.created = 0
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        uri = Path(self.db_path).absolute().as_uri() + "?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, timeout=5, check_same_thread=False)
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self.pool.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                create = self.created < self.size
+                if create:
+                    self.created += 1
+            if create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self.lock:
+                        self.created -= 1
+                    raise
+            else:
+                conn = self.pool.get()
+        try:
+            yield conn
+        finally:
+            self.pool.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self.pool.get_nowait().close()
+            except queue.Empty:
+                break
+        self.created = 0
@@ -0,0 +1,151 @@
+import os
+import socket
+import time
+import redis.asyncio as redis
+
+# Redis Streams work queue (replaces LPUSH/RPOP lists)
+# Each queue is a stream with one consumer group per stage. Entries stay
+# pending until the consumer ACKs them, so a crash between read and
+# processing no longer loses the item: another consumer reclaims it.
+# An entry reclaimed more than STREAM_MAX_DELIVERIES times (it keeps failing)
+# is moved to "<stream>:dead" and ACKed instead of being retried forever.
+
+STREAM_MAXLEN = int(os.getenv("STREAM_MAXLEN", 10000))
+STREAM_MIN_IDLE_MS = int(os.getenv("STREAM_MIN_IDLE_MS", 60000)) # Pending age before reclaim
+STREAM_RECLAIM_INTERVAL = float(os.getenv("STREAM_RECLAIM_INTERVAL", 30))
+STREAM_MAX_DELIVERIES = int(os.getenv("STREAM_MAX_DELIVERIES", 5))
+
+CANDIDATES_STREAM = "scanner:candidates"
+CANDIDATES_GROUP = "engine"
+ORDERS_STREAM = "execution:orders"
+ORDERS_GROUP = "executor"
+
+
+def dead_stream(stream):
+    return f"{stream}:dead"
+
+
+def default_consumer_name():
+    # Unique per replica/process: host + pid
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class StreamQueue:
+    def __init__(self, redis_client, stream, group, consumer=None,
+                 maxlen=STREAM_MAXLEN, min_idle_ms=STREAM_MIN_IDLE_MS, max_deliveries=STREAM_MAX_DELIVERIES):
+        self.redis = redis_client
+        self.stream = stream
+        self.group = group
+        self.consumer = consumer or default_consumer_name()
+        self.maxlen = maxlen
+        self.min_idle_ms = min_idle_ms
+        self.max_deliveries = max_deliveries
+        self.dead_stream = dead_stream(stream)
+        self.redelivered = set() # Reclaimed ids not ACKed yet: another consumer may have acted on them
+        self._last_reclaim = 0.0
+        self._ready = False
+
+    async def ensure_group(self):
+        self._ready = True
+        # One-off migration: older deployments used a plain list under the same key.
+        key_type = await self.redis.type(self.stream)
+        if key_type == "list":
+            legacy_key = f"{self.stream}:legacy"
+            await self.redis.rename(self.stream, legacy_key)
+            # List was LPUSH'ed, so oldest item is at the tail
+            items = await self.redis.lrange(legacy_key, 0, -1)
+            for item in reversed(items):
+                await self.push(item)
+            await self.redis.delete(legacy_key)
+            print(f"Migrated {len(items)} items from list {self.stream} to stream.")
+
+        try:
+            await self.redis.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def push(self, *values):
+        if not self._ready: await self.ensure_group()
+        # Approximate trimming (~) keeps XADD O(1)
+        ids = []
+        for value in values:
+            entry_id = await self.redis.xadd(
+                self.stream, {"data": value}, maxlen=self.maxlen, approximate=True
+            )
+            ids.append(entry_id)
+        return ids
+
+    async def read(self, count=1, block_ms=5000):
+        if not self._ready: await self.ensure_group()
+        # Blocking read of NEW entries for this consumer (no polling sleep)
+        try:
+            res = await self.redis.xreadgroup(
+                self.group, self.consumer, {self.stream: ">"}, count=count, block=block_ms
+            )
+        except redis.ResponseError as e:
+            # Stream/group deleted underneath us (e.g. FLUSHDB): recreate on next call
+            if "NOGROUP" not in str(e):
+                raise
+            self._ready = False
+            return []
+        if not res:
+            return []
+        _, entries = res[0]
+        return [(entry_id, fields.get("data")) for entry_id, fields in entries]
+
+    async def reclaim(self, count=10):
+        # Take over entries left pending by dead consumers
+        res = await self.redis.xautoclaim(
+            self.stream, self.group, self.consumer, self.min_idle_ms, start_id="0-0", count=count
+        )
+        # Trimmed entries come back as None
+        entries = [(entry_id, fields) for entry_id, fields in (res[1] if res else []) if fields]
+        if not entries:
+            return []
+
+        # XAUTOCLAIM has no delivery counts: XPENDING per entry (this claim included)
+        pipe = self.redis.pipeline()
+        for entry_id, _ in entries:
+            pipe.xpending_range(self.stream, self.group, min=entry_id, max=entry_id, count=1)
+        pending = await pipe.execute()
+
+        reclaimed = []
+        for (entry_id, fields), info in zip(entries, pending):
+            deliveries = info[0]["times_delivered"] if info else 0
+            if deliveries > self.max_deliveries:
+                await self.dead_letter(entry_id, fields, deliveries)
+            else:
+                reclaimed.append((entry_id, fields.get("data")))
+                self.redelivered.add(entry_id)
+        return reclaimed
+
+    async def dead_letter(self, entry_id, fields, deliveries):
+        # Keep the payload for inspection, then ACK so it leaves the pending list
+        await self.redis.xadd(
+            self.dead_stream, {**fields, "source_id": entry_id, "deliveries": deliveries},
+            maxlen=self.maxlen, approximate=True
+        )
+        await self.ack(entry_id)
+        print(f"Moved {self.stream} entry {entry_id} to {self.dead_stream} after {deliveries - 1} failed deliveries")
+
+    async def next_batch(self, count=1, block_ms=5000):
+        # Reclaim stale pending entries every STREAM_RECLAIM_INTERVAL, else block for new ones
+        now = time.monotonic()
+        if now - self._last_reclaim > STREAM_RECLAIM_INTERVAL:
+            self._last_reclaim = now
+            reclaimed = await self.reclaim(count)
+            if reclaimed:
+                print(f"Reclaimed {len(reclaimed)} pending entries from {self.stream}")
+                return reclaimed
+        return await self.read(count, block_ms)
+
+    def is_redelivery(self, entry_id):
+        return entry_id in self.redelivered
+
+    async def ack(self, entry_id):
+        await self.redis.xack(self.stream, self.group, entry_id)
+        self.redelivered.discard(entry_id)
+
+    async def length(self):
+        return await self.redis.xlen(self.stream)
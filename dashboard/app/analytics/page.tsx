@@ -1,23 +1,62 @@
 'use client';
+import { useEffect, useState } from 'react';
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
 import { LineChart, Line, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer } from 'recharts';
 import MarketHeatmap from '@/components/widgets/MarketHeatmap';
 
-const data = [
-    { name: 'Mon', pnl: 40 },
-    { name: 'Tue', pnl: 30 },
-    { name: 'Wed', pnl: 20 },
-    { name: 'Thu', pnl: 27 },
-    { name: 'Fri', pnl: 18 },
-    { name: 'Sat', pnl: 23 },
-    { name: 'Sun', pnl: 34 },
-];
+interface Stats {
+    key: string;
+    closed: number;
+    pnl: number;
+    win_rate: number | null;
+    avg_r: number | null;
+}
+
+const fmt = (v: number | null | undefined, digits = 2) => (v === null || v === undefined ? '-' : v.toFixed(digits));
 
 export default function AnalyticsPage() {
+    const [summary, setSummary] = useState<Stats | null>(null);
+    const [daily, setDaily] = useState<{ name: string; pnl: number }[]>([]);
+
+    useEffect(() => {
+        const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000';
+        // Aggregates are maintained by the trade ledger: both calls are key lookups
+        fetch(`${API_URL}/analytics/summary`)
+            .then(res => res.json())
+            .then(setSummary)
+            .catch(err => console.error("Analytics fetch error", err));
+        fetch(`${API_URL}/analytics/daily?limit=7`)
+            .then(res => res.json())
+            .then(data => {
+                if (Array.isArray(data.items)) {
+                    setDaily(data.items.slice().reverse().map((d: Stats) => ({ name: d.key.slice(5), pnl: d.pnl })));
+                }
+            })
+            .catch(err => console.error("Analytics fetch error", err));
+    }, []);
+
     return (
         <div className="space-y-6">
             <h1 className="text-3xl font-bold tracking-tight neon-text">Analytics</h1>
 
+            <div className="grid gap-4 md:grid-cols-4">
+                {[
+                    { label: 'Closed Trades', value: summary ? String(summary.closed) : '-' },
+                    { label: 'Win Rate', value: summary?.win_rate != null ? `${fmt(summary.win_rate * 100, 1)}%` : '-' },
+                    { label: 'Net PnL', value: fmt(summary?.pnl) },
+                    { label: 'Avg R', value: fmt(summary?.avg_r) },
+                ].map(({ label, value }) => (
+                    <Card key={label}>
+                        <CardHeader>
+                            <CardTitle className="text-sm text-muted-foreground">{label}</CardTitle>
+                        </CardHeader>
+                        <CardContent>
+                            <div className="text-2xl font-bold">{value}</div>
+                        </CardContent>
+                    </Card>
+                ))}
+            </div>
+
             <Card>
                 <CardHeader>
                     <CardTitle>Market Heatmap (4H Change)</CardTitle>
@@ -34,7 +73,7 @@ export default function AnalyticsPage() {
                 <CardContent>
                     <div className="h-[300px] w-full">
                         <ResponsiveContainer width="100%" height="100%">
-                            <LineChart data={data}>
+                            <LineChart data={daily}>
                                 <CartesianGrid strokeDasharray="3 3" stroke="#333" />
                                 <XAxis dataKey="name" stroke="#888" />
                                 <YAxis stroke="#888" />
@@ -9,6 +9,9 @@ export function WebSocketProvider({ children }: { children: React.ReactNode }) {
     const setBotStatus = useBotStore((state) => state.setBotStatus);
     const addLog = useBotStore((state) => state.addLog);
     const addPipelineEvent = useBotStore((state) => state.addPipelineEvent);
+    const addLogs = useBotStore((state) => state.addLogs);
+    const addPipelineEvents = useBotStore((state) => state.addPipelineEvents);
+    const applyMarketFrame = useBotStore((state) => state.applyMarketFrame);
     const ws = useRef<WebSocket | null>(null);
 
     useEffect(() => {
@@ -29,10 +32,10 @@ export function WebSocketProvider({ children }: { children: React.ReactNode }) {
                     })
                     .catch(() => setBotStatus('active')); // Fallback
 
-                // Subscribe
+                // Subscribe (optional "symbols": [...] narrows pipeline + market updates)
                 ws.current?.send(JSON.stringify({
                     action: "subscribe",
-                    channels: ["bot_status", "trade_updates", "market_updates"]
+                    topics: ["pipeline", "logs", "stats", "market"]
                 }));
             };
 
@@ -40,6 +43,18 @@ export function WebSocketProvider({ children }: { children: React.ReactNode }) {
                 try {
                     const data = JSON.parse(event.data);
 
+                    if (data.type === 'batch') {
+                        // Coalesced frame (~10/s): every event since the last frame, latest stats, market deltas
+                        if (data.pipeline) addPipelineEvents(data.pipeline);
+                        if (data.logs) addLogs(data.logs.map((l: { message: string }) => l.message));
+                        if (data.stats) {
+                            updateStats({
+                                balance: data.stats.balance,
+                                pnl: data.stats.pnl
+                            });
+                        }
+                        if (data.market) applyMarketFrame(data.market);
+                    }
                     if (data.type === 'status_change') {
                         setBotStatus(data.status);
                     }
@@ -2,6 +2,7 @@
 import { useEffect, useState } from 'react';
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
 import { cn } from '@/lib/utils';
+import { useBotStore } from '@/store/botStore';
 
 interface HeatmapItem {
     symbol: string;
@@ -12,8 +13,10 @@ interface HeatmapItem {
 export default function MarketHeatmap() {
     const [data, setData] = useState<HeatmapItem[]>([]);
     const [loading, setLoading] = useState(true);
+    const market = useBotStore((state) => state.market);
 
     useEffect(() => {
+        // Initial paint from the cached snapshot; live updates arrive as WS market deltas
         const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000';
         fetch(`${API_URL}/insights/heatmap`)
             .then(res => res.json())
@@ -22,17 +25,15 @@ export default function MarketHeatmap() {
                 setLoading(false);
             })
             .catch(err => console.error(err));
-
-        const interval = setInterval(() => {
-            const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000';
-            fetch(`${API_URL}/insights/heatmap`)
-                .then(res => res.json())
-                .then(setData);
-        }, 10000); // Poll every 10s
-
-        return () => clearInterval(interval);
     }, []);
 
+    useEffect(() => {
+        const symbols = Object.keys(market);
+        if (symbols.length === 0) return;
+        setData(symbols.sort().map((symbol) => ({ symbol, value: market[symbol][0], price: market[symbol][1] })));
+        setLoading(false);
+    }, [market]);
+
     if (loading) return <div className="p-10 text-center text-muted-foreground">Loading Heatmap...</div>;
 
     return (
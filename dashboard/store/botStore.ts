@@ -16,6 +16,13 @@ interface PipelineEvent {
     details: string;
 }
 
+// Coalesced WS market update: changed symbols only, or the whole market when full
+export interface MarketFrame {
+    full: boolean;
+    d: Record<string, [number, number]>; // symbol -> [change %, price]
+    rm?: string[];
+}
+
 interface BotState {
     status: 'active' | 'paused' | 'error' | 'offline';
     candidates: number;
@@ -24,10 +31,14 @@ interface BotState {
     trades: Trade[];
     logs: string[];
     pipelineEvents: PipelineEvent[]; // NEW: Pipeline History
+    market: Record<string, [number, number]>; // Live heatmap (WS 'market' topic)
     setBotStatus: (status: BotState['status']) => void;
     updateStats: (stats: Partial<BotState>) => void;
     addLog: (log: string) => void;
     addPipelineEvent: (event: PipelineEvent) => void;
+    addLogs: (logs: string[]) => void;
+    addPipelineEvents: (events: PipelineEvent[]) => void;
+    applyMarketFrame: (frame: MarketFrame) => void;
 }
 
 export const useBotStore = create<BotState>((set) => ({
@@ -38,6 +49,7 @@ export const useBotStore = create<BotState>((set) => ({
     trades: [],
     logs: [],
     pipelineEvents: [],
+    market: {},
     setBotStatus: (status) => set({ status }),
     updateStats: (stats) => set((state) => ({ ...state, ...stats })),
     addLog: (log) => set((state) => ({ logs: [log, ...state.logs].slice(0, 100) })),
@@ -45,4 +57,14 @@ export const useBotStore = create<BotState>((set) => ({
         // Keep last 50 events, newest first
         pipelineEvents: [event, ...state.pipelineEvents].slice(0, 50)
     })),
+    // Batched variants (one store update per WS frame); input is oldest first
+    addLogs: (logs) => set((state) => ({ logs: [...logs.reverse(), ...state.logs].slice(0, 100) })),
+    addPipelineEvents: (events) => set((state) => ({
+        pipelineEvents: [...events.reverse(), ...state.pipelineEvents].slice(0, 50)
+    })),
+    applyMarketFrame: (frame) => set((state) => {
+        const market = frame.full ? { ...frame.d } : { ...state.market, ...frame.d };
+        frame.rm?.forEach((symbol) => delete market[symbol]);
+        return { market };
+    }),
 }));
@@ -1,12 +1,11 @@
 import asyncio
 import os
-import json
 import redis.asyncio as redis
 import aiohttp
-import pandas as pd
-from datetime import datetime
 from dotenv import load_dotenv
 
+from scanner.rules import RULES, Rule, load_universe, explain
+
 # Load env from .env file
 load_dotenv()
 
@@ -48,82 +47,34 @@ async def check_redis():
 async def analyze_thresholds(r, keys):
     print(f"\n--- 2. SCANNER LOGIC SIMULATION ---")
     print("Checking why no trades are triggering...")
-    
-    # Current Thresholds (from scanner.py)
-    TARGET_PUMP_4H = 10.0 # %
-    TARGET_PUMP_1H = 8.0  # %
-    
-    # Simulation Thresholds
-    SIM_PUMP_4H = 2.0  # % (Realistic for Large Caps)
-    
-    candidates_current = []
-    candidates_sim = []
-    
-    print(f"Sampling keys (debugging data freshness)...")
-    
-    for k in keys:
-        symbol = k.split(":")[1]
-        
-        # Get Metrics
-        try:
-            m = await r.hgetall(k)
-        except Exception as e:
-            if count < 5: print(f"⚠️  Skipping {k}: {e} (Likely old string key)")
-            continue
-            
-        if not m: continue
-        
-        # Get Klines (needed for pump calc)
-        target_key = f"klines:{symbol}:1h"
-        k_data = await r.get(target_key)
-        
-        if count == 0:
-             print(f"🔍 DEBUG RAW KEY: {target_key}")
-             if not k_data: print("   -> Key NOT FOUND")
-             else: print(f"   -> Data Length: {len(json.loads(k_data))} candles")
-        
-        if not k_data: continue
-        
-        klines = json.loads(k_data)
-        if len(klines) < 5: 
-            if count == 0: print(f"   -> SKIPPING: Too few candles ({len(klines)})")
-            continue
-        
-        df = pd.DataFrame(klines, columns=['t','o','h','l','c','v'])
-        
-        # DEBUG: Check Freshness of first few
-        if count < 3:
-            last_ts = int(df.iloc[-1]['t'])
-            last_time = datetime.fromtimestamp(last_ts / 1000).isoformat()
-            print(f"🔍 DEBUG {symbol}: Latest Candle Time: {last_time} | Price: {df.iloc[-1]['c']}")
-            count += 1
-        
-        # Calc Pump
-        price_now = float(df.iloc[-1]['c'])
-        price_4h_ago = float(df.iloc[-4]['o']) # Approx
-        
-        if price_4h_ago == 0: continue
-        
-        pump_4h = (price_now - price_4h_ago) / price_4h_ago * 100
-        
-        # Check Matches
-        if pump_4h >= TARGET_PUMP_4H:
-            candidates_current.append((symbol, pump_4h))
-        
-        if pump_4h >= SIM_PUMP_4H:
-            candidates_sim.append((symbol, pump_4h))
-            
+
+    # Same rules table the scanner runs (scanner/rules.py), evaluated for every symbol at once
+    universe = await load_universe(r, [k.split(":")[1] for k in keys])
+    report = explain(universe)
+    with_data = sum(1 for row in report["rows"] if row["has_data"])
+
+    # Simulation: a looser 4H pump threshold (realistic for large caps)
+    SIM_PUMP_4H = 2.0 # %
+    sim_rules = [Rule("pump_4h", lo=SIM_PUMP_4H, hi=None, scale=SIM_PUMP_4H) if rule.name == "pump_4h" else rule
+                 for rule in RULES]
+    sim = explain(universe, top=1, rules=sim_rules)
+
+    print(f"Symbols with complete data: {with_data}/{report['symbols']}")
+    if report["btc_bullish"]:
+        print("⚠️ BTC 15m is strongly bullish: the scanner skips every scan right now.")
+
     print(f"\nRESULTS:")
-    print(f"🔹 Matches with CURRENT Thresholds (> {TARGET_PUMP_4H}%): {len(candidates_current)}")
-    for c in candidates_current: print(f"   - {c[0]}: {c[1]:.2f}%")
-    
-    print(f"🔸 Matches with SIMULATED Thresholds (> {SIM_PUMP_4H}%): {len(candidates_sim)}")
-    if candidates_sim:
-        print(f"   (Logic is working! But your thresholds are too high for {len(keys)} large cap coins.)")
-        print("   Samples:")
-        for c in candidates_sim[:3]: print(f"   - {c[0]}: {c[1]:.2f}%")
-    else:
-        print("   (Even with 2% thresholds, nothing found. Market might be very flat.)")
+    print("🔹 Symbols passing each filter: " + ", ".join(f"{n}: {c}" for n, c in report["pass_counts"].items()))
+    print(f"🔹 Candidates with CURRENT thresholds: {report['candidates']}")
+    print("   Nearest misses:")
+    for row in report["rows"][:5]:
+        print(f"   - {row['symbol']}: failed {', '.join(row['failed']) or 'nothing (candidate)'}")
+
+    print(f"🔸 Candidates with SIMULATED 4H pump >= {SIM_PUMP_4H}%: {sim['candidates']}")
+    if sim["candidates"] > report["candidates"]:
+        print(f"   (Logic is working! But the 4H threshold is too high for these {len(keys)} coins.)")
+    elif not sim["candidates"]:
+        print("   (Even with a 2% pump, nothing passes every filter. See the nearest misses above.)")
 
 async def check_binance_execution():
     print(f"\n--- 3. BINANCE EXECUTION API ---")
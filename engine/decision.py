@@ -1,6 +1,7 @@
 import asyncio
 import json
 import os
+import time
 import aiohttp
 import redis.asyncio as redis
 from dotenv import load_dotenv
@@ -8,6 +9,15 @@ from dotenv import load_dotenv
 # Use absolute imports or ensure path is set. Assuming run from root.
 from ai.pattern_api import PatternAnalyzer
 from ai.news_api import NewsAnalyzer
+from ai.news_feed import NewsFeed
+from ai.candle_patterns import local_pattern_score, LOCAL_PATTERN_MIN_SCORE
+from ai.score_cache import ScoreCache, PATTERN_CACHE_TTL, NEWS_CACHE_TTL
+from engine.ml_model import CandidateModel, ML_MODEL_PATH, ML_MIN_PROB
+from common.kill_switch import KillSwitch
+from monitoring import metrics
+from common.streams import (
+    StreamQueue, CANDIDATES_STREAM, CANDIDATES_GROUP, ORDERS_STREAM, ORDERS_GROUP
+)
 
 load_dotenv()
 
@@ -15,12 +25,29 @@ BINANCE_API_KEY = os.getenv("BINANCE_API_KEY")
 BINANCE_SECRET_KEY = os.getenv("BINANCE_SECRET_KEY")
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+# Candidates analyzed concurrently (chart renders + AI calls overlap)
+ENGINE_CONCURRENCY = int(os.getenv("ENGINE_CONCURRENCY", 4))
+
+CANDIDATE_SECONDS = metrics.histogram("engine_candidate_seconds", "Candidate analysis time (gates + AI)",
+                                      buckets=(0.01, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60))
+DECISIONS = metrics.counter("engine_decisions_total", "Candidate outcomes", ["result"])
 
 class DecisionEngine:
     def __init__(self):
         self.redis = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
-        self.pattern_analyzer = PatternAnalyzer()
-        self.news_analyzer = NewsAnalyzer()
+        # Shared Redis cache: replicas reuse each other's Gemini results
+        self.pattern_cache = ScoreCache(self.redis, "pattern", PATTERN_CACHE_TTL)
+        self.news_cache = ScoreCache(self.redis, "news", NEWS_CACHE_TTL)
+        self.pattern_analyzer = PatternAnalyzer(cache=self.pattern_cache)
+        self.news_feed = NewsFeed(self.redis)
+        self.news_analyzer = NewsAnalyzer(self.news_feed, cache=self.news_cache)
+        # Local ML gate (trained offline by engine/train_model.py), loaded once
+        self.ml_model = CandidateModel.load(ML_MODEL_PATH)
+        if self.ml_model:
+            print(f"Loaded candidate model {self.ml_model.version}")
+        self.candidates = StreamQueue(self.redis, CANDIDATES_STREAM, CANDIDATES_GROUP)
+        self.orders = StreamQueue(self.redis, ORDERS_STREAM, ORDERS_GROUP)
+        self.kill_switch = KillSwitch(self.redis)
         # No CCXT. Validating logic simplified.
 
     async def validate_candidate(self, symbol):
@@ -36,6 +63,13 @@ class DecisionEngine:
         return 0.002 # Fixed small size for safety in testnet rework
         # Real logic requires balance fetch via aiohttp (can copy from Executor if needed)
 
+    async def get_cached_balance(self):
+        balance = await self.redis.hget("account:balance", "balance")
+        try:
+            return float(balance) if balance and float(balance) > 0 else 1000.0
+        except ValueError:
+            return 1000.0
+
     async def process_candidate(self, symbol):
         print(f"Processing candidate {symbol}...")
         
@@ -43,10 +77,41 @@ class DecisionEngine:
         if not await self.validate_candidate(symbol):
             return None
 
+        k_1h = await self.redis.get(f"klines:{symbol}:1h")
+        k_15m = await self.redis.get(f"klines:{symbol}:15m")
+        if not k_1h or not k_15m:
+            return None
+
+        # Local Pattern Pre-Gate (NumPy, microseconds): no reversal signal at all
+        # means no point paying for a chart render + vision call.
+        local_res = local_pattern_score(k_1h, k_15m)
+        if local_res['pattern_score'] < LOCAL_PATTERN_MIN_SCORE:
+            print(f"Local pattern gate rejected {symbol}: score={local_res['pattern_score']:.2f}")
+            return None
+
+        # ML Gate: in-process model scored on the scanner's feature vector
+        ml_prob = None
+        if self.ml_model:
+            raw_features = await self.redis.hget("scanner:features", symbol)
+            if raw_features:
+                ml_prob = self.ml_model.score(json.loads(raw_features))
+                if ml_prob < ML_MIN_PROB:
+                    print(f"ML gate rejected {symbol}: p={ml_prob:.2f} (model {self.ml_model.version})")
+                    return None
+
         # AI Analysis
-        pattern_res = await self.pattern_analyzer.get_pattern_score(symbol, self.redis)
+        pattern_res = await self.pattern_analyzer.get_pattern_score(symbol, self.redis, klines=(k_1h, k_15m))
         news_res = await self.news_analyzer.get_news_score(symbol)
         
+        # Gateway failures (breaker open, budget, timeouts) are reported, not hidden
+        for name, res in (("pattern", pattern_res), ("news", news_res)):
+            if "error" in res:
+                print(f"AI {name} unavailable for {symbol}: {res['error']}")
+
+        # Vision model down -> fall back to the local pattern score
+        if "error" in pattern_res:
+            pattern_res = local_res
+        
         pattern_score = float(pattern_res.get('pattern_score', 0))
         news_score = float(news_res.get('news_score', 50))
         
@@ -97,12 +162,13 @@ class DecisionEngine:
         # Position Sizing
         # Risk: 0.5% - 1.2% of account. Let's use 1.0%
         # Amount = (AccountBalance * Risk%) / (SL_Price - Entry_Price)
-        # Using fixed 1000 balance assumption for now as we don't fetch wallet yet
-        balance = 1000.0 
-        risk_per_trade = balance * 0.01 # $10 risk
+        # Live balance cached by the executor (account:balance); 1000 if not yet known
+        balance = await self.get_cached_balance()
+        risk_per_trade = balance * 0.01 # 1% risk
         price_diff = abs(sl_price - entry_price)
+        # Raw size: executor rounds it to the symbol's stepSize / min / max filters
         if price_diff == 0: quantity = 0.002
-        else: quantity = round(risk_per_trade / price_diff, 3) 
+        else: quantity = risk_per_trade / price_diff
         
         # Cap max size for safety?
         # quantity = min(quantity, 0.1) # e.g. max 0.1 BTC equivalent if needed
@@ -121,6 +187,8 @@ class DecisionEngine:
             "scores": {
                 "final": final_score,
                 "pattern": pattern_score,
+                "local_pattern": local_res['pattern_score'],
+                "ml": ml_prob,
                 "news": news_score
             }
         }
@@ -137,23 +205,55 @@ class DecisionEngine:
         }
         await self.redis.publish("pipeline_events", json.dumps(event))
 
+    async def handle_candidate(self, symbol):
+        await self.publish_event(symbol, "processing", "AI Analyzing...")
+        t0 = time.perf_counter()
+        signal = await self.process_candidate(symbol)
+        CANDIDATE_SECONDS.observe(time.perf_counter() - t0)
+        DECISIONS.labels("killed" if signal and self.kill_switch.active else "signal" if signal else "rejected").inc()
+        if signal and self.kill_switch.active:
+            # Analysis outlived the kill switch: never emit the order
+            await self.publish_event(symbol, "fail", "Kill Switch Active")
+        elif signal:
+            print(f"TRADE SIGNAL: {signal}")
+            await self.publish_event(symbol, "pass", f"Final Score: {signal['scores']['final']:.2f}")
+            # Push to execution stream
+            await self.orders.push(json.dumps(signal))
+        else:
+            await self.publish_event(symbol, "fail", "Low Score / Validation Failed")
+
+    async def handle_entry(self, entry_id, symbol):
+        try:
+            await self.handle_candidate(symbol)
+        except Exception as e:
+            # Left un-ACKed: another replica (or we) will reclaim and retry it,
+            # up to STREAM_MAX_DELIVERIES times before it goes to the dead stream
+            print(f"Candidate {symbol} failed: {e}")
+            return
+        # ACK only after the signal (if any) is safely on the orders stream
+        await self.candidates.ack(entry_id)
+
     async def run(self):
         print("Decision Engine Running...")
+        await self.kill_switch.start()
+        await self.candidates.ensure_group()
+        # Keep headlines for top movers warm so lookups are cache reads
+        asyncio.create_task(self.news_feed.prefetch_loop())
         while True:
-            # Pop from candidate queue
-            symbol = await self.redis.rpop("scanner:candidates")
-            if symbol:
-                await self.publish_event(symbol, "processing", "AI Analyzing...")
-                signal = await self.process_candidate(symbol)
-                if signal:
-                    print(f"TRADE SIGNAL: {signal}")
-                    await self.publish_event(symbol, "pass", f"Final Score: {signal['scores']['final']:.2f}")
-                    # Push to execution queue
-                    await self.redis.lpush("execution:orders", json.dumps(signal))
-                else:
-                    await self.publish_event(symbol, "fail", "Low Score / Validation Failed")
-            else:
-                await asyncio.sleep(5) # Wait if empty
+            try:
+                # Blocking XREADGROUP (no polling); also reclaims entries from dead replicas
+                entries = await self.candidates.next_batch(count=ENGINE_CONCURRENCY, block_ms=5000)
+                if self.kill_switch.active:
+                    # Drop (ACK) instead of leaving them to be traded on resume
+                    for entry_id, symbol in entries:
+                        await self.candidates.ack(entry_id)
+                    if entries:
+                        print(f"Kill switch active, dropped {len(entries)} candidates.")
+                    continue
+                await asyncio.gather(*(self.handle_entry(entry_id, symbol) for entry_id, symbol in entries))
+            except Exception as e:
+                print(f"Decision Engine Loop Error: {e}")
+                await asyncio.sleep(5)
 
 if __name__ == "__main__":
     engine = DecisionEngine()
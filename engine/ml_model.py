@@ -0,0 +1,79 @@
+import os
+import json
+import math
+import numpy as np
+
+# Compact candidate-scoring model.
+# Trained offline (engine/train_model.py) as a standardized logistic regression
+# and serialized to a small JSON file. The engine loads it once and scores in
+# pure Python (a handful of multiply-adds, microseconds), so it can gate which
+# candidates are worth the slow, paid Gemini calls.
+
+ML_MODEL_PATH = os.getenv("ML_MODEL_PATH", "models/candidate_model.json")
+ML_MIN_PROB = float(os.getenv("ML_MIN_PROB", 0.35))
+
+# Same quantities the scanner filters on (scanner/scanner.py)
+FEATURES = ["pump_4h", "pump_1h", "volume_ratio", "rsi", "funding_rate", "oi_increase"]
+
+
+def kline_features(rows_1h):
+    """pump_4h, pump_1h, volume_ratio, rsi from 1h [t, o, h, l, c, v] rows (scanner formulas)."""
+    a = np.asarray(rows_1h, dtype=float)
+    if len(a) < 5:
+        return None
+    o, c, v = a[:, 1], a[:, 4], a[:, 5]
+    price_now = c[-1]
+    feats = {
+        "pump_4h": (price_now - o[-4]) / o[-4] * 100,
+        "pump_1h": (price_now - o[-1]) / o[-1] * 100,
+        "volume_ratio": float("nan"),
+        "rsi": float("nan"),
+    }
+    if len(a) >= 21:
+        avg_vol = v[-21:-1].mean()
+        feats["volume_ratio"] = v[-1] / avg_vol if avg_vol > 0 else float("nan")
+    if len(a) >= 15:
+        # Simple-average RSI(14), as the scanner rules (scanner/rules.py)
+        delta = np.diff(c[-15:])
+        gain = np.clip(delta, 0, None).mean()
+        loss = np.clip(-delta, 0, None).mean()
+        if loss == 0:
+            feats["rsi"] = 100.0 if gain > 0 else float("nan")
+        else:
+            feats["rsi"] = 100 - 100 / (1 + gain / loss)
+    return {k: float(x) for k, x in feats.items()}
+
+
+class CandidateModel:
+    def __init__(self, spec):
+        self.spec = spec
+        self.version = spec["version"]
+        self.features = spec["features"]
+        self.mean = spec["mean"]
+        self.scale = spec["scale"]
+        self.coef = spec["coef"]
+        self.intercept = spec["intercept"]
+        self.metrics = spec.get("metrics", {})
+
+    @classmethod
+    def load(cls, path=ML_MODEL_PATH):
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.spec, f, indent=2)
+
+    def score(self, features):
+        """Probability that the candidate reaches TP1 before SL. Missing values -> training mean (z=0)."""
+        z = self.intercept
+        for name, mu, sd, w in zip(self.features, self.mean, self.scale, self.coef):
+            x = features.get(name)
+            if x is None or x != x: # None / NaN
+                continue
+            z += w * (float(x) - mu) / sd
+        if z < -35: return 0.0
+        return 1.0 / (1.0 + math.exp(-z))
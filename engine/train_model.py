@@ -0,0 +1,257 @@
+import os
+import sys
+import json
+import glob
+import shutil
+import sqlite3
+import argparse
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+# Allow `python engine/train_model.py` as well as `python -m engine.train_model`
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine.ml_model import CandidateModel, FEATURES, ML_MODEL_PATH, kline_features
+from execution.ledger import LEDGER_DB_PATH
+
+load_dotenv()
+
+# Offline training pipeline for the candidate-scoring model.
+#   features: scanner candidates (candidates_log.csv), volume ratio / RSI
+#             recomputed from SQLite 1h klines when the log predates them
+#   labels:   replay of SQLite klines after each candidate: did price reach TP1
+#             before the stop? Executed trades (trade ledger) use their
+#             real SL/TP1 levels, other candidates the engine's default plan.
+#
+#   python engine/train_model.py train [--promote]
+#   python engine/train_model.py compare [model.json ...]
+#   python engine/train_model.py promote models/candidate_model_<version>.json
+
+DB_PATH = os.getenv("DB_PATH", "exhaustion_bot.db")
+REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+CANDIDATES_LOG = "candidates_log.csv"
+CANDIDATE_COLUMNS = ["timestamp", "symbol", "price", "pump_4h", "pump_1h", "volume",
+                     "funding_rate", "oi_increase", "volume_ratio", "rsi"] # Scanner's CSV order
+MODELS_DIR = os.path.dirname(ML_MODEL_PATH) or "models"
+
+LABEL_HORIZON_H = 24
+DEFAULT_SL_PCT = 0.015 # Engine: SL 1.5% above the recent high (approximated from entry)
+DEFAULT_TP1_PCT = 0.02
+HOLDOUT_FRACTION = 0.25
+
+
+def load_candidates(path=CANDIDATES_LOG):
+    # Own names (header row skipped): logs started before Volume_Ratio/RSI keep their 8-column header
+    # above the 10-field rows appended since; the older rows get NaN in the new columns
+    df = pd.read_csv(path, header=None, skiprows=1, names=CANDIDATE_COLUMNS)
+    # Scanner logs datetime.now().isoformat() (local time) -> epoch ms like the klines table
+    df["ts_ms"] = df["timestamp"].map(lambda x: int(datetime.fromisoformat(x).timestamp() * 1000))
+    for col in FEATURES:
+        if col not in df.columns:
+            df[col] = np.nan
+    return df.sort_values("ts_ms").reset_index(drop=True)
+
+
+def load_trade_history():
+    # Optional: executed trades carry the real SL/TP1 levels (full ledger; Redis keeps only the last 1000)
+    if os.path.exists(LEDGER_DB_PATH):
+        conn = sqlite3.connect(LEDGER_DB_PATH)
+        try:
+            rows = conn.execute(
+                "SELECT symbol, opened_at, entry_price, sl, tp1 FROM trades WHERE status != 'void'"
+            ).fetchall()
+            if rows: # Empty ledger (trades from before it existed): fall back to Redis
+                return [{"symbol": s, "timestamp": ts, "entry_price": entry, "sl": sl, "tp1": tp1}
+                        for s, ts, entry, sl, tp1 in rows]
+        except sqlite3.Error as e:
+            print(f"Trade ledger unreadable ({e}), trying Redis trade_history.")
+        finally:
+            conn.close()
+    try:
+        import redis
+        r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+        return [json.loads(x) for x in r.lrange("trade_history", 0, -1)]
+    except Exception as e:
+        print(f"trade_history unavailable ({e}), using default SL/TP levels.")
+        return []
+
+
+def find_trade(trades, symbol, ts_ms):
+    # Trade executed for this candidate within the labelling horizon
+    for t in trades:
+        t_ms = float(t.get("timestamp", 0)) * 1000
+        if t.get("symbol", "").replace("/", "") == symbol.replace("/", "") and 0 <= t_ms - ts_ms <= LABEL_HORIZON_H * 3600 * 1000:
+            return t
+    return None
+
+
+def klines_between(conn, symbol, timeframe, start_ms, end_ms):
+    cur = conn.execute(
+        "SELECT timestamp, open, high, low, close, volume FROM klines "
+        "WHERE symbol = ? AND timeframe = ? AND timestamp >= ? AND timestamp < ? ORDER BY timestamp",
+        (symbol, timeframe, start_ms, end_ms)
+    )
+    return cur.fetchall()
+
+
+def label_short(conn, symbol, ts_ms, entry, sl=None, tp1=None):
+    # Levels the trade did not record come from the engine's default plan around entry.
+    # Finest timeframe available wins; same-candle SL+TP counts as a loss (conservative)
+    sl = float(sl) if sl else entry * (1 + DEFAULT_SL_PCT)
+    tp1 = float(tp1) if tp1 else entry * (1 - DEFAULT_TP1_PCT)
+    end_ms = ts_ms + LABEL_HORIZON_H * 3600 * 1000
+    for tf in ("5m", "15m", "1h"):
+        rows = klines_between(conn, symbol, tf, ts_ms, end_ms)
+        if not rows:
+            continue
+        for _, _, high, low, _, _ in rows:
+            if high >= sl:
+                return 0
+            if low <= tp1:
+                return 1
+        return None # Unresolved within horizon
+    return None
+
+
+def build_dataset(candidates_path=CANDIDATES_LOG, db_path=DB_PATH):
+    cands = load_candidates(candidates_path)
+    trades = load_trade_history()
+    conn = sqlite3.connect(db_path)
+    rows = []
+    try:
+        for c in cands.itertuples(index=False):
+            feats = {f: getattr(c, f) for f in FEATURES}
+            if np.isnan(feats["volume_ratio"]) or np.isnan(feats["rsi"]):
+                hist = klines_between(conn, c.symbol, "1h", c.ts_ms - 30 * 3600 * 1000, c.ts_ms + 1)
+                kf = kline_features([list(h) for h in hist]) if hist else None
+                if kf:
+                    for k in ("volume_ratio", "rsi"):
+                        if np.isnan(feats[k]): feats[k] = kf[k]
+
+            trade = find_trade(trades, c.symbol, c.ts_ms)
+            trade = trade or {}
+            entry = float(trade.get("entry_price") or c.price)
+            label = label_short(conn, c.symbol, c.ts_ms, entry, trade.get("sl"), trade.get("tp1"))
+            if label is None:
+                continue
+            rows.append({**feats, "symbol": c.symbol, "ts_ms": c.ts_ms, "label": label, "traded": bool(trade)})
+    finally:
+        conn.close()
+    return pd.DataFrame(rows)
+
+
+def split(df):
+    # Time-ordered holdout: evaluate on the most recent candidates
+    cut = int(len(df) * (1 - HOLDOUT_FRACTION))
+    return df.iloc[:cut], df.iloc[cut:]
+
+
+def evaluate(model, df):
+    from sklearn.metrics import roc_auc_score, precision_score, brier_score_loss
+    if df.empty:
+        return {}
+    probs = np.array([model.score(r) for r in df[FEATURES].to_dict("records")])
+    y = df["label"].values
+    out = {
+        "n": int(len(df)),
+        "win_rate": round(float(y.mean()), 3),
+        "brier": round(float(brier_score_loss(y, probs)), 4),
+        "precision_at_gate": round(float(precision_score(y, probs >= 0.5, zero_division=0)), 3),
+        "pass_rate": round(float((probs >= 0.5).mean()), 3),
+    }
+    if len(set(y)) > 1:
+        out["auc"] = round(float(roc_auc_score(y, probs)), 4)
+    return out
+
+
+def train(df):
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.preprocessing import StandardScaler
+
+    if df.empty:
+        raise SystemExit("No labelled candidates yet (need candidates_log.csv rows with klines after them).")
+    train_df, test_df = split(df)
+    X = train_df[FEATURES].astype(float)
+    X = X.fillna(X.mean()).fillna(0.0).values
+    y = train_df["label"].values
+    if len(set(y)) < 2:
+        raise SystemExit("Training set has a single class, need more labelled candidates.")
+
+    scaler = StandardScaler().fit(X)
+    clf = LogisticRegression(class_weight="balanced", max_iter=1000).fit(scaler.transform(X), y)
+
+    version = datetime.now().strftime("%Y%m%d_%H%M%S")
+    model = CandidateModel({
+        "version": version,
+        "features": FEATURES,
+        "mean": [float(x) for x in scaler.mean_],
+        "scale": [float(x) if x > 0 else 1.0 for x in scaler.scale_],
+        "coef": [float(x) for x in clf.coef_[0]],
+        "intercept": float(clf.intercept_[0]),
+        "trained_at": datetime.now().isoformat(),
+        "n_train": int(len(train_df)),
+    })
+    model.spec["metrics"] = {"train": evaluate(model, train_df), "holdout": evaluate(model, test_df)}
+    model.metrics = model.spec["metrics"]
+    return model
+
+
+def cmd_train(args):
+    df = build_dataset(args.candidates, args.db)
+    print(f"Dataset: {len(df)} labelled candidates.")
+    model = train(df)
+    path = os.path.join(MODELS_DIR, f"candidate_model_{model.version}.json")
+    model.save(path)
+    print(f"Saved {path}")
+    print(json.dumps(model.metrics, indent=2))
+    if args.promote:
+        cmd_promote(argparse.Namespace(path=path))
+
+
+def cmd_compare(args):
+    paths = args.paths or sorted(glob.glob(os.path.join(MODELS_DIR, "candidate_model_*.json")))
+    if not paths:
+        print("No models found.")
+        return
+    _, holdout = split(build_dataset(args.candidates, args.db))
+    current = CandidateModel.load(ML_MODEL_PATH)
+    print(f"Holdout: {len(holdout)} candidates\n")
+    print(f"{'version':<18}{'auc':>8}{'brier':>8}{'prec@.5':>9}{'pass':>7}")
+    for p in paths:
+        m = CandidateModel.load(p)
+        res = evaluate(m, holdout)
+        tag = " *" if current and current.version == m.version else ""
+        print(f"{m.version:<18}{res.get('auc', float('nan')):>8}{res.get('brier', float('nan')):>8}"
+              f"{res.get('precision_at_gate', float('nan')):>9}{res.get('pass_rate', float('nan')):>7}{tag}")
+
+
+def cmd_promote(args):
+    CandidateModel.load(args.path) # Validate before replacing the live model
+    os.makedirs(os.path.dirname(ML_MODEL_PATH) or ".", exist_ok=True)
+    shutil.copyfile(args.path, ML_MODEL_PATH)
+    print(f"Promoted {args.path} -> {ML_MODEL_PATH} (engines pick it up on restart)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train / compare candidate-scoring models")
+    parser.add_argument("--candidates", default=CANDIDATES_LOG)
+    parser.add_argument("--db", default=DB_PATH)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_train = sub.add_parser("train", help="Build dataset and train a new model version")
+    p_train.add_argument("--promote", action="store_true", help="Make it the live model")
+    p_train.set_defaults(func=cmd_train)
+
+    p_cmp = sub.add_parser("compare", help="Evaluate model versions on the current holdout")
+    p_cmp.add_argument("paths", nargs="*")
+    p_cmp.set_defaults(func=cmd_compare)
+
+    p_prom = sub.add_parser("promote", help="Copy a model version to ML_MODEL_PATH")
+    p_prom.add_argument("path")
+    p_prom.set_defaults(func=cmd_promote)
+
+    args = parser.parse_args()
+    args.func(args)
@@ -0,0 +1,96 @@
+import os
+import json
+import time
+import hmac
+import hashlib
+from urllib.parse import urlencode
+import aiohttp
+from yarl import URL
+from dotenv import load_dotenv
+
+from execution.rate_limit import TokenBucket
+from monitoring import metrics
+
+load_dotenv()
+
+# Execution accounts.
+# Each account signs with its own keys and has its own HTTP session and rate
+# budget, so signals fan out to every account concurrently and a slow or
+# throttled account never delays the others.
+#
+# EXECUTION_ACCOUNTS (JSON list, optional; default = BINANCE_API_KEY / SECRET):
+#   [{"name": "main", "api_key_env": "BINANCE_API_KEY", "secret_key_env": "BINANCE_SECRET_KEY"},
+#    {"name": "sub1", "api_key_env": "SUB1_API_KEY", "secret_key_env": "SUB1_SECRET_KEY", "multiplier": 0.5}]
+# Keys may also be given inline ("api_key" / "secret_key"). The first account is
+# the primary one (its balance sizes signals); every account gets its own
+# user-data stream and position manager.
+
+BINANCE_API_KEY = os.getenv("BINANCE_API_KEY")
+BINANCE_SECRET_KEY = os.getenv("BINANCE_SECRET_KEY")
+EXECUTION_ACCOUNTS = os.getenv("EXECUTION_ACCOUNTS", "")
+
+
+class BinanceAccount:
+    def __init__(self, name, api_key, secret_key, base_url, multiplier=1.0, paper=None):
+        self.name = name
+        self.api_key = api_key
+        self.secret_key = secret_key
+        self.base_url = base_url
+        self.multiplier = multiplier
+        self.paper = paper # PaperExchange in DRY_RUN (one simulated account per name)
+        self.session = None
+        self.rate_limiter = TokenBucket()
+
+    async def get_session(self):
+        if self.session is None:
+            # Re-enable Proxy Support (trust_env=True)
+            self.session = aiohttp.ClientSession(trust_env=True,
+                                                 trace_configs=[metrics.http_trace_config(f"executor:{self.name}")])
+        return self.session
+
+    def get_signature(self, query_string):
+        return hmac.new(self.secret_key.encode('utf-8'), query_string.encode('utf-8'), hashlib.sha256).hexdigest()
+
+    async def send_request(self, method, endpoint, params=None):
+        if self.paper:
+            return await self.paper.request(method, endpoint, params, account=self.name)
+        session = await self.get_session()
+        await self.rate_limiter.acquire()
+
+        if params is None: params = {}
+        params['timestamp'] = int(time.time() * 1000)
+        params['recvWindow'] = 5000
+        # Sign the exact encoded query that is sent (batchOrders carries URL-encoded JSON)
+        query = urlencode(params)
+        url = URL(f"{self.base_url}{endpoint}?{query}&signature={self.get_signature(query)}", encoded=True)
+
+        headers = {'X-MBX-APIKEY': self.api_key}
+
+        async with session.request(method, url, headers=headers) as resp:
+            data = await resp.json()
+            if resp.status >= 400:
+                raise Exception(f"API Error {resp.status}: {data}")
+            return data
+
+    async def close(self):
+        if self.session:
+            await self.session.close()
+
+
+def load_accounts(base_url, paper=None, config=EXECUTION_ACCOUNTS):
+    if not config:
+        return [BinanceAccount("main", BINANCE_API_KEY, BINANCE_SECRET_KEY, base_url, paper=paper)]
+
+    accounts = []
+    for spec in json.loads(config):
+        name = spec["name"]
+        api_key = spec.get("api_key") or os.getenv(spec.get("api_key_env", ""))
+        secret_key = spec.get("secret_key") or os.getenv(spec.get("secret_key_env", ""))
+        if not paper and not (api_key and secret_key):
+            print(f"Execution account {name}: missing API keys, skipped.")
+            continue
+        accounts.append(BinanceAccount(name, api_key, secret_key, base_url, float(spec.get("multiplier", 1.0)), paper))
+    if not accounts:
+        raise ValueError("EXECUTION_ACCOUNTS has no usable account")
+    print(f"Execution accounts: {', '.join(f'{a.name} (x{a.multiplier})' for a in accounts)}")
+    return accounts
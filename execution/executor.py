@@ -2,17 +2,24 @@ import asyncio
 import json
 import os
 import time
-import hmac
-import hashlib
-import aiohttp
 import redis.asyncio as redis
 from dotenv import load_dotenv
 
+from common.streams import StreamQueue, ORDERS_STREAM, ORDERS_GROUP
+from execution.filters import ExchangeFilters, OrderFilterError
+from execution.user_stream import UserDataStream
+from execution.journal import OrderJournal, client_order_id
+from execution.ledger import TradeLedger
+from execution.accounts import load_accounts
+from execution.position_manager import PositionManager
+from execution.paper_exchange import PaperExchange
+from common.kill_switch import KillSwitch
+from monitoring import metrics
+
 load_dotenv()
 
-# Executor uses Standard Keys (User must put Testnet keys in BINANCE_API_KEY env var)
-BINANCE_API_KEY = os.getenv("BINANCE_API_KEY")
-BINANCE_SECRET_KEY = os.getenv("BINANCE_SECRET_KEY")
+# Executor uses Standard Keys (User must put Testnet keys in BINANCE_API_KEY env var,
+# extra accounts in EXECUTION_ACCOUNTS, see execution/accounts.py)
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
 
@@ -21,23 +28,48 @@ BASE_URL = "https://testnet.binancefuture.com"
 
 # --- SAFETY LOCK ---
 # User requested "Enable trading".
+# DRY_RUN = True routes every order to the local paper exchange (simulated fills, fees, PnL)
 DRY_RUN = False
 # -------------------
 
+TRADES = metrics.counter("executor_trades_total", "Signals handled per account by outcome", ["account", "status"])
+PROTECT_SECONDS = metrics.histogram("executor_protect_seconds", "Entry sent -> SL/TP legs acknowledged", ["account"],
+                                    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10))
+FLAT_SECONDS = metrics.histogram("executor_time_to_flat_seconds", "Kill switch flatten duration", buckets=(0.1, 0.25, 0.5, 1, 2, 5, 10))
+
 class TradeExecutor:
     def __init__(self):
         self.redis = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
-        self.session = None
+        self.paper = PaperExchange() if DRY_RUN else None
+        # Every signal fans out to all accounts concurrently (own keys, session and rate budget each)
+        self.accounts = load_accounts(BASE_URL, paper=self.paper)
+        self.primary = self.accounts[0]
+        self.orders = StreamQueue(self.redis, ORDERS_STREAM, ORDERS_GROUP)
+        self.filters = ExchangeFilters()
+        self.journal = OrderJournal()
+        self.ledger = TradeLedger() # Durable history + incremental analytics (fed by fills)
+        self.kill_switch = KillSwitch(self.redis)
+        self.kill_switch.on_change(self.on_kill_switch)
+        self.build_streams()
+
+    def build_streams(self):
+        # Each account's own positions / orders / fills (the primary's state sizes the engine's signals)
+        self.user_streams = {a.name: UserDataStream(self, self.redis, BASE_URL, account=a) for a in self.accounts}
+        self.user_stream = self.user_streams[self.primary.name]
+        # Trailing / breakeven / time stops on live mark prices (open positions only), per account
+        self.position_managers = {name: PositionManager(self, user_stream=s) for name, s in self.user_streams.items()}
+        self.position_manager = self.position_managers[self.primary.name]
 
     async def get_session(self):
-        if self.session is None:
-            # Re-enable Proxy Support (trust_env=True)
-            self.session = aiohttp.ClientSession(trust_env=True)
-        return self.session
+        return await self.primary.get_session()
+
+    def journal_id(self, signal_id, account):
+        # Primary keeps the bare id (journals written before multi-account stay valid)
+        return signal_id if account is self.primary else f"{signal_id}:{account.name}"
 
-    def get_signature(self, params):
-        query_string = '&'.join([f"{k}={v}" for k, v in params.items()])
-        return hmac.new(BINANCE_SECRET_KEY.encode('utf-8'), query_string.encode('utf-8'), hashlib.sha256).hexdigest()
+    def account_for(self, journal_id):
+        name = journal_id.rpartition(':')[2] if ':' in journal_id else self.primary.name
+        return next((a for a in self.accounts if a.name == name), None)
 
     async def notify(self, message):
         print(f"NOTIFICATION: {message}")
@@ -51,212 +83,562 @@ class TradeExecutor:
         except Exception as e:
              print(f"Failed to push notification: {e}")
 
-    async def send_request(self, method, endpoint, params=None):
-        session = await self.get_session()
-        url = BASE_URL + endpoint
-        
-        if params is None: params = {}
-        params['timestamp'] = int(time.time() * 1000)
-        params['recvWindow'] = 5000
-        params['signature'] = self.get_signature(params)
-        
-        headers = {'X-MBX-APIKEY': BINANCE_API_KEY}
-        
-        async with session.request(method, url, params=params, headers=headers) as resp:
-            data = await resp.json()
-            if resp.status >= 400:
-                raise Exception(f"API Error {resp.status}: {data}")
-            return data
+    async def send_request(self, method, endpoint, params=None, account=None):
+        return await (account or self.primary).send_request(method, endpoint, params)
+
+    async def place_batch(self, orders, account=None):
+        """POST /fapi/v1/batchOrders (max 5). Returns one result per order: the order or {'code', 'msg'}."""
+        payload = json.dumps(orders, separators=(',', ':'))
+        return await self.send_request('POST', '/fapi/v1/batchOrders', {'batchOrders': payload}, account)
+
+    async def journaled_request(self, signal_id, symbol, leg, params, method='POST', endpoint='/fapi/v1/order', account=None):
+        """Single order with intent / ack / error rows around it."""
+        client_id = params.get('newClientOrderId')
+        self.journal.intent(signal_id, symbol, leg, params)
+        try:
+            res = await self.send_request(method, endpoint, dict(params), account)
+        except Exception as e:
+            self.journal.error(signal_id, symbol, leg, client_id, e)
+            raise
+        self.journal.ack(signal_id, symbol, leg, client_id, {'orderId': res.get('orderId'), 'status': res.get('status')})
+        return res
+
+    async def place_protection(self, signal_id, symbol, legs, account=None):
+        """
+        Submits the protective legs in one batch and reconciles per-leg results.
+        Failed legs the exchange does not have are retried once individually. Returns ({leg: order_or_None}, {leg: latency_ms}).
+        """
+        names = [name for name, _ in legs]
+        latency = {}
+        for name, leg_params in legs:
+            self.journal.intent(signal_id, symbol, name, leg_params)
+        t0 = time.perf_counter()
+        try:
+            results = await self.place_batch([p for _, p in legs], account)
+        except Exception as e:
+            print(f"Batch Order Error {symbol}: {e}")
+            results = [{'code': -1, 'msg': str(e)}] * len(legs)
+        latency['batch'] = round((time.perf_counter() - t0) * 1000, 1)
+
+        placed = {}
+        for (name, leg_params), res in zip(legs, results):
+            client_id = leg_params.get('newClientOrderId')
+            if isinstance(res, dict) and res.get('orderId'):
+                self.journal.ack(signal_id, symbol, name, client_id, {'orderId': res['orderId'], 'status': res.get('status')})
+                placed[name] = res
+                latency[name] = latency['batch']
+                continue
+            self.journal.error(signal_id, symbol, name, client_id, res)
+            t1 = time.perf_counter()
+            try:
+                # A lost batch response does not mean the leg is missing, and resending one that
+                # landed is rejected as a duplicate client id: look it up first (as recovery does)
+                landed = await self.query_order(symbol, client_id, account)
+            except Exception as e:
+                print(f"{name.upper()} lookup failed for {symbol}: {e}")
+                landed = None
+            if landed and landed.get('status') not in ('CANCELED', 'EXPIRED', 'REJECTED'):
+                self.journal.ack(signal_id, symbol, name, client_id, {'orderId': landed.get('orderId'), 'status': landed.get('status')})
+                placed[name] = landed
+            else:
+                print(f"{name.upper()} rejected in batch for {symbol}: {res}. Retrying individually...")
+                try:
+                    placed[name] = await self.journaled_request(signal_id, symbol, name, leg_params, account=account)
+                except Exception as e:
+                    print(f"{name.upper()} retry failed for {symbol}: {e}")
+                    placed[name] = None
+            latency[name] = round(latency['batch'] + (time.perf_counter() - t1) * 1000, 1)
+
+        for name in names:
+            if placed.get(name):
+                print(f"{name.upper()} Placed: {placed[name]['orderId']}")
+        return placed, latency
+
+    async def flatten(self, signal_id, symbol, close_side, qty_str, account=None):
+        """Unprotected position: cancel whatever legs made it and close at market."""
+        try:
+            await self.send_request('DELETE', '/fapi/v1/allOpenOrders', {'symbol': symbol}, account)
+        except Exception as e:
+            print(f"Cancel Orders Error {symbol}: {e}")
+        await self.journaled_request(signal_id, symbol, 'flat', {
+            'symbol': symbol,
+            'side': close_side,
+            'type': 'MARKET',
+            'quantity': qty_str,
+            'reduceOnly': 'true',
+            'newClientOrderId': client_order_id(signal_id, 'flat')
+        }, account=account)
+
+    async def close_position(self, symbol, amount, account=None):
+        qty = abs(amount)
+        qty_str = self.filters.format_qty(symbol, qty) if self.filters.get(symbol) else str(qty)
+        return await self.send_request('POST', '/fapi/v1/order', {
+            'symbol': symbol,
+            'side': 'SELL' if amount > 0 else 'BUY',
+            'type': 'MARKET',
+            'quantity': qty_str,
+            'reduceOnly': 'true'
+        }, account)
+
+    async def flatten_account(self, account):
+        """Closes every position and cancels every open order on one account. Returns (positions, symbols, errors)."""
+        stream = self.user_streams.get(account.name)
+        if stream and stream.connected:
+            # Live state from the account's user-data stream: no lookup round trip
+            positions = {s: p['amount'] for s, p in stream.state.positions.items()}
+            order_symbols = {o['symbol'] for o in stream.state.orders.values()}
+        else:
+            risk, open_orders = await asyncio.gather(
+                self.send_request('GET', '/fapi/v2/positionRisk', account=account),
+                self.send_request('GET', '/fapi/v1/openOrders', account=account)
+            )
+            positions = {p['symbol']: float(p['positionAmt']) for p in risk if float(p['positionAmt']) != 0}
+            order_symbols = {o['symbol'] for o in open_orders}
+        cancel_symbols = order_symbols | set(positions)
+
+        results = await asyncio.gather(
+            *(self.close_position(s, amt, account) for s, amt in positions.items()),
+            *(self.send_request('DELETE', '/fapi/v1/allOpenOrders', {'symbol': s}, account) for s in cancel_symbols),
+            return_exceptions=True
+        )
+        errors = [r for r in results if isinstance(r, Exception)]
+        for e in errors:
+            print(f"Flatten Error [{account.name}]: {e}")
+        return len(positions), len(cancel_symbols), len(errors)
+
+    async def flatten_all(self, reason=""):
+        """Kill switch: close every position and cancel every open order, all requests on all accounts in flight at once."""
+        t0 = time.perf_counter()
+        results = await asyncio.gather(*(self.flatten_account(a) for a in self.accounts), return_exceptions=True)
+        counts = [(0, 0, 1) if isinstance(r, Exception) else r for r in results]
+        for account, res in zip(self.accounts, results):
+            if isinstance(res, Exception):
+                print(f"Flatten Error [{account.name}]: {res}")
+        positions, symbols, errors = (sum(c) for c in zip(*counts))
+        elapsed_ms = round((time.perf_counter() - t0) * 1000, 1)
+        FLAT_SECONDS.observe(elapsed_ms / 1000)
+
+        report = {
+            "reason": reason,
+            "time_to_flat_ms": elapsed_ms,
+            "positions_closed": positions,
+            "symbols_cancelled": symbols,
+            "errors": errors,
+            "accounts": len(self.accounts),
+            "timestamp": time.time()
+        }
+        await self.redis.hset("bot:kill_switch:last", mapping=report)
+        await self.notify(f"KILL SWITCH ({reason}): flat in {elapsed_ms:.0f} ms. "
+                          f"{positions} positions closed, orders cancelled on {symbols} symbols, {errors} errors.")
+        await self.redis.publish("pipeline_events", json.dumps({
+            "timestamp": time.time(),
+            "stage": "execution",
+            "symbol": "ALL",
+            "status": "killed",
+            "details": f"Flat in {elapsed_ms:.0f} ms ({positions} positions)"
+        }))
+        return report
 
-    async def execute_trade(self, signal):
+    async def on_ledger_event(self, event):
+        # Paper events and every account's user-data stream name their account
+        account = event.get('account', self.primary.name)
+        if event.get('e') == 'ORDER_TRADE_UPDATE' and event['o'].get('x') == 'TRADE':
+            o = event['o']
+            closed = self.ledger.fill(account, o['s'], o['S'], float(o['l']), float(o['L']),
+                                      float(o.get('rp', 0)), float(o.get('n', 0)), event['E'] / 1000)
+            if closed:
+                print(f"Trade closed ({account}): {closed['symbol']} net {closed['net_pnl']:.4f}")
+        elif event.get('e') == 'SNAPSHOT' and not self.paper:
+            # Reconnected: settle trades whose position closed while fills were not streaming
+            for closed in self.ledger.reconcile(account, self.user_streams[account].state.positions):
+                print(f"Trade settled from snapshot ({account}): {closed['symbol']} net {closed['net_pnl']:.4f}")
+
+    async def on_kill_switch(self, active, reason):
+        if active:
+            asyncio.create_task(self.flatten_all(reason))
+
+    async def query_order(self, symbol, client_id, account=None):
+        """Order by newClientOrderId, None if the exchange never saw it."""
+        try:
+            return await self.send_request('GET', '/fapi/v1/order', {'symbol': symbol, 'origClientOrderId': client_id}, account)
+        except Exception as e:
+            if "-2013" in str(e): # Order does not exist
+                return None
+            raise
+
+    async def recover_signal(self, signal_id, info):
+        """Reconciles one interrupted trade against the exchange (its symbol only)."""
+        symbol, legs = info['symbol'], info['legs']
+        account = self.account_for(signal_id)
+        if account is None:
+            print(f"Recovery {symbol} ({signal_id}): account no longer configured, skipped.")
+            return
+        entry = legs.get('entry')
+        order = await self.query_order(symbol, entry['client_id'], account) if entry and entry['sent'] else None
+        if not order or float(order.get('executedQty', 0)) == 0:
+            print(f"Recovery {symbol} ({signal_id}): entry never filled.")
+            self.journal.done(signal_id, symbol, 'aborted')
+            return
+
+        risk = await self.send_request('GET', '/fapi/v2/positionRisk', {'symbol': symbol}, account)
+        if not any(float(p.get('positionAmt', 0)) != 0 for p in risk):
+            print(f"Recovery {symbol} ({signal_id}): position already closed.")
+            self.journal.done(signal_id, symbol, 'closed')
+            return
+
+        for name in ('sl', 'tp1', 'tp2'):
+            leg = legs.get(name)
+            if not leg or leg['acked']:
+                continue
+            if leg['sent'] and await self.query_order(symbol, leg['client_id'], account):
+                continue # Landed, the ack was lost
+            try:
+                await self.journaled_request(signal_id, symbol, name, leg['params'], account=account)
+                print(f"Recovery {symbol}: placed missing {name.upper()}")
+            except Exception as e:
+                print(f"Recovery {symbol}: {name.upper()} failed: {e}")
+                if name == 'sl':
+                    await self.flatten(signal_id, symbol, leg['params']['side'], entry['params']['quantity'], account)
+                    await self.notify(f"Recovery: SL Failed for {symbol}, position closed at market.")
+                    self.journal.done(signal_id, symbol, 'flattened')
+                    return
+        self.journal.done(signal_id, symbol, 'recovered')
+        await self.notify(f"Recovered interrupted trade for {symbol}.")
+
+    async def recover(self, signal_ids=None):
+        """Startup replay: only signals without a 'done' row are checked."""
+        pending = self.journal.pending()
+        if signal_ids is not None:
+            pending = {k: v for k, v in pending.items() if k in signal_ids}
+        if not pending:
+            return
+        t0 = time.perf_counter()
+        print(f"Recovering {len(pending)} interrupted trade(s): {sorted({p['symbol'] for p in pending.values()})}")
+        results = await asyncio.gather(
+            *(self.recover_signal(sid, info) for sid, info in pending.items()), return_exceptions=True
+        )
+        for sid, res in zip(pending, results):
+            if isinstance(res, Exception):
+                print(f"Recovery Error {sid}: {res}")
+        print(f"Recovery finished in {time.perf_counter() - t0:.2f}s")
+
+    def apply_filters(self, symbol, side, amount, sl_price, tp1, tp2, entry_price=None):
+        """
+        Rounds qty/prices to the symbol's tickSize/stepSize and checks min/max qty and minNotional.
+        Raises OrderFilterError when the order would be rejected or the symbol has no cached filters.
+        """
+        f = self.filters.get(symbol)
+        if not f:
+            if not self.filters.unrounded:
+                # Raw floats ("1.2345678901234e-05") fail the exchange precision checks
+                raise OrderFilterError(f"{symbol}: no exchange filters, signal refused")
+            half = amount / 2
+            return {'qty': amount, 'sl': sl_price, 'tp1': tp1, 'tp2': tp2,
+                    'tp1_qty': half, 'tp2_qty': amount - half,
+                    'qty_str': str(amount), 'sl_str': str(sl_price), 'tp1_str': str(tp1), 'tp2_str': str(tp2),
+                    'tp1_qty_str': str(half), 'tp2_qty_str': str(amount - half)}
+
+        # Short: SL above entry rounds up (keeps the full buffer), TPs round up (toward entry).
+        # Long: the mirror image.
+        mode = 'ceil' if side == 'SELL' else 'floor'
+        sl_r, tp1_r, tp2_r = (float(x) for x in self.filters.round_price(symbol, [sl_price, tp1, tp2], mode))
+        qty = float(self.filters.round_qty(symbol, amount))
+        self.filters.check_qty(symbol, qty, float(entry_price or 0), market=True)
+
+        tp1_qty = float(self.filters.round_qty(symbol, qty / 2))
+        if tp1_qty < f['min_qty']:
+            tp1_qty = qty # Too small to split
+        tp2_qty = round(qty - tp1_qty, f['qty_decimals'])
+
+        fp, fq = self.filters.format_price, self.filters.format_qty
+        return {'qty': qty, 'sl': sl_r, 'tp1': tp1_r, 'tp2': tp2_r, 'tp1_qty': tp1_qty, 'tp2_qty': tp2_qty,
+                'qty_str': fq(symbol, qty), 'sl_str': fp(symbol, sl_r),
+                'tp1_str': fp(symbol, tp1_r), 'tp2_str': fp(symbol, tp2_r),
+                'tp1_qty_str': fq(symbol, tp1_qty), 'tp2_qty_str': fq(symbol, tp2_qty)}
+
+    async def execute_on_account(self, account, signal, signal_id, redelivered=False):
+        """
+        Places one signal on one account (size scaled by its multiplier).
+        Returns the per-account result, or None if this account already handled the signal.
+        redelivered: the orders stream entry was reclaimed, another replica may have sent it.
+        """
         symbol = signal['symbol'].replace('/', '') # BTC/USDT -> BTCUSDT
         side = signal['side'].upper()
-        amount = float(signal['amount'])
+        amount = float(signal['amount']) * account.multiplier
         params = signal['params']
         sl_price = float(params['stop_loss'])
         tp1 = float(params['take_profit_1'])
         tp2 = float(params['take_profit_2'])
+        label = symbol if len(self.accounts) == 1 else f"{symbol} [{account.name}]"
+
+        if self.journal.is_done(signal_id):
+            print(f"Signal {signal_id} ({label}) already handled, skipping redelivery.")
+            return None
+        interrupted = self.journal.pending(signal_id).get(signal_id)
+        if interrupted:
+            # Planned here but never finished: settle it against the exchange, never enter twice
+            print(f"Signal {signal_id} ({label}) was interrupted, recovering instead of re-entering.")
+            await self.recover_signal(signal_id, interrupted)
+            return None
 
-        print(f"Executing trade for {symbol}, Size: {amount}...")
+        print(f"Executing trade for {label}, Size: {amount}...")
+        result = {"status": "failed", "amount": 0, "order_ids": {}, "latency_ms": {}}
 
         try:
+            # Round to exchange filters locally (cached exchangeInfo, no extra REST call)
+            sl_side = 'BUY' if side == 'SELL' else 'SELL'
+            o = self.apply_filters(symbol, side, amount, sl_price, tp1, tp2, signal.get('entry_price'))
+            amount, sl_price, tp1, tp2 = o['qty'], o['sl'], o['tp1'], o['tp2']
+            result.update({"sl": sl_price, "tp1": tp1, "tp2": tp2})
+
             # 1. Place Market Entry
             order_params = {
                 'symbol': symbol,
                 'side': side,
                 'type': 'MARKET',
-                'quantity': amount,
+                'quantity': o['qty_str'],
+                'newClientOrderId': client_order_id(signal_id, 'entry')
             }
-            
-            if DRY_RUN:
-                print(f"[DRY RUN] Would have placed ENTRY {side} for {amount} {symbol}")
-                order = {'orderId': 'SIMULATED_ENTRY'}
-            else:
-                order = await self.send_request('POST', '/fapi/v1/order', order_params)
-                print(f"Entry Order Placed: {order['orderId']}")
-            
-            # 2. Place Stop Loss (STOP_MARKET)
-            sl_side = 'BUY' if side == 'SELL' else 'SELL'
-            sl_params = {
-                'symbol': symbol,
-                'side': sl_side,
-                'type': 'STOP_MARKET',
-                'stopPrice': sl_price,
-                'closePosition': 'true' # Reduce only for SL usually means closePosition
-                # Or use quantity+reduceOnly. For simplicity using closePosition=true which closes everything? 
-                # Better: Use quantity.
-            }
-            # Note: closePosition=true ignores quantity.
-            # Let's use quantity with reduceOnly
-            sl_params = {
-                'symbol': symbol,
-                'side': sl_side,
-                'type': 'STOP_MARKET',
-                'stopPrice': sl_price,
-                'quantity': amount,
-                'reduceOnly': 'true'
-            }
-            
-            if DRY_RUN:
-                 print(f"[DRY RUN] Would have placed SL at {sl_price}")
-                 sl_order = {'orderId': 'SIMULATED_SL'}
-            else:
-                sl_order = await self.send_request('POST', '/fapi/v1/order', sl_params)
-                print(f"SL Placed: {sl_order['orderId']}")
 
-            # 3. Place Take Profits (LIMIT)
-            tp_qty = round(amount / 2, 3) # Be careful with precision!
-            # For now, simplistic rounding.
-            
-            tp1_params = {
+            # 2. Protective legs, submitted together in one batch right after the fill
+            # Stop Loss (STOP_MARKET, quantity + reduceOnly rather than closePosition)
+            legs = [('sl', {
                 'symbol': symbol,
                 'side': sl_side,
-                'type': 'LIMIT',
-                'price': tp1,
-                'quantity': tp_qty,
-                'timeInForce': 'GTC',
-                'reduceOnly': 'true'
-            }
-            if DRY_RUN:
-                 print(f"[DRY RUN] Would have placed TP1 at {tp1}")
-                 tp1_order = {'orderId': 'SIMULATED_TP1'}
-            else:
-                tp1_order = await self.send_request('POST', '/fapi/v1/order', tp1_params)
-                print(f"TP1 Placed: {tp1_order['orderId']}")
-            
-            tp2_params = {
+                'type': 'STOP_MARKET',
+                'stopPrice': o['sl_str'],
+                'quantity': o['qty_str'],
+                'reduceOnly': 'true',
+                'newClientOrderId': client_order_id(signal_id, 'sl')
+            })]
+            # Take Profits (LIMIT): TP1 = half (floored to stepSize), TP2 = exact remainder
+            legs.append(('tp1', {
                 'symbol': symbol,
                 'side': sl_side,
                 'type': 'LIMIT',
-                'price': tp2,
-                'quantity': tp_qty, # Remainder
+                'price': o['tp1_str'],
+                'quantity': o['tp1_qty_str'],
                 'timeInForce': 'GTC',
-                'reduceOnly': 'true'
-            }
-            if DRY_RUN:
-                 print(f"[DRY RUN] Would have placed TP2 at {tp2}")
-                 tp2_order = {'orderId': 'SIMULATED_TP2'}
-            else:
-                tp2_order = await self.send_request('POST', '/fapi/v1/order', tp2_params)
-                print(f"TP2 Placed: {tp2_order['orderId']}")
-            
-            trade_event = {
-                "symbol": symbol,
-                "side": side,
-                "amount": amount,
-                "entry_price": signal.get('entry_price', 0), # Ensure this is passed
-                "timestamp": time.time(),
-                "status": "dry_run" if DRY_RUN else "executed",
-                "sl": sl_price,
-                "tp1": tp1,
-                "tp2": tp2,
-                "scores": signal.get('scores', {})
-            }
-            
-            # Persist to history for Dashboard
-            await self.redis.lpush("trade_history", json.dumps(trade_event))
-            # Keep last 1000
-            await self.redis.ltrim("trade_history", 0, 999)
-            
-            await self.notify(f"Executed Short {symbol}\nSL: {sl_price}\nTP1: {tp1}\nTP2: {tp2}")
-            
-            # PIPELINE EVENT: Execution
-            event = {
-                "timestamp": time.time(),
-                "stage": "execution",
-                "symbol": symbol,
-                "status": "executed",
-                "details": f"Price: {signal.get('entry_price')} | Size: {amount}"
-            }
-            await self.redis.publish("pipeline_events", json.dumps(event))
+                'reduceOnly': 'true',
+                'newClientOrderId': client_order_id(signal_id, 'tp1')
+            }))
+            if o['tp2_qty'] > 0: # Otherwise position too small to split: TP1 closes everything
+                legs.append(('tp2', {
+                    'symbol': symbol,
+                    'side': sl_side,
+                    'type': 'LIMIT',
+                    'price': o['tp2_str'],
+                    'quantity': o['tp2_qty_str'], # Remainder
+                    'timeInForce': 'GTC',
+                    'reduceOnly': 'true',
+                    'newClientOrderId': client_order_id(signal_id, 'tp2')
+                }))
 
-        except Exception as e:
-            print(f"Execution Error {symbol}: {e}")
-            await self.notify(f"Execution Failed for {symbol}: {e}")
+            if redelivered and await self.query_order(symbol, order_params['newClientOrderId'], account):
+                # Another replica sent this entry and died (its journal is not ours). Binance only
+                # rejects duplicate client ids among open orders, a filled MARKET would be re-sent
+                print(f"Signal {signal_id} ({label}) entry already on the exchange, recovering instead of re-entering.")
+                self.journal.plan(signal_id, symbol, {'entry': order_params, **dict(legs)})
+                info = self.journal.pending(signal_id)[signal_id]
+                for leg in info['legs'].values():
+                    leg['sent'] = True # Unknown: recovery looks each leg up before placing it
+                await self.recover_signal(signal_id, info)
+                return None
+
+            t0 = time.perf_counter()
+            # Journal the whole plan first: a crash after the fill can still be protected on restart
+            self.journal.plan(signal_id, symbol, {'entry': order_params, **dict(legs)})
+            self.ledger.open(signal_id, account.name, symbol, side, amount, float(signal.get('entry_price') or 0),
+                             sl_price, tp1, tp2, details={'scores': signal.get('scores', {})},
+                             ts=self.paper._ts() / 1000 if self.paper else None) # Replay clock in backtests
+            order = await self.journaled_request(signal_id, symbol, 'entry', order_params, account=account)
+            latency_entry = round((time.perf_counter() - t0) * 1000, 1)
+            print(f"{'[PAPER] ' if self.paper else ''}Entry Order Placed ({account.name}): {order['orderId']}")
+
+            placed, latency = await self.place_protection(signal_id, symbol, legs, account)
+            latency['entry'] = latency_entry
+
+            latency['protected'] = round((time.perf_counter() - t0) * 1000, 1)
+            PROTECT_SECONDS.labels(account.name).observe(latency['protected'] / 1000)
+            print(f"Latency {label} (ms): {latency}")
+            result['latency_ms'] = latency
+            result['order_ids'] = {'entry': order.get('orderId'),
+                                   **{name: (res or {}).get('orderId') for name, res in placed.items()}}
+
+            if not placed.get('sl'):
+                # Never leave a naked position: flatten and cancel the TPs that made it
+                print(f"SL could not be placed for {label}, flattening position.")
+                await self.flatten(signal_id, symbol, sl_side, o['qty_str'], account)
+                self.journal.done(signal_id, symbol, 'flattened')
+                await self.notify(f"SL Failed for {label}: position closed at market.")
+                result['status'] = 'flattened'
+                TRADES.labels(account.name, 'flattened').inc()
+                return result
+            for name in ('tp1', 'tp2'):
+                if name in dict(legs) and not placed.get(name):
+                    await self.notify(f"{name.upper()} Failed for {label} (SL is in place).")
+
+            self.journal.done(signal_id, symbol, 'executed')
+            result.update({"status": "dry_run" if DRY_RUN else "executed", "amount": amount})
+            TRADES.labels(account.name, result['status']).inc()
+            return result
 
-    async def fetch_balance(self):
-        """Fetches total wallet balance (USDT) from Binance"""
-        try:
-            # GET /fapi/v2/account
-            data = await self.send_request('GET', '/fapi/v2/account')
-            
-            # Find USDT balance
-            total_balance = 0.0
-            pnl = 0.0 # Unrealized PnL
-            
-            for asset in data.get('assets', []):
-                if asset['asset'] == 'USDT':
-                    total_balance = float(asset['walletBalance'])
-                    pnl = float(asset['unrealizedProfit'])
-                    break
-            
-            return total_balance, pnl
         except Exception as e:
-            print(f"Balance Fetch Error: {e}")
-            return 0.0, 0.0
+            print(f"Execution Error {label}: {e}")
+            await self.notify(f"Execution Failed for {label}: {e}")
+            result['error'] = str(e)
+            TRADES.labels(account.name, 'failed').inc()
+            try:
+                self.ledger.void_unfilled(signal_id, account.name)
+            except Exception as le:
+                print(f"Ledger Error {signal_id}: {le}")
+            if not self.paper:
+                # The entry may or may not have filled (e.g. timeout): settle it from the journal now
+                try:
+                    await self.recover({signal_id})
+                except Exception as re:
+                    print(f"Recovery Error {signal_id}: {re}")
+            return result
 
-    async def monitor_balance(self):
-        """Background loop to update stats every 60s"""
-        print("Starting Balance Monitor...")
-        while True:
+    async def execute_trade(self, signal, signal_id=None, redelivered=False):
+        # signal_id = orders stream entry id -> deterministic client order ids
+        signal_id = signal_id or f"m{int(time.time() * 1000)}"
+        symbol = signal['symbol'].replace('/', '') # BTC/USDT -> BTCUSDT
+
+        if self.kill_switch.active:
+            print(f"Kill switch active, not entering {symbol}.")
+            return
+
+        if self.paper and symbol not in self.paper.prices and signal.get('entry_price'):
+            # No tick for this symbol yet: fill the simulated entry at the signal price
+            self.paper.prices[symbol] = float(signal['entry_price'])
+
+        if not self.filters.get(symbol) and not self.filters.unrounded:
+            # Listed after the last exchangeInfo load (or the start-up load failed): fetch it now
             try:
-                balance, pnl = await self.fetch_balance()
-                
-                # Update Redis Key (for API polling)
-                stats = {
-                    "balance": balance,
-                    "pnl": pnl,
-                    "timestamp": time.time()
-                }
-                
-                # Publish to 'bot_stats' Channel (for WebSocket)
-                await self.redis.publish("bot_stats", json.dumps(stats))
-                
-                # Also set a simple key for REST API /status endpoint if needed
-                # (Though currently /status checks 'bot_status' string)
-                
+                await self.filters.load(await self.get_session(), BASE_URL)
             except Exception as e:
-                print(f"Monitor Balance Error: {e}")
-            
-            await asyncio.sleep(60)
+                print(f"Exchange Filters Load Error: {e}")
+
+        # All accounts at once: each has its own session and rate budget, so one more account adds no latency
+        results = await asyncio.gather(
+            *(self.execute_on_account(a, signal, self.journal_id(signal_id, a), redelivered) for a in self.accounts)
+        )
+        per_account = {a.name: r for a, r in zip(self.accounts, results) if r is not None}
+        executed = [r for r in per_account.values() if r['status'] in ('executed', 'dry_run')]
+        if not executed:
+            return
+
+        first = executed[0]
+        amount = sum(r['amount'] for r in executed)
+        sl_price, tp1, tp2 = first['sl'], first['tp1'], first['tp2']
+        trade_event = {
+            "symbol": symbol,
+            "side": signal['side'].upper(),
+            "amount": amount,
+            "entry_price": signal.get('entry_price', 0), # Ensure this is passed
+            "timestamp": time.time(),
+            "status": first['status'],
+            "sl": sl_price,
+            "tp1": tp1,
+            "tp2": tp2,
+            "order_ids": first['order_ids'],
+            "latency_ms": first['latency_ms'],
+            "accounts": per_account,
+            "scores": signal.get('scores', {})
+        }
+
+        # Recent-trades feed (full history + analytics: execution/ledger.py)
+        await self.redis.lpush("trade_history", json.dumps(trade_event))
+        await self.redis.ltrim("trade_history", 0, 999)
+
+        accounts_note = f"\nAccounts: {len(executed)}/{len(self.accounts)}" if len(self.accounts) > 1 else ""
+        await self.notify(f"Executed Short {symbol}\nSL: {sl_price}\nTP1: {tp1}\nTP2: {tp2}{accounts_note}")
+
+        # PIPELINE EVENT: Execution
+        event = {
+            "timestamp": time.time(),
+            "stage": "execution",
+            "symbol": symbol,
+            "status": "executed",
+            "details": f"Price: {signal.get('entry_price')} | Size: {amount}"
+        }
+        await self.redis.publish("pipeline_events", json.dumps(event))
+
+    async def start_streams(self):
+        """One user-data stream and position manager per account."""
+        if self.paper:
+            # Paper exchange pushes the same events the user-data stream would, and its ticks drive the stops
+            self.paper.add_listener(self.on_ledger_event) # Every account's fills
+            for name, stream in self.user_streams.items():
+                self.paper.add_listener(stream.handle_event, account=name)
+                self.paper.add_tick_listener(self.position_managers[name].on_tick)
+                self.paper.add_tick_listener(stream.on_mark)
+                await stream.reconcile()
+                stream.connected = True
+            return
+        # Account / positions / orders pushed over each user-data stream (REST only on connect)
+        for name, stream in self.user_streams.items():
+            stream.add_listener(self.on_ledger_event)
+            asyncio.create_task(stream.run())
+            asyncio.create_task(self.position_managers[name].run())
 
     async def run(self):
         print("Executor Engine Running (Raw HTTP)...")
         
-        # Start Balance Monitor
-        asyncio.create_task(self.monitor_balance())
+        # Exchange filters: load once, refresh in the background
+        session = await self.get_session()
+        try:
+            await self.filters.load(session, BASE_URL)
+        except Exception as e:
+            print(f"Exchange Filters Load Error: {e}")
+        asyncio.create_task(self.filters.refresh_loop(session, BASE_URL))
+
+        await self.start_streams()
+        if self.paper:
+            asyncio.create_task(self.paper.price_loop())
         
+        # Kill switch: in-memory flag kept current over pub/sub
+        await self.kill_switch.start()
+        if self.kill_switch.active:
+            asyncio.create_task(self.flatten_all("active at startup"))
+
+        # Replay the order journal: reconcile only trades interrupted by a crash
+        # (paper state does not survive a restart, nothing to reconcile)
+        if not self.paper:
+            try:
+                await self.recover()
+            except Exception as e:
+                print(f"Journal Recovery Error: {e}")
+
+        await self.orders.ensure_group()
         while True:
-            item = await self.redis.rpop("execution:orders")
-            if item:
-                signal = json.loads(item)
-                await self.execute_trade(signal)
-            else:
+            try:
+                entries = await self.orders.next_batch(count=1, block_ms=5000)
+                for entry_id, item in entries:
+                    try:
+                        signal = json.loads(item)
+                    except (TypeError, ValueError):
+                        # Poison entry: ACK so it is not reclaimed forever
+                        print(f"Dropping malformed order entry {entry_id}: {item}")
+                        await self.orders.ack(entry_id)
+                        continue
+                    if self.kill_switch.active:
+                        # Stale after a kill: never replay it on resume
+                        print(f"Kill switch active, dropping order for {signal.get('symbol')}.")
+                        await self.orders.ack(entry_id)
+                        continue
+                    await self.execute_trade(signal, entry_id, redelivered=self.orders.is_redelivery(entry_id))
+                    await self.orders.ack(entry_id)
+            except Exception as e:
+                print(f"Executor Loop Error: {e}")
                 await asyncio.sleep(1)
             
     async def close(self):
-         if self.session:
-             await self.session.close()
+         self.journal.close()
+         self.ledger.close()
+         for account in self.accounts:
+             await account.close()
 
 if __name__ == "__main__":
     executor = TradeExecutor()
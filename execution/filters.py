@@ -0,0 +1,106 @@
+import os
+import asyncio
+from decimal import Decimal
+import numpy as np
+
+# Exchange filter cache (tickSize / stepSize / minQty / maxQty / minNotional).
+# Loaded once from /fapi/v1/exchangeInfo and refreshed in the background, so
+# prices and quantities are rounded locally and orders are valid on the first
+# try, with no extra REST round trip per order.
+
+FILTERS_REFRESH_INTERVAL = int(os.getenv("FILTERS_REFRESH_INTERVAL", 3600))
+
+
+class OrderFilterError(Exception):
+    pass
+
+
+def _decimals(step):
+    # "0.00100000" -> 3
+    d = Decimal(str(step)).normalize()
+    return max(0, -d.as_tuple().exponent)
+
+
+def round_step(values, step, mode="floor"):
+    """Vectorized rounding of values to a multiple of step. mode: floor | ceil | nearest."""
+    x = np.asarray(values, dtype=float) / step
+    if mode == "floor":
+        n = np.floor(x + 1e-6) # Tolerate float noise just below a step
+    elif mode == "ceil":
+        n = np.ceil(x - 1e-6)
+    else:
+        n = np.round(x)
+    return np.round(n * step, _decimals(step))
+
+
+class ExchangeFilters:
+    def __init__(self, unrounded=False):
+        self.symbols = {} # symbol -> filter dict
+        self.unrounded = unrounded # Offline simulators only: symbols without filters pass through unrounded
+        self.loaded_at = 0.0
+
+    def parse(self, exchange_info):
+        symbols = {}
+        for s in exchange_info.get("symbols", []):
+            f = {"tick_size": 0.0, "step_size": 0.0, "min_qty": 0.0, "max_qty": float("inf"),
+                 "market_max_qty": float("inf"), "min_notional": 0.0}
+            for flt in s.get("filters", []):
+                t = flt.get("filterType")
+                if t == "PRICE_FILTER":
+                    f["tick_size"] = float(flt["tickSize"])
+                elif t == "LOT_SIZE":
+                    f["step_size"] = float(flt["stepSize"])
+                    f["min_qty"] = float(flt["minQty"])
+                    f["max_qty"] = float(flt["maxQty"])
+                elif t == "MARKET_LOT_SIZE":
+                    f["market_max_qty"] = float(flt["maxQty"])
+                elif t == "MIN_NOTIONAL":
+                    f["min_notional"] = float(flt.get("notional", flt.get("minNotional", 0)))
+            f["price_decimals"] = _decimals(f["tick_size"]) if f["tick_size"] else 8
+            f["qty_decimals"] = _decimals(f["step_size"]) if f["step_size"] else 8
+            symbols[s["symbol"]] = f
+        self.symbols = symbols
+
+    async def load(self, session, base_url):
+        async with session.get(f"{base_url}/fapi/v1/exchangeInfo") as resp:
+            data = await resp.json()
+        self.parse(data)
+        self.loaded_at = asyncio.get_running_loop().time()
+        print(f"Exchange filters loaded for {len(self.symbols)} symbols.")
+
+    async def refresh_loop(self, session, base_url):
+        while True:
+            await asyncio.sleep(FILTERS_REFRESH_INTERVAL)
+            try:
+                await self.load(session, base_url)
+            except Exception as e:
+                print(f"Exchange Filters Refresh Error: {e}")
+
+    def get(self, symbol):
+        return self.symbols.get(symbol)
+
+    # --- Rounding helpers (accept scalars or arrays) ---
+    def round_price(self, symbol, prices, mode="nearest"):
+        f = self.symbols[symbol]
+        return round_step(prices, f["tick_size"], mode) if f["tick_size"] else np.asarray(prices, dtype=float)
+
+    def round_qty(self, symbol, qty, mode="floor"):
+        f = self.symbols[symbol]
+        return round_step(qty, f["step_size"], mode) if f["step_size"] else np.asarray(qty, dtype=float)
+
+    def format_price(self, symbol, price):
+        return f"{float(price):.{self.symbols[symbol]['price_decimals']}f}"
+
+    def format_qty(self, symbol, qty):
+        return f"{float(qty):.{self.symbols[symbol]['qty_decimals']}f}"
+
+    def check_qty(self, symbol, qty, price, market=False):
+        """Raises OrderFilterError if the (already rounded) order would be rejected."""
+        f = self.symbols[symbol]
+        max_qty = f["market_max_qty"] if market else f["max_qty"]
+        if qty < f["min_qty"] or qty <= 0:
+            raise OrderFilterError(f"{symbol}: qty {qty} below minQty {f['min_qty']}")
+        if qty > max_qty:
+            raise OrderFilterError(f"{symbol}: qty {qty} above maxQty {max_qty}")
+        if price and qty * price < f["min_notional"]:
+            raise OrderFilterError(f"{symbol}: notional {qty * price:.2f} below minNotional {f['min_notional']}")
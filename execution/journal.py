@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Append-only order journal (SQLite, WAL).
+# Each trade starts with a 'plan' row (all legs); every exchange request is
+# then written as an 'intent' row before it is sent and an 'ack' / 'error'
+# row after. Orders carry a deterministic newClientOrderId derived from the
+# signal id (the orders stream entry id) and the order leg.
+# A signal is finished once its 'done' row exists; anything else found at
+# startup is an interrupted trade, and only those symbols are reconciled.
+#
+# Own file (not the klines DB) so journal writes never wait on the collector.
+
+JOURNAL_DB_PATH = os.getenv("JOURNAL_DB_PATH", "order_journal.db")
+CLIENT_ID_PREFIX = "eb"
+CLIENT_ID_MAX_LEN = 36
+
+
+def client_order_id(signal_id, leg):
+    # Binance: ^[.A-Z:/a-z0-9_-]{1,36}$ -> e.g. eb-1718000000000-0-sl
+    # Ids too long for that (signal:account) use a digest of the signal id, never
+    # a truncation: the leg suffix must survive or the legs would share one id
+    client_id = f"{CLIENT_ID_PREFIX}-{signal_id}-{leg}"
+    if len(client_id) > CLIENT_ID_MAX_LEN:
+        digest = hashlib.sha1(str(signal_id).encode()).hexdigest()[:20]
+        client_id = f"{CLIENT_ID_PREFIX}-{digest}-{leg}"
+    return client_id
+
+
+class OrderJournal:
+    def __init__(self, path=JOURNAL_DB_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path, isolation_level=None) # Autocommit: one row = one transaction
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL") # Durable across process crashes
+        self.init_db()
+
+    def init_db(self):
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS order_journal (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ts REAL,
+                signal_id TEXT,
+                symbol TEXT,
+                leg TEXT,
+                client_id TEXT,
+                kind TEXT,
+                payload TEXT
+            )
+        ''')
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_journal_signal ON order_journal (signal_id)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_journal_kind ON order_journal (kind, signal_id)")
+
+    def record(self, kind, signal_id, symbol, leg=None, client_id=None, payload=None):
+        self.conn.execute(
+            "INSERT INTO order_journal (ts, signal_id, symbol, leg, client_id, kind, payload) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (time.time(), signal_id, symbol, leg, client_id, kind, json.dumps(payload) if payload is not None else None)
+        )
+
+    # --- Helpers used by the executor ---
+    def plan(self, signal_id, symbol, legs):
+        # Full order plan before anything is sent, so recovery can rebuild legs that never went out
+        self.record("plan", signal_id, symbol, payload=legs)
+
+    def intent(self, signal_id, symbol, leg, params):
+        self.record("intent", signal_id, symbol, leg, params.get("newClientOrderId"), params)
+
+    def ack(self, signal_id, symbol, leg, client_id, response):
+        self.record("ack", signal_id, symbol, leg, client_id, response)
+
+    def error(self, signal_id, symbol, leg, client_id, message):
+        self.record("error", signal_id, symbol, leg, client_id, {"error": str(message)})
+
+    def done(self, signal_id, symbol, status):
+        self.record("done", signal_id, symbol, payload={"status": status})
+
+    def is_done(self, signal_id):
+        row = self.conn.execute(
+            "SELECT 1 FROM order_journal WHERE kind = 'done' AND signal_id = ? LIMIT 1", (signal_id,)
+        ).fetchone()
+        return row is not None
+
+    def pending(self, signal_id=None):
+        """
+        Interrupted signals: {signal_id: {'symbol', 'legs': {leg: {'params', 'client_id', 'sent', 'acked'}}}}.
+        Only rows of signals that have a plan but no 'done' row are read (optionally just one signal).
+        """
+        rows = self.conn.execute('''
+            SELECT signal_id, symbol, leg, kind, payload FROM order_journal
+            WHERE signal_id IN (
+                SELECT signal_id FROM order_journal WHERE kind = 'plan' AND (?1 IS NULL OR signal_id = ?1)
+                EXCEPT
+                SELECT signal_id FROM order_journal WHERE kind = 'done'
+            )
+            ORDER BY id
+        ''', (signal_id,)).fetchall()
+
+        out = {}
+        for signal_id, symbol, leg, kind, payload in rows:
+            sig = out.setdefault(signal_id, {"symbol": symbol, "legs": {}})
+            if kind == "plan":
+                for name, params in json.loads(payload).items():
+                    sig["legs"][name] = {"params": params, "client_id": params.get("newClientOrderId"),
+                                         "sent": False, "acked": False}
+                continue
+            state = sig["legs"].get(leg)
+            if state is None:
+                continue # e.g. the flatten order, not part of the plan
+            if kind == "intent":
+                state["sent"] = True
+            elif kind == "ack":
+                state["acked"] = True
+        return out
+
+    def close(self):
+        self.conn.close()
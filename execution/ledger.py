@@ -0,0 +1,274 @@
+import os
+import json
+import time
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Durable trade ledger (SQLite, WAL), one row per trade and account.
+# A row is opened with the order plan (before the entry is sent, so no fill
+# event can beat it) and driven by the account's fills (ORDER_TRADE_UPDATE):
+# entry fills set the real size / average price, closing fills add realized
+# PnL and fees until the filled size is exited. An entry that never fills is
+# voided. Aggregates live in `trade_stats`, one row per
+# scope key and updated in the same transaction as the trade, so analytics
+# are primary-key reads whatever the number of trades:
+#   all     ''            everything
+#   day     'YYYY-MM-DD'  UTC day the trade opened / closed
+#   symbol  'BTCUSDT'
+#   account 'main'
+#
+# Own file (like the order journal) so ledger writes never wait on the
+# collector's klines inserts; the API reads it through read-only connections.
+
+LEDGER_DB_PATH = os.getenv("LEDGER_DB_PATH", "trade_ledger.db")
+LEDGER_RECONCILE_GRACE = 30 # Seconds before an open trade without a live position is settled
+QTY_EPSILON = 1e-9
+
+TRADE_COLUMNS = ("id", "signal_id", "account", "symbol", "side", "status", "opened_at", "closed_at", "amount",
+                 "entry_qty", "entry_price", "sl", "tp1", "tp2", "exit_qty", "exit_price", "pnl", "fees", "net_pnl",
+                 "r_multiple", "close_reason", "details")
+STATS_SORTS = {"key": "key DESC", "pnl": "pnl DESC", "trades": "closed DESC", "win_rate": "CAST(wins AS REAL) / MAX(closed, 1) DESC"}
+STATS_COLUMNS = ("opened", "closed", "wins", "losses", "pnl", "fees", "gross_profit", "gross_loss", "r_sum", "r_count")
+
+
+def utc_day(ts):
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+class TradeLedger:
+    def __init__(self, path=LEDGER_DB_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path, isolation_level=None) # Explicit transactions below
+        self.conn.execute("PRAGMA journal_mode=WAL") # Readers (API) never block the executor
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.init_db()
+
+    def init_db(self):
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS trades (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                signal_id TEXT,
+                account TEXT,
+                symbol TEXT,
+                side TEXT,
+                status TEXT,
+                opened_at REAL,
+                closed_at REAL,
+                amount REAL,
+                entry_price REAL,
+                sl REAL,
+                tp1 REAL,
+                tp2 REAL,
+                entry_qty REAL DEFAULT 0,
+                entry_notional REAL DEFAULT 0,
+                exit_qty REAL DEFAULT 0,
+                exit_notional REAL DEFAULT 0,
+                pnl REAL DEFAULT 0,
+                fees REAL DEFAULT 0,
+                net_pnl REAL,
+                r_multiple REAL,
+                close_reason TEXT,
+                details TEXT,
+                UNIQUE (signal_id, account)
+            )
+        ''')
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_trades_symbol_time ON trades (symbol, opened_at)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_trades_time ON trades (opened_at)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_trades_open ON trades (account, symbol) WHERE status = 'open'")
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS trade_stats (
+                scope TEXT,
+                key TEXT,
+                opened INTEGER DEFAULT 0,
+                closed INTEGER DEFAULT 0,
+                wins INTEGER DEFAULT 0,
+                losses INTEGER DEFAULT 0,
+                pnl REAL DEFAULT 0,
+                fees REAL DEFAULT 0,
+                gross_profit REAL DEFAULT 0,
+                gross_loss REAL DEFAULT 0,
+                r_sum REAL DEFAULT 0,
+                r_count INTEGER DEFAULT 0,
+                PRIMARY KEY (scope, key)
+            ) WITHOUT ROWID
+        ''')
+
+    @contextmanager
+    def transaction(self):
+        # Trade row + its aggregate rows commit together
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def _bump(self, keys, **deltas):
+        cols = ", ".join(deltas)
+        marks = ", ".join("?" for _ in deltas)
+        updates = ", ".join(f"{c} = {c} + excluded.{c}" for c in deltas)
+        self.conn.executemany(
+            f"INSERT INTO trade_stats (scope, key, {cols}) VALUES (?, ?, {marks}) "
+            f"ON CONFLICT (scope, key) DO UPDATE SET {updates}",
+            [(scope, key, *deltas.values()) for scope, key in keys]
+        )
+
+    # --- Writes (executor) ---
+    def open(self, signal_id, account, symbol, side, amount, entry_price, sl=None, tp1=None, tp2=None,
+             details=None, ts=None):
+        """Records a planned entry. Idempotent per (signal_id, account): redelivered signals count once."""
+        ts = ts or time.time()
+        with self.transaction():
+            cur = self.conn.execute(
+                "INSERT OR IGNORE INTO trades (signal_id, account, symbol, side, status, opened_at, amount, "
+                "entry_price, sl, tp1, tp2, details) VALUES (?, ?, ?, ?, 'open', ?, ?, ?, ?, ?, ?, ?)",
+                (signal_id, account, symbol, side.upper(), ts, amount, entry_price, sl, tp1, tp2,
+                 json.dumps(details) if details is not None else None)
+            )
+            if cur.rowcount:
+                self._bump([("all", ""), ("day", utc_day(ts)), ("symbol", symbol), ("account", account)], opened=1)
+        return bool(cur.rowcount)
+
+    def fill(self, account, symbol, side, qty, price, realized=0.0, fee=0.0, ts=None):
+        """Applies a fill to the account's oldest open trade on the symbol. Returns the closed trade, if any."""
+        row = self.conn.execute(
+            "SELECT id, side, amount, entry_qty, exit_qty FROM trades WHERE status = 'open' AND account = ? AND symbol = ? "
+            "ORDER BY id LIMIT 1", (account, symbol)
+        ).fetchone()
+        if row is None:
+            return None
+        trade_id, trade_side, amount, entry_qty, exit_qty = row
+        if side.upper() == trade_side:
+            self.conn.execute(
+                "UPDATE trades SET entry_qty = entry_qty + ?, entry_notional = entry_notional + ?, fees = fees + ?, "
+                "entry_price = (entry_notional + ?) / (entry_qty + ?) WHERE id = ?",
+                (qty, qty * price, fee, qty * price, qty, trade_id)
+            )
+            return None
+
+        closed = None
+        with self.transaction():
+            self.conn.execute(
+                "UPDATE trades SET exit_qty = exit_qty + ?, exit_notional = exit_notional + ?, pnl = pnl + ?, "
+                "fees = fees + ? WHERE id = ?", (qty, qty * price, realized, fee, trade_id)
+            )
+            if exit_qty + qty >= (entry_qty or amount) - QTY_EPSILON:
+                closed = self._close(trade_id, ts or time.time(), "filled")
+        return closed
+
+    def _close(self, trade_id, ts, reason):
+        symbol, account, amount, entry, sl, pnl, fees = self.conn.execute(
+            "SELECT symbol, account, COALESCE(NULLIF(entry_qty, 0), amount), entry_price, sl, pnl, fees "
+            "FROM trades WHERE id = ?", (trade_id,)
+        ).fetchone()
+        net = pnl - fees
+        risk = abs(entry - sl) * amount if entry and sl else 0
+        r_multiple = net / risk if risk > 0 else None
+        self.conn.execute(
+            "UPDATE trades SET status = 'closed', closed_at = ?, net_pnl = ?, r_multiple = ?, close_reason = ? "
+            "WHERE id = ?", (ts, net, r_multiple, reason, trade_id)
+        )
+        self._bump(
+            [("all", ""), ("day", utc_day(ts)), ("symbol", symbol), ("account", account)],
+            closed=1, wins=int(net > 0), losses=int(net <= 0), pnl=net, fees=fees,
+            gross_profit=max(net, 0.0), gross_loss=min(net, 0.0),
+            r_sum=r_multiple or 0.0, r_count=int(r_multiple is not None)
+        )
+        return {"id": trade_id, "symbol": symbol, "account": account, "net_pnl": net, "r_multiple": r_multiple}
+
+    def _void(self, trade_id):
+        symbol, account, opened_at = self.conn.execute(
+            "SELECT symbol, account, opened_at FROM trades WHERE id = ?", (trade_id,)
+        ).fetchone()
+        self.conn.execute("UPDATE trades SET status = 'void' WHERE id = ?", (trade_id,))
+        self._bump([("all", ""), ("day", utc_day(opened_at)), ("symbol", symbol), ("account", account)], opened=-1)
+
+    def void_unfilled(self, signal_id, account):
+        """Entry failed: drops the trade unless a fill already arrived for it."""
+        row = self.conn.execute(
+            "SELECT id FROM trades WHERE signal_id = ? AND account = ? AND status = 'open' AND entry_qty = 0 "
+            "AND exit_qty = 0", (signal_id, account)
+        ).fetchone()
+        if row is None:
+            return False
+        with self.transaction():
+            self._void(row[0])
+        return True
+
+    def reconcile(self, account, live_symbols, now=None):
+        """Settles open trades whose position is gone (fills missed while the stream was down)."""
+        now = now or time.time()
+        stale = self.conn.execute(
+            "SELECT id, symbol, entry_qty, exit_qty FROM trades WHERE status = 'open' AND account = ? AND opened_at < ?",
+            (account, now - LEDGER_RECONCILE_GRACE)
+        ).fetchall()
+        closed = []
+        for trade_id, symbol, entry_qty, exit_qty in stale:
+            if symbol in live_symbols:
+                continue
+            with self.transaction():
+                if entry_qty == 0 and exit_qty == 0:
+                    self._void(trade_id) # Never filled
+                else:
+                    closed.append(self._close(trade_id, now, "reconciled"))
+        return closed
+
+    def close(self):
+        self.conn.close()
+
+
+# --- Reads (API, any connection) ---
+def _stats_dict(scope, key, row):
+    s = dict(zip(STATS_COLUMNS, row))
+    closed = s["closed"]
+    return {
+        "scope": scope, "key": key, **s,
+        "open": s["opened"] - closed if scope in ("all", "symbol", "account") else None,
+        "win_rate": s["wins"] / closed if closed else None,
+        "avg_pnl": s["pnl"] / closed if closed else None,
+        "avg_r": s["r_sum"] / s["r_count"] if s["r_count"] else None,
+        "profit_factor": s["gross_profit"] / -s["gross_loss"] if s["gross_loss"] else None,
+    }
+
+
+def ledger_stats(conn, scope="all", key=""):
+    row = conn.execute(f"SELECT {', '.join(STATS_COLUMNS)} FROM trade_stats WHERE scope = ? AND key = ?",
+                       (scope, key)).fetchone()
+    return _stats_dict(scope, key, row or (0,) * len(STATS_COLUMNS))
+
+
+def ledger_stats_page(conn, scope, limit=30, offset=0, sort="key"):
+    """One page of a scope's rows ('day': newest first by default)."""
+    order = STATS_SORTS[sort]
+    rows = conn.execute(
+        f"SELECT key, {', '.join(STATS_COLUMNS)} FROM trade_stats WHERE scope = ? ORDER BY {order}, key LIMIT ? OFFSET ?",
+        (scope, limit, offset)
+    ).fetchall()
+    total = conn.execute("SELECT COUNT(*) FROM trade_stats WHERE scope = ?", (scope,)).fetchone()[0]
+    return {"total": total, "items": [_stats_dict(scope, r[0], r[1:]) for r in rows]}
+
+
+def ledger_trades(conn, limit=50, before=None, symbol=None, account=None, status=None):
+    """Newest first, keyset-paginated on (opened_at, id): pass the last page's `next` as `before`."""
+    where, args = [], []
+    if before is not None:
+        where.append("(opened_at, id) < (SELECT opened_at, id FROM trades WHERE id = ?)")
+        args.append(before)
+    for col, value in (("symbol", symbol), ("account", account), ("status", status)):
+        if value:
+            where.append(f"{col} = ?")
+            args.append(value)
+    sql = (f"SELECT {', '.join(c if c != 'exit_price' else 'exit_notional / NULLIF(exit_qty, 0)' for c in TRADE_COLUMNS)} "
+           f"FROM trades {'WHERE ' + ' AND '.join(where) if where else ''} ORDER BY opened_at DESC, id DESC LIMIT ?")
+    rows = conn.execute(sql, (*args, limit)).fetchall()
+    items = []
+    for row in rows:
+        t = dict(zip(TRADE_COLUMNS, row))
+        t["details"] = json.loads(t["details"]) if t["details"] else None
+        items.append(t)
+    return {"items": items, "next": items[-1]["id"] if len(items) == limit else None}
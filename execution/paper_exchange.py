@@ -0,0 +1,438 @@
+import os
+import json
+import time
+import asyncio
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+import websockets
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Local simulated futures exchange for DRY_RUN.
+# Speaks the subset of the Binance Futures REST API the executor uses
+# (request(method, endpoint, params)) and emits user-data-stream shaped events
+# (ORDER_TRADE_UPDATE / ACCOUNT_UPDATE), so the real execution path, account
+# state, position manager and dashboards run unchanged on simulated fills.
+#
+# Matching: resting orders of a symbol sit in two lists sorted by trigger level
+# ("fires when price <= level" and "fires when price >= level"); a tick only
+# bisects and slices off what crossed, so thousands of open orders cost
+# O(log n + triggered) per tick. Several accounts (strategy variants) share
+# one book, each with its own balance and positions (one-way mode).
+
+PAPER_START_BALANCE = float(os.getenv("PAPER_START_BALANCE", 1000))
+PAPER_TAKER_FEE = float(os.getenv("PAPER_TAKER_FEE", 0.0005)) # 0.05%
+PAPER_MAKER_FEE = float(os.getenv("PAPER_MAKER_FEE", 0.0002)) # 0.02%
+PAPER_SLIPPAGE_BPS = float(os.getenv("PAPER_SLIPPAGE_BPS", 2)) # Market / stop fills
+PAPER_PRICE_WS_URL = os.getenv("PAPER_PRICE_WS_URL", "wss://fstream.binance.com/ws/!markPrice@arr@1s")
+
+DEFAULT_ACCOUNT = "default"
+CLOSED_ORDERS_KEPT = 10000 # For GET /fapi/v1/order lookups (journal recovery)
+
+
+class PaperExchangeError(Exception):
+    def __init__(self, code, msg):
+        # Same text as TradeExecutor.send_request errors, so callers parse codes alike
+        super().__init__(f"API Error 400: {{'code': {code}, 'msg': '{msg}'}}")
+        self.code = code
+        self.msg = msg
+
+
+class TriggerBook:
+    """Resting orders of one symbol, sorted by the price that fires them."""
+
+    def __init__(self):
+        self.down_levels, self.down_ids = [], [] # Fire when price <= level (BUY limit, SELL stop)
+        self.up_levels, self.up_ids = [], [] # Fire when price >= level (SELL limit, BUY stop)
+
+    def _lists(self, direction):
+        return (self.down_levels, self.down_ids) if direction == "down" else (self.up_levels, self.up_ids)
+
+    def add(self, order_id, level, direction):
+        levels, ids = self._lists(direction)
+        i = bisect_right(levels, level)
+        levels.insert(i, level)
+        ids.insert(i, order_id)
+
+    def remove(self, order_id, level, direction):
+        levels, ids = self._lists(direction)
+        i = bisect_left(levels, level)
+        while i < len(levels) and levels[i] == level:
+            if ids[i] == order_id:
+                del levels[i], ids[i]
+                return
+            i += 1
+
+    def pop_triggered(self, price):
+        i = bisect_left(self.down_levels, price)
+        fired = self.down_ids[i:]
+        del self.down_levels[i:], self.down_ids[i:]
+        j = bisect_right(self.up_levels, price)
+        fired += self.up_ids[:j]
+        del self.up_levels[:j], self.up_ids[:j]
+        return fired
+
+    def __len__(self):
+        return len(self.down_ids) + len(self.up_ids)
+
+
+class PaperAccount:
+    def __init__(self, name, balance):
+        self.name = name
+        self.balance = balance
+        self.positions = {} # symbol -> {'amount', 'entry_price'}
+        self.realized_pnl = 0.0
+        self.fees = 0.0
+        self.trades = 0
+
+
+class PaperExchange:
+    def __init__(self, start_balance=PAPER_START_BALANCE, taker_fee=PAPER_TAKER_FEE,
+                 maker_fee=PAPER_MAKER_FEE, slippage_bps=PAPER_SLIPPAGE_BPS):
+        self.start_balance = start_balance
+        self.taker_fee = taker_fee
+        self.maker_fee = maker_fee
+        self.slippage = slippage_bps / 10000
+        self.prices = {}
+        self.books = {} # symbol -> TriggerBook
+        self.orders = {} # orderId -> open order
+        self.closed = OrderedDict() # orderId -> filled / cancelled order (bounded)
+        self.accounts = {}
+        self.next_id = 1
+        self.now_ms = None # Replay clock (None = wall clock)
+        self.listeners = [] # (async callback(event), account or None)
+        self.tick_listeners = [] # callback(symbol, price) for symbols with open positions
+
+    # --- Setup ---
+    def account(self, name=DEFAULT_ACCOUNT):
+        if name not in self.accounts:
+            self.accounts[name] = PaperAccount(name, self.start_balance)
+        return self.accounts[name]
+
+    def add_listener(self, callback, account=None):
+        self.listeners.append((callback, account))
+
+    def add_tick_listener(self, callback):
+        self.tick_listeners.append(callback)
+
+    def _ts(self):
+        return self.now_ms if self.now_ms is not None else int(time.time() * 1000)
+
+    # --- Events (user-data stream format) ---
+    def _order_event(self, order, exec_type, last_qty=0.0, last_price=0.0, realized=0.0, fee=0.0):
+        return {
+            "e": "ORDER_TRADE_UPDATE", "E": self._ts(), "account": order['account'],
+            "o": {
+                "s": order['symbol'], "c": order['client_id'], "S": order['side'], "o": order['type'],
+                "X": order['status'], "x": exec_type, "i": order['orderId'],
+                "q": order['qty'], "p": order['price'], "sp": order['stop_price'],
+                "l": last_qty, "L": last_price, "z": order['filled'], "ap": order['avg_price'],
+                "rp": realized, "n": fee, "R": order['reduce_only'],
+            }
+        }
+
+    def _account_event(self, acct, symbol):
+        pos = acct.positions.get(symbol, {'amount': 0.0, 'entry_price': 0.0})
+        return {
+            "e": "ACCOUNT_UPDATE", "E": self._ts(), "account": acct.name,
+            "a": {
+                "m": "ORDER",
+                "B": [{"a": "USDT", "wb": acct.balance, "cw": acct.balance}],
+                "P": [{"s": symbol, "pa": pos['amount'], "ep": pos['entry_price'],
+                       "up": self._unrealized(symbol, pos)}]
+            }
+        }
+
+    async def _dispatch(self, events):
+        for event in events:
+            for callback, account in self.listeners:
+                if account is None or account == event['account']:
+                    try:
+                        await callback(event)
+                    except Exception as e:
+                        print(f"Paper Exchange Listener Error: {e}")
+
+    # --- Orders ---
+    def _trigger(self, order):
+        """(level, direction) for resting orders, None for immediate ones."""
+        t, buy = order['type'], order['side'] == 'BUY'
+        if t == 'LIMIT':
+            return order['price'], "down" if buy else "up"
+        if t == 'STOP_MARKET':
+            return order['stop_price'], "up" if buy else "down"
+        if t == 'TAKE_PROFIT_MARKET':
+            return order['stop_price'], "down" if buy else "up"
+        return None
+
+    def place(self, params, account=DEFAULT_ACCOUNT):
+        """Places one order. Returns (order_response, events)."""
+        acct = self.account(account)
+        symbol = params['symbol']
+        order_type = params['type']
+        if order_type not in ('MARKET', 'LIMIT', 'STOP_MARKET', 'TAKE_PROFIT_MARKET'):
+            raise PaperExchangeError(-1116, f"Invalid orderType {order_type}")
+        client_id = params.get('newClientOrderId') or f"paper-{self.next_id}"
+        if any(o['client_id'] == client_id and o['account'] == account for o in self.orders.values()):
+            raise PaperExchangeError(-4116, "ClientOrderId is duplicated.")
+        qty = float(params['quantity'])
+        if qty <= 0:
+            raise PaperExchangeError(-4003, "Quantity less than or equal to zero.")
+        reduce_only = str(params.get('reduceOnly', 'false')).lower() == 'true'
+        if reduce_only and not self._reducible(acct, symbol, params['side']):
+            raise PaperExchangeError(-2022, "ReduceOnly Order is rejected.")
+
+        order = {
+            'orderId': self.next_id, 'account': account, 'symbol': symbol, 'client_id': client_id,
+            'side': params['side'], 'type': order_type, 'qty': qty,
+            'price': float(params.get('price', 0) or 0), 'stop_price': float(params.get('stopPrice', 0) or 0),
+            'reduce_only': reduce_only, 'status': 'NEW', 'filled': 0.0, 'avg_price': 0.0,
+            'time': self._ts(),
+        }
+        self.next_id += 1
+
+        events = []
+        last = self.prices.get(symbol)
+        trigger = self._trigger(order)
+        if trigger is None:
+            if last is None:
+                raise PaperExchangeError(-1, f"No price for {symbol} yet")
+            events += self._fill(order, self._slipped(last, order['side']), maker=False)
+        elif last is not None and self._crossed(trigger, last):
+            # Marketable on arrival: limit fills as taker at the better of limit / last, stops fire
+            if order_type == 'LIMIT':
+                price = min(order['price'], last) if order['side'] == 'BUY' else max(order['price'], last)
+                events += self._fill(order, price, maker=False)
+            else:
+                events += self._fill(order, self._slipped(last, order['side']), maker=False)
+        else:
+            self.orders[order['orderId']] = order
+            self.books.setdefault(symbol, TriggerBook()).add(order['orderId'], *trigger)
+            events.append(self._order_event(order, 'NEW'))
+        return self._response(order), events
+
+    def cancel(self, symbol, order_id=None, client_id=None, account=DEFAULT_ACCOUNT, status='CANCELED'):
+        order = self.orders.get(order_id) if order_id is not None else next(
+            (o for o in self.orders.values() if o['client_id'] == client_id and o['account'] == account), None)
+        if order is None or order['symbol'] != symbol or order['account'] != account:
+            raise PaperExchangeError(-2011, "Unknown order sent.")
+        return self._close_order(order, status)
+
+    def _close_order(self, order, status):
+        del self.orders[order['orderId']]
+        trigger = self._trigger(order)
+        if trigger:
+            self.books[order['symbol']].remove(order['orderId'], *trigger)
+        order['status'] = status
+        self._remember(order)
+        return self._response(order), [self._order_event(order, 'EXPIRED' if status == 'EXPIRED' else 'CANCELED')]
+
+    def cancel_all(self, symbol, account=DEFAULT_ACCOUNT, reduce_only=False):
+        events = []
+        for order in [o for o in self.orders.values() if o['symbol'] == symbol and o['account'] == account]:
+            if reduce_only and not order['reduce_only']:
+                continue
+            events += self._close_order(order, 'EXPIRED' if reduce_only else 'CANCELED')[1]
+        return events
+
+    def _remember(self, order):
+        self.closed[order['orderId']] = order
+        while len(self.closed) > CLOSED_ORDERS_KEPT:
+            self.closed.popitem(last=False)
+
+    # --- Matching ---
+    @staticmethod
+    def _crossed(trigger, price):
+        level, direction = trigger
+        return price <= level if direction == "down" else price >= level
+
+    def _slipped(self, price, side):
+        return price * (1 + self.slippage) if side == 'BUY' else price * (1 - self.slippage)
+
+    @staticmethod
+    def _reducible(acct, symbol, side):
+        amount = acct.positions.get(symbol, {}).get('amount', 0.0)
+        return (amount > 0 and side == 'SELL') or (amount < 0 and side == 'BUY')
+
+    def _unrealized(self, symbol, pos):
+        mark = self.prices.get(symbol, pos['entry_price'])
+        return (mark - pos['entry_price']) * pos['amount']
+
+    def _fill(self, order, price, maker):
+        acct = self.accounts[order['account']]
+        symbol = order['symbol']
+        pos = acct.positions.get(symbol, {'amount': 0.0, 'entry_price': 0.0})
+        amount = pos['amount']
+        qty = order['qty']
+        if order['reduce_only']:
+            if not self._reducible(acct, symbol, order['side']):
+                # Nothing left to reduce (position closed meanwhile)
+                if order['orderId'] in self.orders:
+                    return self._close_order(order, 'EXPIRED')[1]
+                order['status'] = 'EXPIRED'
+                self._remember(order)
+                return [self._order_event(order, 'EXPIRED')]
+            qty = min(qty, abs(amount))
+        signed = qty if order['side'] == 'BUY' else -qty
+
+        fee = qty * price * (self.maker_fee if maker else self.taker_fee)
+        realized = 0.0
+        new_amount = amount + signed
+        if abs(new_amount) <= max(abs(amount), qty) * 1e-9: # Float dust from unrounded quantities: flat
+            new_amount = 0.0
+        if amount == 0 or (amount > 0) == (signed > 0):
+            entry = (abs(amount) * pos['entry_price'] + qty * price) / abs(new_amount)
+        else:
+            closing = min(qty, abs(amount))
+            realized = closing * (price - pos['entry_price']) * (1 if amount > 0 else -1)
+            entry = pos['entry_price'] if (new_amount > 0) == (amount > 0) else price # Flipped: new entry
+
+        acct.balance += realized - fee
+        acct.realized_pnl += realized
+        acct.fees += fee
+        acct.trades += 1
+        if new_amount == 0:
+            acct.positions.pop(symbol, None)
+        else:
+            acct.positions[symbol] = {'amount': new_amount, 'entry_price': entry}
+
+        if order['orderId'] in self.orders:
+            del self.orders[order['orderId']]
+        order.update(status='FILLED', filled=qty, avg_price=price)
+        self._remember(order)
+
+        events = [self._order_event(order, 'TRADE', qty, price, realized, fee), self._account_event(acct, symbol)]
+        if new_amount == 0:
+            # Flat: leftover SL / TP orders of this position expire
+            events += self.cancel_all(symbol, order['account'], reduce_only=True)
+        return events
+
+    def match(self, symbol, price):
+        """Sets the price and fills whatever it crossed. Returns the events."""
+        self.prices[symbol] = price
+        book = self.books.get(symbol)
+        if not book:
+            return []
+        events = []
+        for order_id in sorted(book.pop_triggered(price)): # Time priority
+            order = self.orders.get(order_id)
+            if order is None:
+                continue # Expired by an earlier fill in this tick
+            if order['type'] == 'LIMIT':
+                events += self._fill(order, order['price'], maker=True)
+            else:
+                events += self._fill(order, self._slipped(price, order['side']), maker=False)
+        return events
+
+    async def on_tick(self, symbol, price):
+        events = self.match(symbol, price)
+        if events:
+            await self._dispatch(events)
+        if self.tick_listeners and any(symbol in a.positions for a in self.accounts.values()):
+            for callback in self.tick_listeners:
+                callback(symbol, price)
+
+    async def on_prices(self, prices):
+        """Batch tick (e.g. the all-market markPrice array)."""
+        for symbol, price in prices.items():
+            if symbol in self.books or self.tick_listeners:
+                await self.on_tick(symbol, price)
+            else:
+                self.prices[symbol] = price
+
+    async def price_loop(self, url=PAPER_PRICE_WS_URL):
+        print(f"Paper Exchange price feed: {url}")
+        while True:
+            try:
+                async with websockets.connect(url) as ws:
+                    async for msg in ws:
+                        data = json.loads(msg)
+                        await self.on_prices({d['s']: float(d['p']) for d in data if 'p' in d})
+            except Exception as e:
+                print(f"Paper Price Feed Error: {e}")
+            await asyncio.sleep(5)
+
+    # --- REST facade ---
+    def _response(self, order):
+        return {
+            'orderId': order['orderId'], 'clientOrderId': order['client_id'], 'symbol': order['symbol'],
+            'status': order['status'], 'type': order['type'], 'side': order['side'],
+            'origQty': str(order['qty']), 'executedQty': str(order['filled']), 'avgPrice': str(order['avg_price']),
+            'price': str(order['price']), 'stopPrice': str(order['stop_price']), 'reduceOnly': order['reduce_only'],
+            'updateTime': self._ts(),
+        }
+
+    def _find(self, params, account):
+        if params.get('orderId') is not None:
+            order_id = int(params['orderId'])
+            order = self.orders.get(order_id) or self.closed.get(order_id)
+        else:
+            client_id = params.get('origClientOrderId')
+            order = next((o for o in list(self.orders.values()) + list(self.closed.values())
+                          if o['client_id'] == client_id and o['account'] == account), None)
+        if order is None or order['account'] != account:
+            raise PaperExchangeError(-2013, "Order does not exist.")
+        return order
+
+    def position_risk(self, account=DEFAULT_ACCOUNT, symbol=None):
+        acct = self.account(account)
+        return [{
+            'symbol': s, 'positionAmt': str(p['amount']), 'entryPrice': str(p['entry_price']),
+            'markPrice': str(self.prices.get(s, p['entry_price'])), 'unRealizedProfit': str(self._unrealized(s, p)),
+        } for s, p in acct.positions.items() if symbol is None or s == symbol]
+
+    async def request(self, method, endpoint, params=None, account=DEFAULT_ACCOUNT):
+        params = params or {}
+        events = []
+        if method == 'POST' and endpoint == '/fapi/v1/order':
+            result, events = self.place(params, account)
+        elif method == 'POST' and endpoint == '/fapi/v1/batchOrders':
+            result = []
+            for p in json.loads(params['batchOrders']):
+                try:
+                    res, ev = self.place(p, account)
+                    result.append(res)
+                    events += ev
+                except PaperExchangeError as e:
+                    result.append({'code': e.code, 'msg': e.msg})
+        elif method == 'DELETE' and endpoint == '/fapi/v1/order':
+            order = self._find(params, account)
+            result, events = self.cancel(params['symbol'], order['orderId'], account=account)
+        elif method == 'DELETE' and endpoint == '/fapi/v1/allOpenOrders':
+            events = self.cancel_all(params['symbol'], account)
+            result = {'code': 200, 'msg': 'The operation of cancel all open order is done.'}
+        elif method == 'GET' and endpoint == '/fapi/v1/order':
+            result = self._response(self._find(params, account))
+        elif method == 'GET' and endpoint == '/fapi/v1/openOrders':
+            result = [self._response(o) for o in self.orders.values()
+                      if o['account'] == account and params.get('symbol') in (None, o['symbol'])]
+        elif method == 'GET' and endpoint == '/fapi/v2/positionRisk':
+            result = self.position_risk(account, params.get('symbol'))
+        elif method == 'GET' and endpoint == '/fapi/v2/account':
+            acct = self.account(account)
+            risk = self.position_risk(account)
+            result = {
+                'assets': [{'asset': 'USDT', 'walletBalance': str(acct.balance), 'crossWalletBalance': str(acct.balance),
+                            'unrealizedProfit': str(sum(float(r['unRealizedProfit']) for r in risk))}],
+                'positions': [{'symbol': r['symbol'], 'positionAmt': r['positionAmt'], 'entryPrice': r['entryPrice'],
+                               'unrealizedProfit': r['unRealizedProfit']} for r in risk],
+            }
+        else:
+            raise PaperExchangeError(-1, f"Paper exchange does not support {method} {endpoint}")
+        if events:
+            await self._dispatch(events)
+        return result
+
+    def stats(self, account=DEFAULT_ACCOUNT):
+        acct = self.account(account)
+        unrealized = sum(self._unrealized(s, p) for s, p in acct.positions.items())
+        return {
+            "account": account,
+            "balance": round(acct.balance, 4),
+            "equity": round(acct.balance + unrealized, 4),
+            "realized_pnl": round(acct.realized_pnl, 4),
+            "fees": round(acct.fees, 4),
+            "trades": acct.trades,
+            "open_positions": len(acct.positions),
+            "open_orders": sum(1 for o in self.orders.values() if o['account'] == account),
+        }
@@ -0,0 +1,238 @@
+import os
+import json
+import time
+import asyncio
+import websockets
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Local stop management for open positions.
+# Subscribes to markPrice only for symbols with an open position (positions and
+# their stop orders come from the user-data stream) and evaluates the rules on
+# every tick, in memory:
+#   trailing stop    - once price moved TRAIL_ACTIVATION_PCT in our favour,
+#                      keep the stop TRAIL_DISTANCE_PCT behind the best price
+#   breakeven        - after TP1 (position partially reduced), stop to entry
+#                      (+ BREAKEVEN_OFFSET_PCT to cover fees)
+#   time stop        - close at market after TIME_STOP_HOURS (off unless set)
+# Stops only ever tighten, and the exchange order is amended only when the new
+# level improves by MIN_STOP_STEP_PCT (and at most every STOP_AMEND_COOLDOWN s):
+# new STOP_MARKET first, then cancel the old one, so the position is never naked.
+# One manager per execution account, fed by that account's user-data stream.
+
+MARK_PRICE_WS_URL = os.getenv("MARK_PRICE_WS_URL", "wss://stream.binancefuture.com/ws") # Testnet
+TRAIL_ACTIVATION_PCT = float(os.getenv("TRAIL_ACTIVATION_PCT", 2.0))
+TRAIL_DISTANCE_PCT = float(os.getenv("TRAIL_DISTANCE_PCT", 1.5))
+BREAKEVEN_AFTER_TP1 = os.getenv("BREAKEVEN_AFTER_TP1", "1") == "1"
+BREAKEVEN_OFFSET_PCT = float(os.getenv("BREAKEVEN_OFFSET_PCT", 0.1))
+TIME_STOP_HOURS = float(os.getenv("TIME_STOP_HOURS", 0)) # 0 = disabled (opt in, e.g. 24)
+MIN_STOP_STEP_PCT = float(os.getenv("MIN_STOP_STEP_PCT", 0.2))
+STOP_AMEND_COOLDOWN = float(os.getenv("STOP_AMEND_COOLDOWN", 2))
+
+OPENED_AT_KEY = "positions:opened_at" # HASH symbol -> first seen (survives restarts), ":<account>" for non-primary
+
+
+def evaluate_stop(pos, mark, now, tick=0.0):
+    """
+    Rules for one tick. pos: {'amount', 'entry_price', 'stop', 'best', 'tp1_done', 'opened_at', 'amended_at'}.
+    Updates pos['best'] and returns ('close', reason), ('amend', new_stop) or None.
+    """
+    short = pos['amount'] < 0
+    pos['best'] = min(pos['best'], mark) if short else max(pos['best'], mark)
+    if now - pos.get('amended_at', 0) < STOP_AMEND_COOLDOWN:
+        return None
+
+    if TIME_STOP_HOURS and now - pos['opened_at'] >= TIME_STOP_HOURS * 3600:
+        return ('close', 'time stop')
+
+    entry = pos['entry_price']
+    sign = -1 if short else 1 # Direction of profit
+    levels = []
+    if BREAKEVEN_AFTER_TP1 and pos['tp1_done']:
+        levels.append(entry * (1 + sign * BREAKEVEN_OFFSET_PCT / 100))
+    favourable_pct = sign * (pos['best'] - entry) / entry * 100
+    if TRAIL_ACTIVATION_PCT and favourable_pct >= TRAIL_ACTIVATION_PCT:
+        levels.append(pos['best'] * (1 - sign * TRAIL_DISTANCE_PCT / 100))
+    if not levels:
+        return None
+
+    new_stop = min(levels) if short else max(levels) # Tightest rule wins
+    if (new_stop - mark) * sign >= 0:
+        return None # Would trigger immediately (price already through it)
+
+    current = pos.get('stop')
+    if current:
+        improvement = (new_stop - current) * sign
+        if improvement < max(current * MIN_STOP_STEP_PCT / 100, tick):
+            return None
+    return ('amend', new_stop)
+
+
+class PositionManager:
+    def __init__(self, executor, ws_url=MARK_PRICE_WS_URL, user_stream=None):
+        self.executor = executor # Signed REST (or the paper exchange), filters
+        self.user_stream = user_stream or executor.user_stream # Positions / stop orders of one account
+        self.account = self.user_stream.account # None = primary
+        self.label = self.user_stream.label
+        self.opened_key = OPENED_AT_KEY if self.user_stream.is_primary else f"{OPENED_AT_KEY}:{self.account.name}"
+        self.redis = executor.redis
+        self.ws_url = ws_url
+        self.positions = {} # symbol -> managed state (see evaluate_stop)
+        self.ws = None
+        self.subscribed = set()
+        self.busy = set() # Symbols with an amend / close in flight
+        self.request_id = 0
+        self.user_stream.add_listener(self.on_user_event)
+
+    # --- Position tracking (user-data stream) ---
+    def _find_stop(self, symbol, short):
+        stops = [(o['stop_price'], oid) for oid, o in self.user_stream.state.orders.items()
+                 if o['symbol'] == symbol and o['type'] == 'STOP_MARKET' and o['reduce_only']]
+        if not stops:
+            return None, None
+        return min(stops) if short else max(stops) # Tightest one protects
+
+    async def on_user_event(self, event):
+        if event.get('e') in ('SNAPSHOT', 'ACCOUNT_UPDATE', 'ORDER_TRADE_UPDATE'):
+            await self.sync()
+
+    async def sync(self):
+        live = self.user_stream.state.positions
+        now = time.time()
+        for symbol, p in live.items():
+            short = p['amount'] < 0
+            stop, stop_id = self._find_stop(symbol, short)
+            pos = self.positions.get(symbol)
+            if pos is None or (pos['amount'] < 0) != short:
+                opened_at = await self.redis.hget(self.opened_key, symbol)
+                if opened_at is None:
+                    opened_at = now
+                    await self.redis.hset(self.opened_key, symbol, opened_at)
+                pos = {
+                    'amount': p['amount'],
+                    'initial_qty': abs(p['amount']),
+                    'entry_price': p['entry_price'],
+                    'best': p['entry_price'],
+                    'tp1_done': False,
+                    'opened_at': float(opened_at),
+                    'amended_at': 0.0,
+                }
+                self.positions[symbol] = pos
+                print(f"Managing {symbol}{self.label}: {p['amount']} @ {p['entry_price']}, stop {stop}")
+            pos['amount'] = p['amount']
+            # Only TP1 reduces a position partially
+            if abs(p['amount']) < pos['initial_qty'] and not pos['tp1_done']:
+                pos['tp1_done'] = True
+                print(f"{symbol}{self.label}: TP1 filled, breakeven rule armed")
+            pos['stop'], pos['stop_order_id'] = stop, stop_id
+
+        for symbol in list(self.positions):
+            if symbol not in live:
+                del self.positions[symbol]
+                await self.redis.hdel(self.opened_key, symbol)
+                print(f"{symbol}{self.label}: position closed, no longer managed")
+        await self.update_subscriptions()
+
+    # --- Mark price subscriptions (open positions only) ---
+    async def _send(self, method, symbols):
+        if not symbols or self.ws is None:
+            return
+        self.request_id += 1
+        params = [f"{s.lower()}@markPrice@1s" for s in symbols]
+        await self.ws.send(json.dumps({"method": method, "params": params, "id": self.request_id}))
+
+    async def update_subscriptions(self):
+        if self.ws is None:
+            return
+        wanted = set(self.positions)
+        try:
+            await self._send("SUBSCRIBE", sorted(wanted - self.subscribed))
+            await self._send("UNSUBSCRIBE", sorted(self.subscribed - wanted))
+            self.subscribed = wanted
+        except Exception as e:
+            print(f"Mark Price Subscription Error: {e}")
+
+    # --- Ticks ---
+    def on_tick(self, symbol, mark):
+        pos = self.positions.get(symbol)
+        if pos is None or symbol in self.busy or self.executor.kill_switch.active:
+            return
+        f = self.executor.filters.get(symbol)
+        action = evaluate_stop(pos, mark, time.time(), f['tick_size'] if f else 0.0)
+        if action:
+            self.busy.add(symbol)
+            asyncio.create_task(self.apply(symbol, action))
+
+    async def apply(self, symbol, action):
+        pos = self.positions.get(symbol)
+        try:
+            if pos is None:
+                return
+            kind, value = action
+            if kind == 'close':
+                await self.executor.close_position(symbol, pos['amount'], self.account)
+                await self.executor.send_request('DELETE', '/fapi/v1/allOpenOrders', {'symbol': symbol}, self.account)
+                await self.executor.notify(f"{symbol}{self.label}: closed by {value}")
+                pos['amended_at'] = time.time()
+                return
+            await self.amend_stop(symbol, pos, value)
+        except Exception as e:
+            print(f"Position Manager Error {symbol}{self.label}: {e}")
+        finally:
+            self.busy.discard(symbol)
+
+    async def amend_stop(self, symbol, pos, new_stop):
+        filters = self.executor.filters
+        qty = abs(pos['amount'])
+        if filters.get(symbol):
+            new_stop = float(filters.round_price(symbol, new_stop))
+            stop_str, qty_str = filters.format_price(symbol, new_stop), filters.format_qty(symbol, qty)
+        else:
+            stop_str, qty_str = str(round(new_stop, 8)), str(qty)
+
+        old_id, old_stop = pos.get('stop_order_id'), pos.get('stop')
+        # New stop first, then cancel the old one: never unprotected
+        order = await self.executor.send_request('POST', '/fapi/v1/order', {
+            'symbol': symbol,
+            'side': 'BUY' if pos['amount'] < 0 else 'SELL',
+            'type': 'STOP_MARKET',
+            'stopPrice': stop_str,
+            'quantity': qty_str,
+            'reduceOnly': 'true',
+            'newClientOrderId': f"eb-trail-{symbol[:12]}-{int(time.time() * 1000)}"
+        }, self.account)
+        pos['stop'], pos['stop_order_id'] = new_stop, order.get('orderId')
+        pos['amended_at'] = time.time()
+        if old_id:
+            try:
+                await self.executor.send_request('DELETE', '/fapi/v1/order', {'symbol': symbol, 'orderId': old_id}, self.account)
+            except Exception as e:
+                print(f"Old Stop Cancel Error {symbol}: {e}")
+
+        print(f"{symbol}{self.label}: stop {old_stop} -> {stop_str}")
+        await self.redis.publish("pipeline_events", json.dumps({
+            "timestamp": time.time(),
+            "stage": "position",
+            "symbol": symbol,
+            "status": "stop_moved",
+            "details": f"SL {old_stop} -> {stop_str} (best {pos['best']}){self.label}"
+        }))
+
+    async def run(self):
+        print(f"Position Manager Running{self.label}...")
+        while True:
+            try:
+                async with websockets.connect(self.ws_url) as ws:
+                    self.ws, self.subscribed = ws, set()
+                    await self.update_subscriptions()
+                    async for msg in ws:
+                        data = json.loads(msg)
+                        if data.get('e') == 'markPriceUpdate':
+                            mark = float(data['p'])
+                            self.user_stream.on_mark(data['s'], mark) # Live unrealized PnL
+                            self.on_tick(data['s'], mark)
+            except Exception as e:
+                print(f"Mark Price Stream Error: {e}")
+            self.ws = None
+            await asyncio.sleep(5)
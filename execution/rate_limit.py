@@ -0,0 +1,35 @@
+import os
+import time
+import asyncio
+
+# Client-side token bucket in front of the exchange REST API.
+# Concurrent bursts (close-all, batch placement) are let through up to the
+# bucket size, then smoothed to the refill rate instead of tripping the
+# exchange's 429 / IP-ban limits.
+
+EXCHANGE_RATE_LIMIT = float(os.getenv("EXCHANGE_RATE_LIMIT", 20)) # Requests per second
+EXCHANGE_RATE_BURST = int(os.getenv("EXCHANGE_RATE_BURST", 40))
+
+
+class TokenBucket:
+    def __init__(self, rate=EXCHANGE_RATE_LIMIT, capacity=EXCHANGE_RATE_BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, tokens=1):
+        # Lock keeps waiters FIFO, so a burst drains in order
+        async with self.lock:
+            while True:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
@@ -0,0 +1,270 @@
+import os
+import json
+import time
+import asyncio
+import websockets
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Binance Futures user-data stream.
+# One listenKey (renewed by a keepalive PUT) gives push events for balance,
+# position and order changes. AccountState is kept in memory from those
+# events; REST is only used to seed it when the stream (re)connects.
+# One stream per execution account; its events are tagged with the account
+# name. The primary account's state is what the engine sizes from
+# (account:balance / account:positions), the others publish under
+# account:<name>:balance / account:<name>:positions.
+#   ACCOUNT_UPDATE      -> balances + positions
+#   ORDER_TRADE_UPDATE  -> open orders + fills
+#   markPriceUpdate     -> unrealized PnL (the position manager's mark price
+#                          stream, open positions only; Binance sends no
+#                          ACCOUNT_UPDATE when only the mark moves)
+
+USER_STREAM_WS_URL = os.getenv("USER_STREAM_WS_URL", "wss://stream.binancefuture.com/ws") # Testnet
+USER_STREAM_KEEPALIVE = int(os.getenv("USER_STREAM_KEEPALIVE", 1800)) # listenKey lives 60 min
+USER_STREAM_RECONNECT_DELAY = 5
+USER_STREAM_PNL_INTERVAL = float(os.getenv("USER_STREAM_PNL_INTERVAL", 0.5)) # Seconds between mark-driven publishes
+
+CLOSED_ORDER_STATUSES = {"FILLED", "CANCELED", "EXPIRED", "REJECTED", "EXPIRED_IN_MATCH"}
+
+
+class AccountState:
+    """In-memory account / position / open-order state. apply() returns True when something changed."""
+
+    def __init__(self, asset="USDT"):
+        self.asset = asset
+        self.balances = {} # asset -> {'wallet', 'cross_wallet'}
+        self.positions = {} # symbol -> {'amount', 'entry_price', 'unrealized_pnl'} (non-zero only)
+        self.orders = {} # orderId -> order dict
+        self.updated_at = 0.0
+
+    # --- Snapshot (REST) ---
+    def load_snapshot(self, account, open_orders):
+        self.balances = {}
+        for a in account.get('assets', []):
+            self.balances[a['asset']] = {
+                'wallet': float(a.get('walletBalance', 0)),
+                'cross_wallet': float(a.get('crossWalletBalance', 0)),
+            }
+        self.positions = {}
+        for p in account.get('positions', []):
+            amt = float(p.get('positionAmt', 0))
+            if amt != 0:
+                self.positions[p['symbol']] = {
+                    'amount': amt,
+                    'entry_price': float(p.get('entryPrice', 0)),
+                    'unrealized_pnl': float(p.get('unrealizedProfit', 0)),
+                }
+        self.orders = {}
+        for o in open_orders or []:
+            self.orders[o['orderId']] = {
+                'symbol': o['symbol'],
+                'client_id': o.get('clientOrderId'),
+                'side': o['side'],
+                'type': o['type'],
+                'status': o['status'],
+                'price': float(o.get('price', 0)),
+                'stop_price': float(o.get('stopPrice', 0)),
+                'qty': float(o.get('origQty', 0)),
+                'filled': float(o.get('executedQty', 0)),
+                'reduce_only': bool(o.get('reduceOnly')),
+            }
+        self.updated_at = time.time()
+
+    # --- Events (WebSocket) ---
+    def apply(self, event):
+        etype = event.get('e')
+        if etype == 'ACCOUNT_UPDATE':
+            self._apply_account(event['a'])
+        elif etype == 'ORDER_TRADE_UPDATE':
+            self._apply_order(event['o'])
+        else:
+            return False
+        self.updated_at = event.get('E', time.time() * 1000) / 1000
+        return True
+
+    def _apply_account(self, a):
+        for b in a.get('B', []):
+            self.balances[b['a']] = {'wallet': float(b['wb']), 'cross_wallet': float(b['cw'])}
+        for p in a.get('P', []):
+            amt = float(p['pa'])
+            if amt == 0:
+                self.positions.pop(p['s'], None)
+            else:
+                self.positions[p['s']] = {
+                    'amount': amt,
+                    'entry_price': float(p['ep']),
+                    'unrealized_pnl': float(p['up']),
+                }
+
+    def _apply_order(self, o):
+        if o['X'] in CLOSED_ORDER_STATUSES:
+            self.orders.pop(o['i'], None)
+            return
+        self.orders[o['i']] = {
+            'symbol': o['s'],
+            'client_id': o.get('c'),
+            'side': o['S'],
+            'type': o['o'],
+            'status': o['X'],
+            'price': float(o.get('p', 0)),
+            'stop_price': float(o.get('sp', 0)),
+            'qty': float(o.get('q', 0)),
+            'filled': float(o.get('z', 0)),
+            'reduce_only': bool(o.get('R')),
+        }
+
+    def mark(self, symbol, price):
+        # Same formula as Binance's unRealizedProfit: (mark - entry) * signed amount
+        p = self.positions.get(symbol)
+        if p is None:
+            return False
+        p['unrealized_pnl'] = (price - p['entry_price']) * p['amount']
+        self.updated_at = time.time()
+        return True
+
+    # --- Views ---
+    def balance(self):
+        return self.balances.get(self.asset, {}).get('wallet', 0.0)
+
+    def pnl(self):
+        return sum(p['unrealized_pnl'] for p in self.positions.values())
+
+    def stats(self):
+        return {
+            "balance": self.balance(),
+            "pnl": self.pnl(),
+            "open_positions": len(self.positions),
+            "open_orders": len(self.orders),
+            "timestamp": time.time()
+        }
+
+
+class UserDataStream:
+    def __init__(self, executor, redis_client, base_url, ws_url=USER_STREAM_WS_URL, account=None):
+        self.executor = executor # Signed REST + shared session
+        self.account = account # BinanceAccount followed (None = the executor's primary)
+        self.is_primary = account is None or executor is None or account is executor.primary
+        self.key_prefix = "account" if self.is_primary else f"account:{account.name}"
+        self.label = "" if self.is_primary else f" [{account.name}]"
+        self.redis = redis_client
+        self.base_url = base_url
+        self.ws_url = ws_url
+        self.state = AccountState()
+        self.listen_key = None
+        self.listeners = [] # async callbacks(event), e.g. position management ('SNAPSHOT' after reconcile)
+        self.connected = False
+        self.mark_pending = False
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    # --- listenKey (API key only, no signature) ---
+    async def _listen_key_request(self, method):
+        account = self.account or self.executor.primary
+        session = await account.get_session()
+        headers = {'X-MBX-APIKEY': account.api_key}
+        async with session.request(method, f"{self.base_url}/fapi/v1/listenKey", headers=headers) as resp:
+            data = await resp.json()
+            if resp.status >= 400:
+                raise Exception(f"listenKey Error {resp.status}: {data}")
+            return data
+
+    async def keepalive_loop(self):
+        while True:
+            await asyncio.sleep(USER_STREAM_KEEPALIVE)
+            try:
+                await self._listen_key_request('PUT')
+            except Exception as e:
+                print(f"listenKey Keepalive Error{self.label}: {e}")
+
+    # --- Reconciliation (REST, once per connect) ---
+    async def reconcile(self):
+        account = await self.executor.send_request('GET', '/fapi/v2/account', account=self.account)
+        open_orders = await self.executor.send_request('GET', '/fapi/v1/openOrders', account=self.account)
+        self.state.load_snapshot(account, open_orders)
+        print(f"Account reconciled{self.label}: balance {self.state.balance():.2f}, "
+              f"{len(self.state.positions)} positions, {len(self.state.orders)} open orders")
+        await self.publish()
+        await self.notify_listeners(self.tag({"e": "SNAPSHOT", "E": int(time.time() * 1000)}))
+
+    def tag(self, event):
+        # Paper events already name their account; the live stream's are this stream's
+        if self.account is not None:
+            event.setdefault('account', self.account.name)
+        return event
+
+    async def notify_listeners(self, event):
+        for callback in self.listeners:
+            try:
+                await callback(event)
+            except Exception as e:
+                print(f"User Stream Listener Error: {e}")
+
+    async def publish(self):
+        stats = self.state.stats()
+        pipe = self.redis.pipeline()
+        if self.is_primary:
+            # 'bot_stats' channel (dashboard WebSocket)
+            pipe.publish("bot_stats", json.dumps(stats))
+        # Cached balance for the engine's position sizing (primary)
+        if stats["balance"] > 0:
+            pipe.hset(f"{self.key_prefix}:balance", mapping=stats)
+        pipe.delete(f"{self.key_prefix}:positions")
+        if self.state.positions:
+            pipe.hset(f"{self.key_prefix}:positions", mapping={s: json.dumps(p) for s, p in self.state.positions.items()})
+        await pipe.execute()
+
+    def on_mark(self, symbol, mark):
+        """Mark price tick: reprices the position now, publishes once per USER_STREAM_PNL_INTERVAL."""
+        if not self.state.mark(symbol, mark) or self.mark_pending:
+            return
+        self.mark_pending = True
+        asyncio.create_task(self.publish_marks())
+
+    async def publish_marks(self):
+        # Every open symbol ticks each second: coalesce them into one publish
+        await asyncio.sleep(USER_STREAM_PNL_INTERVAL)
+        self.mark_pending = False
+        try:
+            await self.publish()
+        except Exception as e:
+            print(f"User Stream Publish Error{self.label}: {e}")
+
+    async def handle_event(self, event):
+        if event.get('e') == 'listenKeyExpired':
+            raise ConnectionError("listenKey expired")
+        if not self.state.apply(event):
+            return
+        self.tag(event)
+        await self.publish()
+
+        if event['e'] == 'ORDER_TRADE_UPDATE' and event['o'].get('x') == 'TRADE':
+            o = event['o']
+            await self.redis.publish("pipeline_events", json.dumps({
+                "timestamp": time.time(),
+                "stage": "fill",
+                "symbol": o['s'],
+                "status": o['X'].lower(),
+                "details": f"{o['S']} {o['l']} @ {o['L']} ({o['o']}) PnL: {o.get('rp', 0)}{self.label}"
+            }))
+
+        await self.notify_listeners(event)
+
+    async def run(self):
+        asyncio.create_task(self.keepalive_loop())
+        while True:
+            try:
+                self.listen_key = (await self._listen_key_request('POST'))['listenKey']
+                async with websockets.connect(f"{self.ws_url}/{self.listen_key}") as ws:
+                    self.connected = True
+                    print(f"User Data Stream Connected{self.label}")
+                    # Seed after subscribing so no event falls between snapshot and stream
+                    await self.reconcile()
+                    async for msg in ws:
+                        await self.handle_event(json.loads(msg))
+            except Exception as e:
+                print(f"User Data Stream Error{self.label}: {e}")
+            self.connected = False
+            await asyncio.sleep(USER_STREAM_RECONNECT_DELAY)
@@ -5,6 +5,8 @@ import redis.asyncio as redis
 import aiohttp
 from dotenv import load_dotenv
 
+from common.streams import StreamQueue, ORDERS_STREAM, ORDERS_GROUP
+
 load_dotenv()
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
@@ -68,7 +70,7 @@ async def force_trade(symbol):
     
     confirm = input("Are you sure you want to PUSH this trade? (y/n): ")
     if confirm.lower() == 'y':
-        await r.lpush("execution:orders", json.dumps(signal))
+        await StreamQueue(r, ORDERS_STREAM, ORDERS_GROUP).push(json.dumps(signal))
         print("✅ Trade Pushed to Execution Queue!")
         # Also log to bot_logs so dashboard sees it
         await r.publish("bot_logs", json.dumps({"type": "info", "message": f"MANUAL OVERRIDE: Shorting {symbol}"}))
@@ -0,0 +1,285 @@
+import os
+import json
+import time
+import asyncio
+import aiohttp
+from bisect import bisect_left
+
+# In-process metrics registry (Prometheus text exposition at /metrics).
+# Recording is a dict lookup at most: bind labelled children once
+# (`child = HIST.labels("x")`) and call inc / set / observe on the hot path.
+# Processes other than the API (supervisor workers) publish their samples to
+# Redis (`prom:{worker}`, with a TTL) every METRICS_PUBLISH_INTERVAL seconds;
+# the API merges them in with a `worker` label. The `metrics:*` namespace is
+# the collector's market data, hence the separate prefix.
+
+METRICS_PUBLISH_INTERVAL = float(os.getenv("METRICS_PUBLISH_INTERVAL", 10))
+METRICS_KEY_PREFIX = "prom:"
+METRICS_WORKERS_KEY = "prom:workers"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+INF = float("inf")
+
+
+class _CounterValue:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount=1.0):
+        self.value += amount
+
+    def samples(self):
+        yield "", (), self.value
+
+
+class _GaugeValue(_CounterValue):
+    __slots__ = ()
+
+    def set(self, value):
+        self.value = value
+
+    def dec(self, amount=1.0):
+        self.value -= amount
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "count", "sum")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * len(bounds) # Per bucket (not cumulative), last is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for bound, n in zip(self.bounds, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return self.bounds[-1]
+
+    def samples(self):
+        cumulative = 0
+        for bound, n in zip(self.bounds, self.counts):
+            cumulative += n
+            yield "_bucket", (("le", "+Inf" if bound == INF else repr(bound)),), cumulative
+        yield "_sum", (), self.sum
+        yield "_count", (), self.count
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children = {} # label values -> value
+        if not self.labelnames:
+            self._default = self.children[()] = self._new_value()
+
+    def _new_value(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        values = tuple(str(v) for v in values)
+        child = self.children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name}: expected labels {self.labelnames}, got {values}")
+            child = self.children[values] = self._new_value()
+        return child
+
+    def collect(self):
+        samples = []
+        for values, child in list(self.children.items()):
+            labels = dict(zip(self.labelnames, values))
+            for suffix, extra, value in child.samples():
+                samples.append([self.name + suffix, {**labels, **dict(extra)}, value])
+        return {"name": self.name, "type": self.kind, "help": self.documentation, "samples": samples}
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _new_value(self):
+        return _CounterValue()
+
+    def inc(self, amount=1.0):
+        self._default.value += amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def _new_value(self):
+        return _GaugeValue()
+
+    def set(self, value):
+        self._default.value = value
+
+    def inc(self, amount=1.0):
+        self._default.value += amount
+
+    def dec(self, amount=1.0):
+        self._default.value -= amount
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.bounds = tuple(sorted(float(b) for b in buckets if b != INF)) + (INF,)
+        super().__init__(name, documentation, labelnames)
+
+    def _new_value(self):
+        return _HistogramValue(self.bounds)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = cls(name, documentation, labelnames, **kwargs)
+        elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+            raise ValueError(f"Metric {name} already registered with a different type / labels")
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def collect(self):
+        return [m.collect() for m in self.metrics.values()]
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+
+# --- Exposition ---
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value):
+    if value == INF:
+        return "+Inf"
+    if value == -INF:
+        return "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(families):
+    """Prometheus text format 0.0.4. Families with the same name (several workers) are merged."""
+    merged = {}
+    for family in families:
+        if family["name"] in merged:
+            merged[family["name"]]["samples"].extend(family["samples"])
+        else:
+            merged[family["name"]] = {**family, "samples": list(family["samples"])}
+
+    lines = []
+    for family in merged.values():
+        lines.append(f"# HELP {family['name']} {_escape(family['help'])}")
+        lines.append(f"# TYPE {family['name']} {family['type']}")
+        for name, labels, value in family["samples"]:
+            if labels:
+                label_str = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+                lines.append(f"{name}{{{label_str}}} {_format_value(value)}")
+            else:
+                lines.append(f"{name} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def with_worker(families, worker):
+    return [{**f, "samples": [[n, {**labels, "worker": worker}, v] for n, labels, v in f["samples"]]} for f in families]
+
+
+# --- Multi-process ---
+async def publish_loop(redis_client, worker, interval=METRICS_PUBLISH_INTERVAL, registry=REGISTRY):
+    """Worker side: pushes this process's samples for the API's /metrics."""
+    key = METRICS_KEY_PREFIX + worker
+    while True:
+        try:
+            payload = json.dumps({"ts": time.time(), "families": registry.collect()})
+            pipe = redis_client.pipeline()
+            pipe.set(key, payload, ex=int(interval * 3) + 1)
+            pipe.sadd(METRICS_WORKERS_KEY, worker)
+            await pipe.execute()
+        except Exception as e:
+            print(f"Metrics Publish Error: {e}")
+        await asyncio.sleep(interval)
+
+
+async def collect_all(redis_client=None, worker="api", registry=REGISTRY):
+    """API side: local registry plus every live worker's last published samples."""
+    families = with_worker(registry.collect(), worker)
+    if redis_client is None:
+        return families
+    workers = sorted(w for w in await redis_client.smembers(METRICS_WORKERS_KEY) if w != worker)
+    if not workers:
+        return families
+    payloads = await redis_client.mget([METRICS_KEY_PREFIX + w for w in workers])
+    for name, payload in zip(workers, payloads):
+        if payload is None:
+            await redis_client.srem(METRICS_WORKERS_KEY, name) # Expired: worker gone
+            continue
+        families.extend(with_worker(json.loads(payload)["families"], name))
+    return families
+
+
+# --- aiohttp client instrumentation ---
+HTTP_CLIENT_SECONDS = histogram("http_client_request_seconds", "Outbound REST latency", ["client", "endpoint"])
+HTTP_CLIENT_ERRORS = counter("http_client_errors_total", "Outbound REST requests with status >= 400 or no response", ["client", "endpoint"])
+BINANCE_USED_WEIGHT = gauge("binance_used_weight_1m", "X-MBX-USED-WEIGHT-1M reported by the exchange", ["client"])
+
+
+def http_trace_config(client):
+    """aiohttp TraceConfig timing every request of a session (endpoint = URL path) and tracking used weight."""
+    weight = BINANCE_USED_WEIGHT.labels(client)
+
+    async def on_request_start(session, ctx, params):
+        ctx.start = time.perf_counter()
+
+    async def on_request_end(session, ctx, params):
+        endpoint = params.url.path
+        HTTP_CLIENT_SECONDS.labels(client, endpoint).observe(time.perf_counter() - ctx.start)
+        used = params.response.headers.get("X-MBX-USED-WEIGHT-1M")
+        if used:
+            weight.set(float(used))
+        if params.response.status >= 400:
+            HTTP_CLIENT_ERRORS.labels(client, endpoint).inc()
+
+    async def on_request_exception(session, ctx, params):
+        HTTP_CLIENT_ERRORS.labels(client, params.url.path).inc()
+
+    trace = aiohttp.TraceConfig()
+    trace.on_request_start.append(on_request_start)
+    trace.on_request_end.append(on_request_end)
+    trace.on_request_exception.append(on_request_exception)
+    return trace
@@ -5,6 +5,8 @@ import time
 import threading
 from dotenv import load_dotenv
 
+from common.kill_switch import KILL_SWITCH_KEY, set_kill_switch
+
 load_dotenv()
 
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
@@ -23,18 +25,19 @@ def send_welcome(message):
 
 @bot.message_handler(commands=['status'])
 def send_status(message):
-    kill_switch = r.get("bot:kill_switch")
+    kill_switch = r.get(KILL_SWITCH_KEY)
     status = "STOPPED" if kill_switch == "1" else "RUNNING"
     bot.reply_to(message, f"Bot Status: {status}")
 
 @bot.message_handler(commands=['stop'])
 def stop_bot(message):
-    r.set("bot:kill_switch", "1")
-    bot.reply_to(message, "Kill Switch ACTIVATED. Bot stopped.")
+    # Published too: every loop flips its in-memory flag, the executor flattens everything
+    set_kill_switch(r, True, "telegram /stop")
+    bot.reply_to(message, "Kill Switch ACTIVATED. Bot stopped, closing all positions.")
 
 @bot.message_handler(commands=['start_bot'])
 def start_bot(message):
-    r.set("bot:kill_switch", "0")
+    set_kill_switch(r, False, "telegram /start_bot")
     bot.reply_to(message, "Bot Resumed.")
 
 def notification_listener():
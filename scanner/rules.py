@@ -0,0 +1,245 @@
+import json
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Scanner filters as a table, evaluated for the whole universe in one pass.
+# MarketScanner.scan() takes its candidates from here and explain() returns
+# the full table (value, threshold, pass / fail, distance to passing for every
+# symbol and rule), so debugging tools can never drift from production logic.
+#
+# Features come from the collector's Redis keys:
+#   klines:{symbol}:1h   pump_4h (close vs open 4 candles back), pump_1h,
+#                        volume_ratio (last vs previous 20), rsi (simple 14)
+#   metrics:{symbol}     funding_rate, open_interest
+#   oi_history:{symbol}  oi_increase vs the oldest of the last 6 samples
+
+WINDOW = 21 # 1h candles used: volume needs 20 + current, RSI 14 diffs, pumps 4
+RSI_PERIOD = 14
+OI_HISTORY_LEN = 6
+BTC_TREND_KEYS = ("klines:BTC/USDT:USDT:15m", "klines:BTC/USDT:15m")
+BTC_BULLISH_PCT = 1.0 # 15m candle body that counts as strongly bullish
+
+
+class Rule:
+    """Passes when lo <= value <= hi (value > lo if strict). `scale` normalizes distances for ranking."""
+
+    def __init__(self, name, lo=None, hi=None, strict=False, scale=1.0):
+        self.name = name
+        self.lo = lo
+        self.hi = hi
+        self.strict = strict
+        self.scale = scale
+
+    def threshold(self):
+        if self.hi is None:
+            return f"{'>' if self.strict else '>='} {self.lo}"
+        return f"{self.lo}..{self.hi}"
+
+    def evaluate(self, values):
+        """(passed, distance) arrays; NaN (missing data) fails with distance NaN."""
+        with np.errstate(invalid="ignore"):
+            below = values <= self.lo if self.strict else values < self.lo
+            above = values > self.hi if self.hi is not None else np.zeros_like(below)
+            passed = ~below & ~above & ~np.isnan(values)
+            distance = np.where(below, self.lo - values, np.where(above, values - (self.hi or 0), 0.0))
+            distance[np.isnan(values)] = np.nan
+        return passed, distance
+
+
+RULES = [
+    Rule("pump_4h", lo=10, hi=25, scale=10),
+    Rule("pump_1h", lo=8, hi=15, scale=8),
+    Rule("volume_ratio", lo=3, scale=3),
+    Rule("rsi", lo=70, scale=70),
+    Rule("funding_rate", lo=0, strict=True, scale=0.0001),
+    Rule("oi_increase", lo=10, scale=10),
+]
+
+
+def skip_symbol(symbol):
+    return "BTC" in symbol and len(symbol) < 9 # BTC itself is the trend filter, not a short
+
+
+def tail_candles(raw, n=WINDOW):
+    """Last n candles of a klines JSON array, parsing only that slice (candles are flat lists)."""
+    pos = len(raw)
+    for _ in range(n):
+        pos = raw.rfind('[', 0, pos)
+        if pos <= 0: # Reached the outer bracket: fewer than n candles
+            return json.loads(raw)
+    return json.loads('[' + raw[pos:])
+
+
+def btc_strongly_bullish(klines_15m):
+    """Last 15m BTC candle up more than BTC_BULLISH_PCT (no data: not bullish)."""
+    if not klines_15m or len(klines_15m) < 5:
+        return False
+    last_open, last_close = float(klines_15m[-1][1]), float(klines_15m[-1][4])
+    return (last_close - last_open) / last_open * 100 > BTC_BULLISH_PCT
+
+
+async def load_universe(redis_client, symbols=None):
+    """One pipelined round trip for every symbol's klines / metrics / OI history (plus the BTC trend)."""
+    if symbols is None:
+        symbols = [k.split(":")[1] for k in await redis_client.keys("metrics:*")]
+    symbols = sorted(s for s in symbols if not skip_symbol(s))
+    pipe = redis_client.pipeline()
+    for key in BTC_TREND_KEYS:
+        pipe.get(key)
+    for s in symbols:
+        pipe.strlen(f"klines:{s}:4h") # Only needs to be non-empty
+        pipe.get(f"klines:{s}:1h")
+        pipe.hgetall(f"metrics:{s}")
+        pipe.lrange(f"oi_history:{s}", 0, OI_HISTORY_LEN - 1)
+    res = await pipe.execute()
+
+    btc = next((json.loads(k) for k in res[:len(BTC_TREND_KEYS)] if k), None)
+    rows = res[len(BTC_TREND_KEYS):]
+    universe = {"symbols": symbols, "btc_bullish": btc_strongly_bullish(btc), "klines_1h": [],
+                "has_4h": [], "metrics": [], "oi_history": []}
+    for i in range(len(symbols)):
+        len_4h, k1, m, oi = rows[4 * i: 4 * i + 4]
+        universe["has_4h"].append(len_4h > 2) # '[]' has no candles
+        universe["klines_1h"].append(tail_candles(k1) if k1 else None) # Rules look back WINDOW candles
+        universe["metrics"].append(m or None)
+        universe["oi_history"].append([json.loads(x) for x in oi])
+    return universe
+
+
+def compute_features(universe):
+    """Feature columns (float arrays, NaN = not computable) for every symbol."""
+    n = len(universe["symbols"])
+    opens, closes, volumes = (np.full((n, WINDOW), np.nan) for _ in range(3))
+    lengths = np.zeros(n, dtype=int)
+    has_data = np.zeros(n, dtype=bool)
+    funding = np.full(n, np.nan)
+    oi_now = np.full(n, np.nan)
+    oi_oldest = np.full(n, np.nan)
+
+    for i, (k1, has_4h, m, oi) in enumerate(zip(universe["klines_1h"], universe["has_4h"], universe["metrics"],
+                                                 universe["oi_history"])):
+        if k1 is None or len(k1) == 0 or not has_4h or not m: # Lists from Redis, array slices in backtests
+            continue
+        tail = np.asarray(k1[-WINDOW:], dtype=float) # len(k1) is only compared against <= WINDOW
+        lengths[i] = len(k1)
+        opens[i, WINDOW - len(tail):] = tail[:, 1] # Right-aligned: column -1 is the latest candle
+        closes[i, WINDOW - len(tail):] = tail[:, 4]
+        volumes[i, WINDOW - len(tail):] = tail[:, 5]
+        has_data[i] = len(k1) >= 5
+        funding[i] = float(m.get('funding_rate', 'nan'))
+        oi_now[i] = float(m.get('open_interest', 'nan'))
+        if oi:
+            oi_oldest[i] = float(oi[-1]['oi']) # Pushed left: last is oldest
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        price_now = closes[:, -1]
+        pump_4h = (price_now - opens[:, -4]) / opens[:, -4] * 100
+        pump_1h = (price_now - opens[:, -1]) / opens[:, -1] * 100
+
+        avg_vol = volumes[:, :-1].mean(axis=1)
+        volume_ratio = np.where((lengths >= WINDOW) & (avg_vol > 0), volumes[:, -1] / avg_vol, np.nan)
+
+        delta = np.diff(closes[:, -(RSI_PERIOD + 1):], axis=1)
+        gain = np.where(delta > 0, delta, 0.0).mean(axis=1)
+        loss = np.where(delta < 0, -delta, 0.0).mean(axis=1)
+        rsi = np.where(loss > 0, 100 - 100 / (1 + gain / loss), np.where(gain > 0, 100.0, np.nan))
+        rsi[lengths < RSI_PERIOD + 1] = np.nan
+
+        oi_increase = np.where(oi_oldest > 0, (oi_now - oi_oldest) / oi_oldest * 100, np.nan)
+
+    features = {"pump_4h": pump_4h, "pump_1h": pump_1h, "volume_ratio": volume_ratio, "rsi": rsi,
+                "funding_rate": funding, "oi_increase": oi_increase}
+    for name in features:
+        features[name][~has_data] = np.nan
+    features["price"] = np.where(has_data, price_now, np.nan)
+    features["volume"] = np.where(has_data, volumes[:, -1], np.nan)
+    features["has_data"] = has_data
+    return features
+
+
+def feature_series(klines):
+    """compute_features for every candle of one symbol's 1h history ((n, 6) rows): row t sees candles up to t."""
+    a = np.asarray(klines, dtype=float).reshape(-1, 6)
+    n = len(a)
+    o, c, v = a[:, 1], a[:, 4], a[:, 5]
+    pump_4h, volume_ratio, rsi = (np.full(n, np.nan) for _ in range(3))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pump_4h[3:] = (c[3:] - o[:-3]) / o[:-3] * 100
+        pump_1h = (c - o) / o * 100
+
+        if n >= WINDOW:
+            avg_vol = sliding_window_view(v[:-1], WINDOW - 1).mean(axis=1) # 20 candles before t
+            volume_ratio[WINDOW - 1:] = np.where(avg_vol > 0, v[WINDOW - 1:] / avg_vol, np.nan)
+
+        if n > RSI_PERIOD:
+            delta = sliding_window_view(np.diff(c), RSI_PERIOD)
+            gain = np.where(delta > 0, delta, 0.0).mean(axis=1)
+            loss = np.where(delta < 0, -delta, 0.0).mean(axis=1)
+            rsi[RSI_PERIOD:] = np.where(loss > 0, 100 - 100 / (1 + gain / loss), np.where(gain > 0, 100.0, np.nan))
+
+    has_data = np.arange(n) >= 4 # 5 candles
+    features = {"pump_4h": pump_4h, "pump_1h": pump_1h, "volume_ratio": volume_ratio, "rsi": rsi}
+    for name in features:
+        features[name][~has_data] = np.nan
+    features["has_data"] = has_data
+    return features
+
+
+def feature_vector(features, i):
+    """Symbol i's rule values as written to scanner:features (engine/ml_model.py FEATURES)."""
+    return {rule.name: float(features[rule.name][i]) for rule in RULES}
+
+
+def evaluate(features, rules=RULES):
+    """(passed matrix [symbols x rules], distance matrix, candidate mask)."""
+    results = [rule.evaluate(features[rule.name]) for rule in rules]
+    passed = np.column_stack([p for p, _ in results])
+    distance = np.column_stack([d for _, d in results])
+    candidates = passed.all(axis=1) & features["has_data"]
+    return passed, distance, candidates
+
+
+def _num(v):
+    v = float(v)
+    return None if np.isnan(v) else round(v, 6)
+
+
+def explain(universe, symbol=None, top=None, rules=RULES):
+    """
+    Every symbol with each rule's value / threshold / pass / distance, nearest misses first
+    (fewest failed rules, then smallest normalized distance). `symbol` limits to one, `top` to the first N.
+    """
+    features = compute_features(universe)
+    passed, distance, candidates = evaluate(features, rules)
+    scales = np.array([r.scale for r in rules], dtype=float)
+    failed = (~passed).sum(axis=1)
+    gap = np.nansum(np.where(passed, 0.0, distance / scales), axis=1)
+    gap = np.where(features["has_data"], gap, np.inf)
+    order = np.lexsort((gap, failed))
+
+    symbols = universe["symbols"]
+    if symbol is not None:
+        wanted = symbol.replace('/', '').upper()
+        order = [i for i in order if symbols[i].replace('/', '').upper() == wanted]
+    elif top:
+        order = order[:top]
+
+    rows = []
+    for i in order:
+        rows.append({
+            "symbol": symbols[i],
+            "candidate": bool(candidates[i]),
+            "has_data": bool(features["has_data"][i]),
+            "failed": [r.name for j, r in enumerate(rules) if not passed[i, j]],
+            "gap": _num(gap[i]) if np.isfinite(gap[i]) else None,
+            "rules": {r.name: {"value": _num(features[r.name][i]), "threshold": r.threshold(),
+                               "pass": bool(passed[i, j]), "distance": _num(distance[i, j])}
+                      for j, r in enumerate(rules)},
+        })
+    return {
+        "btc_bullish": universe["btc_bullish"], # True: the whole scan is skipped
+        "symbols": len(symbols),
+        "candidates": int(candidates.sum()),
+        "pass_counts": {r.name: int(passed[:, j].sum()) for j, r in enumerate(rules)},
+        "rows": rows,
+    }
@@ -1,202 +1,75 @@
 import os
 import asyncio
 import json
+import time
+import argparse
 import redis.asyncio as redis
-import pandas as pd
 import numpy as np
 from dotenv import load_dotenv
 
+from common.streams import StreamQueue, CANDIDATES_STREAM, CANDIDATES_GROUP
+from common.kill_switch import KillSwitch
+from monitoring import metrics
+from scanner.rules import RULES, load_universe, compute_features, feature_vector, evaluate, explain
+
 load_dotenv()
 
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+SCAN_INTERVAL = int(os.getenv("SCAN_INTERVAL", 60 * 15)) # Scan every 15 Minutes
+
+SCAN_SECONDS = metrics.histogram("scanner_scan_seconds", "Full scan duration", buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120))
+SYMBOLS_SCANNED = metrics.counter("scanner_symbols_scanned_total", "Symbols evaluated")
+CANDIDATES_FOUND = metrics.counter("scanner_candidates_total", "Candidates pushed to the engine")
 
 class MarketScanner:
     def __init__(self):
         self.redis = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+        self.candidates = StreamQueue(self.redis, CANDIDATES_STREAM, CANDIDATES_GROUP)
+        self.kill_switch = KillSwitch(self.redis)
 
-    async def get_klines(self, symbol, timeframe):
-        key = f"klines:{symbol}:{timeframe}"
-        data = await self.redis.get(key)
-        if not data:
-            return None
-        return json.loads(data)
-
-    async def get_metrics(self, symbol):
-        key = f"metrics:{symbol}"
-        data = await self.redis.hgetall(key)
-        if not data:
-            return None
-        return data # Already a dict, no need to json.loads
-
-    async def get_oi_history(self, symbol):
-        key = f"oi_history:{symbol}"
-        data = await self.redis.lrange(key, 0, 5) # Get recent history
-        if not data:
-            return []
-        return [json.loads(x) for x in data]
-
-    def check_pump(self, df_4h, df_1h):
-        if df_4h.empty or df_1h.empty:
-            return False, 0, 0
-
-        # Current price
-        current_price = df_4h.iloc[-1]['close'] # Assuming close of last closed candle or current, depends on data
-        # Actually latest kline might be open. If collector fetches limit 100, last one is latest.
-        
-        # 4H pump: (High - Low_of_start) / Low_of_start? Or just Open vs Close?
-        # User: "pump 10-25% in 4H". This usually means current price vs price 4H ago.
-        # But 4H klines: 1 candle is 4H.
-        # Let's check the last closed 4H candle, or current if live?
-        # Safe bet: comparison over a minimal window.
-        # Let's say % change in the last candle or rolling 2.
-        
-        # Simpler: (Current - Open of 4h AGO) / Open of 4h AGO
-        # With 4H timeframe, looking at the last completed candle + current partial?
-        # Let's look at the % diff between current price and Open of the candle 4 hours ago (which is 2 candles ago if using 4H TF?)
-        # Let's simplify: look at the % change of the last *completed* 4H candle or the current candle if it's running?
-        # "pump 10-25% in 4H" -> Usually means the price rose that much in that timeframe.
-        # I'll compare Current Price vs Open of the candle at index -2 (previous) or similar.
-        # Actually, using 1H candles is more granular for a "4H pump".
-        # Let's use 1H candles for the 4H measurement to be precise.
-        # Last 4 1H candles.
-        
-        if len(df_1h) < 5:
-            return False, 0, 0
-            
-        price_now = df_1h.iloc[-1]['close']
-        price_4h_ago = df_1h.iloc[-4]['open']
-        price_1h_ago = df_1h.iloc[-1]['open'] # Last 1H candle start
-
-        pct_4h = (price_now - price_4h_ago) / price_4h_ago * 100
-        pct_1h = (price_now - price_1h_ago) / price_1h_ago * 100
-        
-        return True, pct_4h, pct_1h
-
-    def check_volume_spike(self, df_1h):
-        # Volume spike >= 3x last 20 candles average
-        if len(df_1h) < 21:
-            return False
-        
-        current_vol = df_1h.iloc[-1]['volume']
-        avg_vol = df_1h.iloc[-21:-1]['volume'].mean() # Average of previous 20, excluding current?
-        # Or if -1 is current partial, maybe -2 is better?
-        # Assuming -1 is the "spike" candle we are interested in.
-        
-        if avg_vol == 0: return False
-        return current_vol >= 3 * avg_vol
-
-    async def check_btc_trend(self):
-        # Fetch BTC 15m data
-        k = await self.redis.get("klines:BTC/USDT:USDT:15m")
-        if not k:
-            # Try without :USDT suffix if logic differs, but collector uses consistent naming
-            k = await self.redis.get("klines:BTC/USDT:15m")
-        
-        if not k: return False # Assume not bullish (safe to short) or True (unsafe)? 
-        # If no data, maybe safe to skip filter or block? Let's default to allowing trades but warning.
-        # Actually safer to block? User said "BTC 15m not strongly bullish".
-        # If we can't see BTC, we assume neutral.
-        
-        data = json.loads(k)
-        df = pd.DataFrame(data, columns=['time','open','high','low','close','volume'])
-        
-        if len(df) < 5: return False
-        
-        # Check if strongly bullish:
-        # 1. Last candle > 1% move?
-        last_open = df.iloc[-1]['open']
-        last_close = df.iloc[-1]['close']
-        change_pct = (last_close - last_open) / last_open * 100
-        
-        # 2. RSI check (simple manual calc or pandas)
-        # Simple momentum: close > SMA20 by 1%?
-        # Let's use simple % change for "Strongly Bullish"
-        
-        is_strongly_bullish = change_pct > 1.0 # 1% green candle in 15m is strong
-        
-        return is_strongly_bullish
-
-    def calculate_rsi(self, series, period=14):
-        delta = series.diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
-        rs = gain / loss
-        return 100 - (100 / (1 + rs))
+    async def explain(self, symbol=None, top=None):
+        """Every symbol against every filter (value, threshold, pass, distance), nearest misses first."""
+        universe = await load_universe(self.redis, [symbol.replace('/', '').upper()] if symbol else None)
+        return explain(universe, symbol=symbol, top=top)
 
     async def scan(self):
+        await self.kill_switch.start()
+        if self.kill_switch.active:
+            print("Kill switch active. Skipping scan.")
+            return
         print("Starting Scan...")
-        keys = await self.redis.keys("metrics:*")
-        symbols = [k.split(":")[1] for k in keys]
-        
-        candidates = []
-
-        # Check BTC Trend
-        # We want "Not Strongly Bullish". So if check_btc returns True (Bullish), we skip scan.
-        btc_bullish = await self.check_btc_trend()
-        if btc_bullish:
+        t0 = time.perf_counter()
+        try:
+            await self._scan()
+        finally:
+            SCAN_SECONDS.observe(time.perf_counter() - t0)
+
+    async def _scan(self):
+        # All symbols in one pipelined read, filters evaluated as arrays (scanner/rules.py)
+        universe = await load_universe(self.redis)
+
+        # We want "Not Strongly Bullish". So if BTC is strongly bullish, we skip the scan.
+        if universe["btc_bullish"]:
             print("BTC is strongly bullish. Skipping scan for shorts.")
             return
 
-        for symbol in symbols:
-            # Yield control to Event Loop (Prevents unresponsiveness/502s)
-            await asyncio.sleep(0)
-            
-            # Skip if symbol is BTC
-            if "BTC" in symbol and len(symbol) < 9: continue # Simple skip for BTC pairs if needed
-            
-            # Fetch data
-            klines_4h_raw = await self.get_klines(symbol, '4h')
-            klines_1h_raw = await self.get_klines(symbol, '1h')
-            metrics = await self.get_metrics(symbol)
-            oi_history = await self.get_oi_history(symbol)
+        columns = compute_features(universe)
+        _, _, passed = evaluate(columns)
+        SYMBOLS_SCANNED.inc(len(universe["symbols"]))
 
-            if not klines_4h_raw or not klines_1h_raw or not metrics:
-                continue
-
-            df_4h = pd.DataFrame(klines_4h_raw, columns=['time','open','high','low','close','volume'])
-            df_1h = pd.DataFrame(klines_1h_raw, columns=['time','open','high','low','close','volume'])
-
-            # Filters
-            has_data, pump_4h, pump_1h = self.check_pump(df_4h, df_1h)
-            
-            if not has_data: continue
-            
-            # 1. Pump Conditions (Updated Strategy)
-            # 4H: 10-25%
-            if not (10 <= pump_4h <= 25): continue
-            
-            # 1H: 8-15% (Re-enabled per V2 Strategy)
-            if not (8 <= pump_1h <= 15): continue
-            
-            # 2. Volume Spike
-            if not self.check_volume_spike(df_1h): continue
-            
-            # 2b. RSI Overextension (New)
-            # Need series of closes
-            rsi_series = self.calculate_rsi(df_1h['close'], 14)
-            current_rsi = rsi_series.iloc[-1]
-            if current_rsi < 70: continue # Must be overextended
-
-            # 3. Funding Positive (implies long bias we want to short)
-            if float(metrics['funding_rate']) <= 0: continue
-            
-            # 4. OI Increase >= 10%
-            # Compare current OI to oldest in our short history (implied ~1h+ ago if collector runs frequently)
-            current_oi = float(metrics['open_interest'])
-            # Finds oldest OI in the history list we kept
-            if not oi_history: continue
-            oldest_oi_entry = oi_history[-1] # List is pushed left, so last is oldest
-            oldest_oi = float(oldest_oi_entry['oi'])
-            
-            if oldest_oi == 0: continue
-            oi_increase = (current_oi - oldest_oi) / oldest_oi * 100
-            
-            if oi_increase < 10: continue
+        for i in np.flatnonzero(passed):
+            if self.kill_switch.active:
+                print("Kill switch activated mid-scan. Stopping.")
+                break
+            symbol = universe["symbols"][i]
+            pump_4h, pump_1h = columns["pump_4h"][i], columns["pump_1h"][i]
+            volume_ratio, current_rsi = columns["volume_ratio"][i], columns["rsi"][i]
+            funding_rate, oi_increase = columns["funding_rate"][i], columns["oi_increase"][i]
+            price_now, volume = columns["price"][i], columns["volume"][i]
 
             print(f"Candidate found: {symbol} (4H: {pump_4h:.1f}%, 1H: {pump_1h:.1f}%)")
-            candidates.append(symbol)
-            
+
             # --- DATA SHEET LOGGING (User Request) ---
             from datetime import datetime
             log_file = "candidates_log.csv"
@@ -205,29 +78,91 @@ class MarketScanner:
             # Create header if not exists
             if not os.path.exists(log_file):
                 with open(log_file, "w") as f:
-                    f.write("Timestamp,Symbol,Price,Pump_4h,Pump_1h,Volume,Funding,OI_Increase\n")
+                    f.write("Timestamp,Symbol,Price,Pump_4h,Pump_1h,Volume,Funding,OI_Increase,Volume_Ratio,RSI\n")
             
             # Append entry
             with open(log_file, "a") as f:
-                f.write(f"{timestamp},{symbol},{price_now},{pump_4h:.2f},{pump_1h:.2f},{df_1h.iloc[-1]['volume']},{metrics['funding_rate']},{oi_increase:.2f}\n")
+                f.write(f"{timestamp},{symbol},{price_now},{pump_4h:.2f},{pump_1h:.2f},{volume},{funding_rate},{oi_increase:.2f},{volume_ratio:.2f},{current_rsi:.2f}\n")
             # -----------------------------------------
 
-            # Push to Queue
-            if candidates:
-                await self.redis.lpush("scanner:candidates", *candidates)
-                print(f"Pushed {len(candidates)} candidates to queue.")
-                
-                # PIPELINE EVENT: Scanner Pass
-                for cand in candidates:
-                     event = {
-                         "timestamp": datetime.now().isoformat(),
-                         "stage": "scanner",
-                         "symbol": cand,
-                         "status": "pass",
-                         "details": "User Strategy (Pump > 10%)"
-                     }
-                     await self.redis.publish("pipeline_events", json.dumps(event))
+            # Feature vector for the engine's ML gate (engine/ml_model.py FEATURES)
+            features = {**feature_vector(columns, i), "timestamp": timestamp}
+            await self.redis.hset("scanner:features", symbol, json.dumps(features))
+
+            # Push to Queue (Stream: consumed by engine group with ACKs)
+            await self.candidates.push(symbol)
+            CANDIDATES_FOUND.inc()
+            print(f"Pushed {symbol} to candidate stream.")
+
+            # PIPELINE EVENT: Scanner Pass
+            event = {
+                "timestamp": datetime.now().isoformat(),
+                "stage": "scanner",
+                "symbol": symbol,
+                "status": "pass",
+                "details": "User Strategy (Pump > 10%)"
+            }
+            await self.redis.publish("pipeline_events", json.dumps(event))
+
+    async def run(self):
+        print("Scanner Loop Started")
+        while True:
+            try:
+                status = await self.redis.get("bot_status")
+                if status == "active":
+                    print("Running Scan...")
+                    await self.scan()
+                else:
+                    print("Scanner Idle (Bot Paused)")
+
+                await asyncio.sleep(SCAN_INTERVAL)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                print(f"Scanner Loop Error: {e}")
+                await asyncio.sleep(60)
+
+def print_explain(report):
+    print(f"{report['symbols']} symbols, {report['candidates']} candidates"
+          f"{' (BTC strongly bullish: scan skipped)' if report['btc_bullish'] else ''}")
+    print("Passing each rule: " + ", ".join(f"{name} {n}" for name, n in report['pass_counts'].items()))
+    print(f"{'symbol':<16}" + "".join(f"{r.name:>16}" for r in RULES) + "  failed")
+    for row in report['rows']:
+        cells = []
+        for r in RULES:
+            rule = row['rules'][r.name]
+            value = "-" if rule['value'] is None else f"{rule['value']:.4g}"
+            cells.append(f"{value + ('' if rule['pass'] else ' x'):>16}")
+        print(f"{row['symbol']:<16}" + "".join(cells) + f"  {', '.join(row['failed']) or 'CANDIDATE'}")
+
+
+async def main_explain(symbol, top, as_json):
+    scanner = MarketScanner()
+    try:
+        t0 = time.perf_counter()
+        report = await scanner.explain(symbol, top)
+        if as_json:
+            print(json.dumps(report, indent=2))
+        else:
+            print_explain(report)
+            print(f"({(time.perf_counter() - t0) * 1000:.1f} ms)")
+    finally:
+        await scanner.redis.close()
+
 
 if __name__ == "__main__":
-    scanner = MarketScanner()
-    asyncio.run(scanner.scan())
+    # python -m scanner.scanner                        one scan
+    # python -m scanner.scanner explain [--top 20] [--symbol LUNA2USDT] [--json]
+    parser = argparse.ArgumentParser(description="Market scanner")
+    sub = parser.add_subparsers(dest="command")
+    p_explain = sub.add_parser("explain", help="Why (not) a candidate: every filter for every symbol")
+    p_explain.add_argument("--symbol")
+    p_explain.add_argument("--top", type=int, default=20, help="Nearest misses to show (0 = all)")
+    p_explain.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    if args.command == "explain":
+        asyncio.run(main_explain(args.symbol, args.top or None, args.json))
+    else:
+        scanner = MarketScanner()
+        asyncio.run(scanner.scan())
@@ -0,0 +1,207 @@
+import os
+import sys
+import time
+import signal
+import asyncio
+import importlib
+import multiprocessing as mp
+import redis
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Process supervisor: every engine in its own OS process.
+# A CPU burst (pandas scan, chart render) or a blocking call in one engine no
+# longer stalls the API or order execution. Each async worker writes a
+# heartbeat to `worker:heartbeat:{name}` every WORKER_HEARTBEAT_INTERVAL s
+# (the API from its lifespan) and publishes its metrics (monitoring/metrics.py).
+# The supervisor restarts a worker that exits, or whose heartbeat is older than
+# WORKER_HEARTBEAT_TIMEOUT (hung event loop), with exponential backoff.
+#
+#   python supervisor.py                     # all workers (API on $PORT)
+#   SUPERVISOR_WORKERS=executor,collector python supervisor.py
+
+REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+PORT = int(os.getenv("PORT", "8080"))
+
+WORKER_HEARTBEAT_KEY = "worker:heartbeat:{}"
+WORKER_HEARTBEAT_INTERVAL = float(os.getenv("WORKER_HEARTBEAT_INTERVAL", 5))
+WORKER_HEARTBEAT_TIMEOUT = float(os.getenv("WORKER_HEARTBEAT_TIMEOUT", 60))
+RESTART_BACKOFF_MAX = float(os.getenv("RESTART_BACKOFF_MAX", 60))
+STABLE_AFTER = 60 # Seconds up before the backoff resets
+CHECK_INTERVAL = 1.0
+
+# name -> (module, class) for async engines with run() / optional close()
+ENGINES = {
+    "collector": ("collector.collector", "MarketCollector"),
+    "scanner": ("scanner.scanner", "MarketScanner"),
+    "engine": ("engine.decision", "DecisionEngine"),
+    "executor": ("execution.executor", "TradeExecutor"),
+}
+WORKER_NAMES = ["api", *ENGINES, "telegram"]
+SUPERVISOR_WORKERS = [w.strip() for w in os.getenv("SUPERVISOR_WORKERS", ",".join(WORKER_NAMES)).split(",") if w.strip()]
+
+
+# --- Worker side (child process) ---
+async def heartbeat_loop(redis_client, name, started_at):
+    key = WORKER_HEARTBEAT_KEY.format(name)
+    while True:
+        try:
+            await redis_client.hset(key, mapping={"pid": os.getpid(), "ts": time.time(), "started_at": started_at})
+            await redis_client.expire(key, int(WORKER_HEARTBEAT_TIMEOUT * 3))
+        except Exception as e:
+            print(f"[{name}] Heartbeat Error: {e}")
+        await asyncio.sleep(WORKER_HEARTBEAT_INTERVAL)
+
+
+async def run_engine(name):
+    import redis.asyncio as aioredis
+    from monitoring import metrics
+
+    module, cls = ENGINES[name]
+    engine = getattr(importlib.import_module(module), cls)()
+    redis_client = aioredis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+    main = asyncio.current_task()
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGTERM, main.cancel)
+
+    tasks = [
+        asyncio.create_task(heartbeat_loop(redis_client, name, time.time())),
+        asyncio.create_task(metrics.publish_loop(redis_client, name)),
+    ]
+    try:
+        await engine.run()
+    except asyncio.CancelledError:
+        print(f"[{name}] Stopping...")
+    finally:
+        for t in tasks:
+            t.cancel()
+        if hasattr(engine, "close"):
+            await engine.close()
+        await redis_client.close()
+
+
+async def run_telegram():
+    import redis.asyncio as aioredis
+    from monitoring.telegram_bot import start_telegram_bot
+
+    start_telegram_bot() # Daemon threads (notification listener + leader-elected polling)
+    redis_client = aioredis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+    await heartbeat_loop(redis_client, "telegram", time.time())
+
+
+def run_worker(name):
+    """Child process entry point."""
+    sys.stdout.reconfigure(line_buffering=True)
+    if name == "api":
+        # Thin front end: engines are the other workers
+        os.environ["RUN_ENGINES"] = "0"
+        import uvicorn
+        uvicorn.run("web_api.main:app", host="0.0.0.0", port=PORT)
+    elif name == "telegram":
+        asyncio.run(run_telegram())
+    else:
+        asyncio.run(run_engine(name))
+
+
+# --- Supervisor side ---
+class Worker:
+    def __init__(self, name):
+        self.name = name
+        self.process = None
+        self.started_at = 0.0
+        self.restarts = 0
+        self.backoff = 1.0
+        self.next_start = 0.0
+
+
+class Supervisor:
+    def __init__(self, names=SUPERVISOR_WORKERS):
+        unknown = set(names) - set(WORKER_NAMES)
+        if unknown:
+            raise ValueError(f"Unknown workers: {sorted(unknown)} (known: {WORKER_NAMES})")
+        self.ctx = mp.get_context("spawn") # Fresh interpreter: no inherited loop / threads / sockets
+        self.workers = [Worker(n) for n in names]
+        self.redis = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+        self.running = True
+
+    def start(self, worker):
+        worker.process = self.ctx.Process(target=run_worker, args=(worker.name,), name=f"bot-{worker.name}", daemon=False)
+        worker.process.start()
+        worker.started_at = time.time()
+        print(f"Supervisor: started {worker.name} (pid {worker.process.pid})")
+
+    def heartbeat_age(self, worker):
+        try:
+            ts = self.redis.hget(WORKER_HEARTBEAT_KEY.format(worker.name), "ts")
+        except redis.RedisError:
+            return None # Redis down: don't kill workers over it
+        reference = float(ts) if ts else worker.started_at
+        return time.time() - max(reference, worker.started_at)
+
+    def record_exit(self, worker, reason):
+        try:
+            self.redis.hset(WORKER_HEARTBEAT_KEY.format(worker.name), mapping={
+                "restarts": worker.restarts, "last_exit": reason, "last_exit_at": time.time()
+            })
+        except redis.RedisError:
+            pass
+
+    def schedule_restart(self, worker, reason):
+        if time.time() - worker.started_at > STABLE_AFTER:
+            worker.backoff = 1.0
+        worker.restarts += 1
+        worker.next_start = time.time() + worker.backoff
+        print(f"Supervisor: {worker.name} {reason}, restart #{worker.restarts} in {worker.backoff:.0f}s")
+        self.record_exit(worker, reason)
+        worker.backoff = min(worker.backoff * 2, RESTART_BACKOFF_MAX)
+        worker.process = None
+
+    def check(self, worker):
+        now = time.time()
+        if worker.process is None:
+            if now >= worker.next_start:
+                self.start(worker)
+            return
+        if not worker.process.is_alive():
+            self.schedule_restart(worker, f"exited with code {worker.process.exitcode}")
+            return
+        age = self.heartbeat_age(worker)
+        if age is not None and age > WORKER_HEARTBEAT_TIMEOUT:
+            print(f"Supervisor: {worker.name} heartbeat {age:.0f}s old, killing (pid {worker.process.pid})")
+            self.stop_process(worker.process)
+            self.schedule_restart(worker, f"hung ({age:.0f}s without heartbeat)")
+
+    @staticmethod
+    def stop_process(process, timeout=10):
+        process.terminate()
+        process.join(timeout)
+        if process.is_alive():
+            process.kill()
+            process.join()
+
+    def shutdown(self, *_):
+        self.running = False
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.shutdown)
+        signal.signal(signal.SIGINT, self.shutdown)
+        print(f"Supervisor: running {', '.join(w.name for w in self.workers)}")
+        while self.running:
+            for worker in self.workers:
+                self.check(worker)
+            time.sleep(CHECK_INTERVAL)
+
+        print("Supervisor: stopping workers...")
+        alive = [w.process for w in self.workers if w.process and w.process.is_alive()]
+        for p in alive:
+            p.terminate() # SIGTERM: engines close sessions / journal
+        for p in alive:
+            p.join(10)
+            if p.is_alive():
+                p.kill()
+
+
+if __name__ == "__main__":
+    Supervisor().run()
@@ -0,0 +1,122 @@
+import unittest
+import asyncio
+import os
+import sys
+import sqlite3
+import tempfile
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backtest.engine import Backtest, MemoryRedis, TF_MS
+from scanner.rules import load_universe, compute_features
+
+HOUR = TF_MS["1h"]
+T0 = 1_700_000_000_000 - 1_700_000_000_000 % (4 * HOUR)
+PUMP_AT = 60 # Hour index of the blow-off candle
+
+def hourly_path(pump):
+    """(open, high, low, close, volume) per hour: slow grind up, then (pump) +3% x3, a +10% blow-off and a dump."""
+    rows, price = [], 100.0
+    for h in range(120):
+        o = price
+        if pump and PUMP_AT - 3 <= h < PUMP_AT:
+            c, hi, lo, v = o * 1.03, o * 1.035, o, 100.0
+        elif pump and h == PUMP_AT:
+            c, hi, lo, v = o * 1.10, o * 1.25, o, 1000.0 # Long upper wick at the highs
+        elif pump and PUMP_AT < h <= PUMP_AT + 6:
+            c, hi, lo, v = o * 0.97, o * 1.001, o * 0.965, 300.0
+        else:
+            c, hi, lo, v = o * 1.002, o * 1.003, o * 0.999, 100.0
+        rows.append((o, hi, lo, c, v))
+        price = c
+    return rows
+
+def split(o, h, l, c, v, parts):
+    """Sub-candles walking open -> high -> low -> close."""
+    path = [o, h, l, c]
+    points = [path[min(int(i * 3 / parts), 3)] + (path[min(int(i * 3 / parts) + 1, 3)] - path[min(int(i * 3 / parts), 3)]) * ((i * 3 / parts) % 1)
+              for i in range(parts + 1)]
+    return [(points[i], max(points[i], points[i + 1]), min(points[i], points[i + 1]), points[i + 1], v / parts)
+            for i in range(parts)]
+
+def write_db(path, symbols):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE klines (symbol TEXT, timeframe TEXT, timestamp INTEGER, open REAL, high REAL, "
+                 "low REAL, close REAL, volume REAL, PRIMARY KEY (symbol, timeframe, timestamp))")
+    rows = []
+    for symbol, pump in symbols.items():
+        hours = hourly_path(pump)
+        for h, candle in enumerate(hours):
+            t = T0 + h * HOUR
+            rows.append((symbol, "1h", t, *candle))
+            for tf, parts in (("15m", 4), ("5m", 12)):
+                for j, sub in enumerate(split(*candle, parts)):
+                    rows.append((symbol, tf, t + j * TF_MS[tf], *sub))
+            if h % 4 == 0:
+                rows.append((symbol, "4h", t, *candle))
+    conn.executemany("INSERT INTO klines VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+class TestBacktest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = os.path.join(self.tmp.name, "klines.db")
+        write_db(self.db, {"PUMPUSDT": True, "FLATUSDT": False})
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def backtest(self, **kwargs):
+        bt = Backtest(db_path=self.db, start=T0 + 30 * HOUR, end=T0 + 110 * HOUR, ml_model=None, **kwargs)
+        self.addCleanup(bt.close)
+        return bt
+
+    def test_memory_redis_lists_and_pipeline(self):
+        async def scenario():
+            r = MemoryRedis()
+            await r.lpush("l", "a", "b", "c")
+            await r.ltrim("l", 0, 1)
+            await r.hset("h", mapping={"x": 1})
+            pipe = r.pipeline()
+            pipe.lrange("l", 0, -1)
+            pipe.hgetall("h")
+            pipe.strlen("missing")
+            return await pipe.execute()
+        self.assertEqual(asyncio.run(scenario()), [["c", "b"], {"x": "1"}, 0])
+
+    def test_array_universe_matches_redis_view(self):
+        bt = self.backtest()
+        bt.load()
+        now = T0 + (PUMP_AT + 1) * HOUR # Blow-off candle just closed
+        bt.advance(now)
+        fast = compute_features(bt.universe(now))
+
+        async def via_redis():
+            for symbol in bt.symbols:
+                await bt.publish_symbol(symbol, now)
+            return compute_features(await load_universe(bt.redis))
+        slow = asyncio.run(via_redis())
+        for name in ("pump_4h", "pump_1h", "volume_ratio", "rsi", "funding_rate", "oi_increase"):
+            self.assertTrue(((fast[name] == slow[name]) | (fast[name] != fast[name])).all(), name)
+        self.assertGreater(fast["pump_4h"][bt.symbols.index("PUMPUSDT")], 10)
+
+    def test_pump_is_shorted_and_taken_profit(self):
+        now = T0 + (PUMP_AT + 1) * HOUR
+        scores = {"PUMPUSDT": [[now - 60_000, 1.0, 0]]} # Recorded: strong reversal, no news
+        report = asyncio.run(self.backtest(scores=scores).run())
+        self.assertEqual(report["candidates"], 1)
+        self.assertEqual(report["signals"], 1)
+        ledger = report["ledger"]
+        self.assertEqual((ledger["closed"], ledger["wins"], ledger["open"]), (1, 1, 0))
+        self.assertGreater(ledger["pnl"], 0)
+        self.assertEqual(report["account"]["open_orders"], 0)
+
+    def test_without_scores_engine_uses_its_fallback(self):
+        # Local pattern score alone (news neutral) stays below the 0.75 final score
+        report = asyncio.run(self.backtest().run())
+        self.assertEqual((report["candidates"], report["signals"]), (1, 0))
+
+if __name__ == '__main__':
+    unittest.main()
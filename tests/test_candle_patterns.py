@@ -0,0 +1,55 @@
+import unittest
+import os
+import sys
+import numpy as np
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai.candle_patterns import local_pattern_score, score_batch
+
+def trend(n, start=100.0, step=1.0):
+    # Steady green candles [t, o, h, l, c, v]
+    return [[i, start + i * step, start + i * step + 1, start + i * step - 0.1, start + i * step + step, 1] for i in range(n)]
+
+class TestCandlePatterns(unittest.TestCase):
+    def test_blow_off_top_detected(self):
+        k_1h = trend(20) + [[20, 120, 135, 119, 121, 1]] # Long upper wick at the highs
+        k_15m = trend(6) + [[6, 106, 109, 105, 108, 1], [7, 108, 108.5, 104, 105, 1], # Prior swing high
+                            [8, 105, 112, 104.5, 111, 1], [9, 111, 120, 110, 118, 1], # Higher high
+                            [10, 116, 116.5, 112, 113, 1], [11, 113, 117, 112, 116, 1], # Lower high
+                            [12, 116, 116.5, 110, 111, 1], [13, 111, 112, 105, 106, 1]]
+        res = local_pattern_score(k_1h, k_15m)
+        self.assertTrue(res["reversal_detected"])
+        self.assertIn("blow-off-top", res["tags"])
+        self.assertIn("structure-break", res["tags"])
+
+    def test_pullback_without_lower_high_is_not_a_shift(self):
+        k_15m = trend(10) + [[10, 110, 120, 109, 119, 1], [11, 119, 118, 112, 113, 1],
+                             [12, 113, 116, 110, 111, 1], [13, 111, 112, 105, 106, 1]]
+        res = local_pattern_score(trend(20), k_15m)
+        self.assertEqual(res["confidence"]["structure-break"], 0.0)
+        self.assertEqual(res["pattern_score"], 0.0)
+
+    def test_clean_uptrend_scores_zero(self):
+        res = local_pattern_score(trend(20), trend(20))
+        self.assertEqual(res["pattern_score"], 0.0)
+        self.assertEqual(res["tags"], [])
+
+    def test_bearish_engulfing(self):
+        k_1h = trend(20) + [[20, 119, 123, 118.5, 122, 1], [21, 122.5, 123, 115, 115.5, 1]]
+        res = local_pattern_score(k_1h, trend(20))
+        self.assertGreater(res["confidence"]["bearish-engulfing"], 0.5)
+
+    def test_batch_matches_single(self):
+        rng = np.random.default_rng(1)
+        c = 100 + np.cumsum(rng.normal(0, 1, (50, 24)), axis=1)
+        o = np.roll(c, 1, axis=1)
+        h = np.maximum(o, c) + rng.random((50, 24))
+        l = np.minimum(o, c) - rng.random((50, 24))
+        scores, _ = score_batch((o, h, l, c), (o, h, l, c))
+        rows = np.stack([np.arange(24), o[7], h[7], l[7], c[7], np.ones(24)], axis=1).tolist()
+        self.assertAlmostEqual(local_pattern_score(rows, rows)["pattern_score"], round(float(scores[7]), 3))
+
+if __name__ == '__main__':
+    unittest.main()
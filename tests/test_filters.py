@@ -0,0 +1,58 @@
+import unittest
+import os
+import sys
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from execution.filters import ExchangeFilters, OrderFilterError, round_step
+from execution.executor import TradeExecutor
+
+EXCHANGE_INFO = {"symbols": [{
+    "symbol": "PEPEUSDT",
+    "filters": [
+        {"filterType": "PRICE_FILTER", "tickSize": "0.0000001", "minPrice": "0.0000001", "maxPrice": "200"},
+        {"filterType": "LOT_SIZE", "stepSize": "1", "minQty": "1", "maxQty": "800000000"},
+        {"filterType": "MARKET_LOT_SIZE", "stepSize": "1", "minQty": "1", "maxQty": "80000000"},
+        {"filterType": "MIN_NOTIONAL", "notional": "5"}
+    ]
+}]}
+
+class TestExchangeFilters(unittest.TestCase):
+    def setUp(self):
+        self.filters = ExchangeFilters()
+        self.filters.parse(EXCHANGE_INFO)
+
+    def test_round_step_vectorized(self):
+        self.assertEqual(list(round_step([0.123456, 0.1299999999], 0.01, "floor")), [0.12, 0.13])
+        self.assertEqual(list(round_step([0.121, 0.12], 0.01, "ceil")), [0.13, 0.12])
+
+    def test_format_uses_filter_precision(self):
+        self.assertEqual(self.filters.format_price("PEPEUSDT", 0.0000123456), "0.0000123")
+        self.assertEqual(self.filters.format_qty("PEPEUSDT", 1234.0), "1234")
+
+    def test_check_qty(self):
+        with self.assertRaises(OrderFilterError):
+            self.filters.check_qty("PEPEUSDT", 100, 0.00001) # $0.001 notional
+        with self.assertRaises(OrderFilterError):
+            self.filters.check_qty("PEPEUSDT", 90000000, 0.00001, market=True)
+        self.filters.check_qty("PEPEUSDT", 1000000, 0.00001, market=True)
+
+    def test_executor_order_plan(self):
+        executor = TradeExecutor.__new__(TradeExecutor)
+        executor.filters = self.filters
+        o = executor.apply_filters("PEPEUSDT", "SELL", 1000001.7, 0.00001234567, 0.0000118, 0.0000109, 0.0000121)
+        self.assertEqual(o["qty_str"], "1000001")
+        self.assertEqual(o["sl_str"], "0.0000124") # Short SL rounds up
+        self.assertEqual(o["tp1_qty"] + o["tp2_qty"], o["qty"]) # TP2 takes the exact remainder
+
+    def test_missing_filters_refuse_unless_offline(self):
+        executor = TradeExecutor.__new__(TradeExecutor)
+        executor.filters = self.filters
+        with self.assertRaises(OrderFilterError):
+            executor.apply_filters("NEWUSDT", "SELL", 0.1234567, 1.05, 0.98, 0.92, 1.0)
+        executor.filters = ExchangeFilters(unrounded=True) # Backtest / paper simulator opt-in
+        self.assertEqual(executor.apply_filters("NEWUSDT", "SELL", 0.5, 1.05, 0.98, 0.92, 1.0)["qty_str"], "0.5")
+
+if __name__ == '__main__':
+    unittest.main()
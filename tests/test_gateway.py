@@ -0,0 +1,123 @@
+import unittest
+import asyncio
+import os
+import sys
+from unittest import mock
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai import gateway
+from ai.gateway import CircuitBreaker, RateBudget, ModelGateway, CircuitOpenError, BudgetExceededError, StubProviderError
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class FailingModel:
+    async def generate_content_async(self, contents):
+        raise StubProviderError("503 unavailable")
+
+class HangingModel:
+    async def generate_content_async(self, contents):
+        await asyncio.sleep(3600)
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_state_machine(self):
+        clock = Clock()
+        with mock.patch.object(gateway.time, "monotonic", clock):
+            b = CircuitBreaker(threshold=2, reset_timeout=30)
+            self.assertEqual(b.allow(), "call")
+            b.record_failure()
+            self.assertEqual(b.state, "closed")
+            b.record_failure()
+            self.assertEqual(b.state, "open")
+            self.assertIsNone(b.allow())
+
+            clock.now += 30
+            self.assertEqual(b.state, "half_open")
+            self.assertEqual(b.allow(), "probe")
+            self.assertIsNone(b.allow()) # Exactly one probe
+            b.record_failure() # Probe failed: open again for a full reset_timeout
+            b.end_trial()
+            self.assertEqual(b.state, "open")
+
+            clock.now += 30
+            self.assertEqual(b.allow(), "probe")
+            b.record_success()
+            b.end_trial()
+            self.assertEqual((b.state, b.failures), ("closed", 0))
+
+    def test_cancelled_probe_releases_the_trial(self):
+        gw = ModelGateway(max_retries=0, timeout=3600)
+        slot = gw.register("m", HangingModel())
+        slot.breaker = CircuitBreaker(threshold=1, reset_timeout=30)
+        slot.breaker.record_failure()
+        slot.breaker.opened_at -= 30 # Half open (no patched clock: the event loop reads time.monotonic too)
+
+        async def scenario():
+            probe = asyncio.create_task(gw.generate("m", "prompt"))
+            await asyncio.sleep(0.01)
+            in_flight = slot.breaker.trial_in_flight
+            probe.cancel() # Caller timeout / shutdown
+            try:
+                await probe
+            except asyncio.CancelledError:
+                return in_flight, True
+            return in_flight, False
+        in_flight, cancelled = asyncio.run(scenario())
+        self.assertTrue(in_flight)
+        self.assertTrue(cancelled)
+        self.assertFalse(slot.breaker.trial_in_flight)
+        self.assertEqual(slot.breaker.allow(), "probe") # Not stuck open
+
+    def test_failures_open_the_circuit(self):
+        async def scenario():
+            gw = ModelGateway(max_retries=0)
+            slot = gw.register("m", FailingModel())
+            slot.breaker = CircuitBreaker(threshold=2, reset_timeout=60)
+            for _ in range(2):
+                with self.assertRaises(gateway.ModelGatewayError):
+                    await gw.generate("m", "prompt")
+            with self.assertRaises(CircuitOpenError):
+                await gw.generate("m", "prompt")
+            return slot.stats
+        stats = asyncio.run(scenario())
+        self.assertEqual((stats["errors"], stats["rejected"]), (2, 1))
+
+class TestRateBudget(unittest.TestCase):
+    def test_window_limits_and_expiry(self):
+        clock = Clock()
+        with mock.patch.object(gateway.time, "monotonic", clock):
+            budget = RateBudget(rpm=2, tpm=100)
+            async def scenario():
+                await budget.acquire(10)
+                await budget.acquire(10)
+                with self.assertRaises(BudgetExceededError): # Third request: 60s away
+                    await budget.acquire(10, max_wait=5)
+                with self.assertRaises(BudgetExceededError): # Larger than the whole budget
+                    await budget.acquire(500, max_wait=3600)
+                clock.now += 60
+                await budget.acquire(10)
+            asyncio.run(scenario())
+            self.assertEqual((len(budget.window), budget.tokens_in_window), (1, 10))
+
+    def test_waiter_does_not_block_callers_that_fit(self):
+        async def scenario():
+            budget = RateBudget(rpm=100, tpm=100)
+            await budget.acquire(60)
+            big = asyncio.create_task(budget.acquire(60, max_wait=120)) # Waits for the first to expire
+            await asyncio.sleep(0.01)
+            small = await asyncio.wait_for(budget.acquire(30), timeout=1) # Fits now
+            done = big.done()
+            big.cancel()
+            return small, done
+        small, big_done = asyncio.run(scenario())
+        self.assertEqual(small[1], 30)
+        self.assertFalse(big_done)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import unittest
+import os
+import sys
+import re
+import asyncio
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from execution.journal import OrderJournal, client_order_id
+from execution.executor import TradeExecutor, BASE_URL
+from execution.accounts import load_accounts
+from execution.filters import ExchangeFilters
+from execution.ledger import TradeLedger
+from execution.paper_exchange import PaperExchange
+from common.kill_switch import KillSwitch
+from backtest.engine import MemoryRedis
+
+BINANCE_CLIENT_ID = re.compile(r"^[.A-Z:/a-z0-9_-]{1,36}$")
+LEGS = ("entry", "sl", "tp1", "tp2", "flat")
+
+class TestClientOrderId(unittest.TestCase):
+    def test_short_ids_unchanged(self):
+        self.assertEqual(client_order_id("1718000000000-0", "sl"), "eb-1718000000000-0-sl")
+        self.assertEqual(client_order_id("1718000000000-0:acct2", "tp1"), "eb-1718000000000-0:acct2-tp1")
+
+    def test_long_account_names_keep_the_leg(self):
+        for name in ("subaccount-long", "a-very-long-subaccount-name-indeed"):
+            signal_id = f"1718000000000-12:{name}"
+            ids = [client_order_id(signal_id, leg) for leg in LEGS]
+            self.assertEqual(len(set(ids)), len(LEGS), ids)
+            for leg, cid in zip(LEGS, ids):
+                self.assertTrue(BINANCE_CLIENT_ID.match(cid), cid)
+                self.assertTrue(cid.endswith(f"-{leg}"), cid)
+            # Deterministic (recovery rebuilds it) and distinct per account
+            self.assertEqual(ids[0], client_order_id(signal_id, "entry"))
+            self.assertNotEqual(ids[0], client_order_id(f"1718000000000-12:{name}x", "entry"))
+
+EXCHANGE_INFO = {"symbols": [{"symbol": "XUSDT", "filters": [
+    {"filterType": "PRICE_FILTER", "tickSize": "0.01"},
+    {"filterType": "LOT_SIZE", "stepSize": "0.001", "minQty": "0.001", "maxQty": "1000000"},
+]}]}
+
+SIGNAL = {"symbol": "XUSDT", "side": "sell", "amount": 10, "entry_price": 100.0,
+          "params": {"stop_loss": 105.0, "take_profit_1": 98.0, "take_profit_2": 92.0}}
+
+class TestRedeliveryDedupe(unittest.TestCase):
+    """Two executor replicas on one exchange: each has its own local journal and ledger."""
+
+    def setUp(self):
+        self.redis = MemoryRedis()
+        self.paper = PaperExchange()
+        self.accounts = load_accounts(BASE_URL, paper=self.paper)
+
+    def replica(self):
+        executor = TradeExecutor.__new__(TradeExecutor)
+        executor.redis = self.redis
+        executor.paper = self.paper
+        executor.accounts = self.accounts
+        executor.primary = self.accounts[0]
+        executor.filters = ExchangeFilters()
+        executor.filters.parse(EXCHANGE_INFO)
+        executor.journal = OrderJournal(":memory:")
+        executor.ledger = TradeLedger(":memory:")
+        executor.kill_switch = KillSwitch(self.redis)
+        self.addCleanup(executor.journal.close)
+        self.addCleanup(executor.ledger.close)
+        return executor
+
+    def position(self):
+        return sum(float(p["positionAmt"]) for p in self.paper.position_risk(self.accounts[0].name, "XUSDT"))
+
+    def test_reclaimed_entry_already_on_exchange_is_not_resent(self):
+        asyncio.run(self.replica().execute_trade(dict(SIGNAL), "1-0"))
+        self.assertEqual(self.position(), -10)
+
+        other = self.replica() # Reclaims the un-ACKed stream entry, no journal rows for it
+        asyncio.run(other.execute_trade(dict(SIGNAL), "1-0", redelivered=True))
+        self.assertEqual(self.position(), -10)
+        entries = [o for o in self.paper.closed.values() if o["client_id"] == client_order_id("1-0", "entry")]
+        self.assertEqual(len(entries), 1) # A second MARKET fill would be flattened by the rejected SL, not avoided
+        self.assertTrue(other.journal.is_done("1-0"))
+
+    def test_local_plan_without_done_recovers(self):
+        executor = self.replica()
+        executor.journal.plan("2-0", "XUSDT", {"entry": {"newClientOrderId": client_order_id("2-0", "entry")}})
+        asyncio.run(executor.execute_trade(dict(SIGNAL), "2-0"))
+        self.assertEqual(self.position(), 0) # Entry never sent: aborted, not re-entered
+        self.assertTrue(executor.journal.is_done("2-0"))
+
+    def test_lost_batch_response_does_not_resend_placed_legs(self):
+        executor = self.replica()
+        send_batch = executor.place_batch
+        async def lost_response(orders, account=None):
+            await send_batch(orders, account) # Legs land, the response never arrives
+            raise ConnectionError("batch response lost")
+        executor.place_batch = lost_response
+
+        asyncio.run(executor.execute_trade(dict(SIGNAL), "3-0"))
+        self.assertEqual(self.position(), -10) # Protected, not flattened
+        open_ids = sorted(o["client_id"] for o in self.paper.orders.values())
+        self.assertEqual(open_ids, sorted(client_order_id("3-0", leg) for leg in ("sl", "tp1", "tp2")))
+        self.assertTrue(executor.journal.is_done("3-0"))
+
+    def test_missing_filters_load_on_demand_or_refuse(self):
+        executor = self.replica()
+        executor.filters = ExchangeFilters() # Start-up exchangeInfo load failed
+        loads = []
+        async def exchange_info_down(session, base_url):
+            loads.append(base_url)
+            raise ConnectionError("exchangeInfo unavailable")
+        executor.filters.load = exchange_info_down
+        async def no_session():
+            return None
+        executor.get_session = no_session
+        asyncio.run(executor.execute_trade(dict(SIGNAL), "4-0"))
+        self.assertEqual(len(loads), 1)
+        self.assertEqual((self.position(), self.paper.closed, self.paper.orders), (0, {}, {})) # Nothing sent
+
+        async def exchange_info(session, base_url):
+            executor.filters.parse(EXCHANGE_INFO)
+        executor.filters.load = exchange_info
+        asyncio.run(executor.execute_trade(dict(SIGNAL), "5-0"))
+        self.assertEqual(self.position(), -10)
+
+if __name__ == '__main__':
+    unittest.main()
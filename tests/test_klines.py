@@ -0,0 +1,85 @@
+import unittest
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web_api.klines import KlineStore, lttb, minmax_ohlc
+
+def make_rows(n, spike_at=None):
+    rows = []
+    for i in range(n):
+        close = 100.0 + (i % 10) * 0.1
+        if i == spike_at:
+            close = 150.0
+        rows.append((1_700_000_000_000 + i * 300_000, close - 0.05, close + 0.2, close - 0.3, close, 1.0))
+    return rows
+
+class TestDownsampling(unittest.TestCase):
+    def test_lttb_keeps_endpoints_and_spikes(self):
+        rows = make_rows(1000, spike_at=437)
+        out = lttb(rows, 50)
+        self.assertEqual(len(out), 50)
+        self.assertEqual(out[0], list(rows[0]))
+        self.assertEqual(out[-1], list(rows[-1]))
+        self.assertIn(list(rows[437]), out) # Original candle, not an average
+        self.assertEqual([r[0] for r in out], sorted(r[0] for r in out))
+        self.assertEqual(lttb(rows[:10], 50), [list(r) for r in rows[:10]]) # Nothing to reduce
+
+    def test_minmax_preserves_extremes_and_volume(self):
+        rows = make_rows(1000, spike_at=437)
+        out = minmax_ohlc(rows, 64)
+        self.assertEqual(len(out), 64)
+        self.assertEqual(max(r[2] for r in out), max(r[2] for r in rows))
+        self.assertEqual(min(r[3] for r in out), min(r[3] for r in rows))
+        self.assertAlmostEqual(sum(r[5] for r in out), 1000.0)
+        self.assertEqual(out[0][:2], [rows[0][0], rows[0][1]]) # First open
+        self.assertEqual(out[-1][4], rows[-1][4]) # Last close
+
+class TestKlineStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "klines.db")
+        conn = sqlite3.connect(self.path)
+        conn.execute("CREATE TABLE klines (symbol TEXT, timeframe TEXT, timestamp INTEGER, open REAL, high REAL, "
+                     "low REAL, close REAL, volume REAL, PRIMARY KEY (symbol, timeframe, timestamp))")
+        conn.executemany("INSERT INTO klines VALUES ('BTCUSDT', '5m', ?, ?, ?, ?, ?, ?)", make_rows(3000))
+        conn.commit()
+        conn.close()
+        self.store = KlineStore(self.path, pool_size=2)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def test_range_downsample_and_read_only(self):
+        start = 1_700_000_000_000
+        rows, downsampled = self.store.query("BTCUSDT", "5m", start, start + 100 * 300_000, 800, "ohlc")
+        self.assertEqual((len(rows), downsampled), (100, False))
+        rows, downsampled = self.store.query("BTCUSDT", "5m", start, start + 3000 * 300_000, 500, "lttb")
+        self.assertEqual((len(rows), downsampled), (500, True))
+        with self.store.pool.connection() as conn:
+            with self.assertRaises(sqlite3.OperationalError):
+                conn.execute("DELETE FROM klines")
+
+    def test_streamed_full_resolution(self):
+        from web_api import klines
+        old = klines.KLINES_STREAM_ROWS
+        klines.KLINES_STREAM_ROWS = 1000
+        try:
+            resp = asyncio.run(self.store.response(None, "BTC/USDT", "5m", 1_700_000_000_000, 1_800_000_000_000, points=0))
+            body = "".join(self.store.stream({"symbol": "BTCUSDT"}, "BTCUSDT", "5m", 1_700_000_000_000, 1_800_000_000_000))
+        finally:
+            klines.KLINES_STREAM_ROWS = old
+        self.assertEqual(type(resp).__name__, "StreamingResponse")
+        data = json.loads(body)
+        self.assertEqual(len(data["candles"]), 3000)
+        self.assertEqual(data["candles"][0][0], 1_700_000_000_000)
+
+if __name__ == '__main__':
+    unittest.main()
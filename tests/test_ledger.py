@@ -0,0 +1,67 @@
+import unittest
+import os
+import sys
+import tempfile
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from execution.ledger import TradeLedger, ledger_stats, ledger_stats_page, ledger_trades
+
+DAY = 1_700_000_000 # 2023-11-14 UTC
+
+class TestTradeLedger(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.ledger = TradeLedger(os.path.join(self.tmp.name, "ledger.db"))
+
+    def tearDown(self):
+        self.ledger.close()
+        self.tmp.cleanup()
+
+    def test_fills_settle_trade_and_aggregates(self):
+        lg = self.ledger
+        self.assertTrue(lg.open("s1", "main", "BTCUSDT", "sell", 2.0, 100.0, sl=105.0, ts=DAY))
+        self.assertFalse(lg.open("s1", "main", "BTCUSDT", "sell", 2.0, 100.0, sl=105.0, ts=DAY)) # Redelivery
+        lg.fill("main", "BTCUSDT", "SELL", 2.0, 101.0, fee=0.1, ts=DAY)
+        self.assertIsNone(lg.fill("main", "BTCUSDT", "BUY", 1.0, 96.0, realized=5.0, fee=0.05, ts=DAY + 60))
+        closed = lg.fill("main", "BTCUSDT", "BUY", 1.0, 91.0, realized=10.0, fee=0.05, ts=DAY + 120)
+        self.assertAlmostEqual(closed["net_pnl"], 14.8)
+        self.assertAlmostEqual(closed["r_multiple"], 14.8 / (4.0 * 2.0)) # Risk from the real fill price
+
+        lg.open("s2", "main", "ETHUSDT", "SELL", 1.0, 50.0, sl=51.0, ts=DAY + 200)
+        lg.fill("main", "ETHUSDT", "SELL", 1.0, 50.0, ts=DAY + 200)
+        lg.fill("main", "ETHUSDT", "BUY", 1.0, 51.0, realized=-1.0, ts=DAY + 300)
+        lg.open("s3", "main", "ETHUSDT", "SELL", 1.0, 50.0, sl=51.0, ts=DAY + 400)
+        self.assertTrue(lg.void_unfilled("s3", "main")) # Entry rejected
+
+        s = ledger_stats(lg.conn)
+        self.assertEqual((s["opened"], s["closed"], s["wins"], s["losses"], s["open"]), (2, 2, 1, 1, 0))
+        self.assertAlmostEqual(s["pnl"], 13.8)
+        self.assertEqual(s["win_rate"], 0.5)
+        self.assertAlmostEqual(s["avg_r"], (14.8 / 8.0 - 1.0) / 2)
+        self.assertAlmostEqual(ledger_stats(lg.conn, "symbol", "ETHUSDT")["pnl"], -1.0)
+        days = ledger_stats_page(lg.conn, "day")
+        self.assertEqual((days["total"], days["items"][0]["key"]), (1, "2023-11-14"))
+        self.assertEqual([r["key"] for r in ledger_stats_page(lg.conn, "symbol", sort="pnl")["items"]], ["BTCUSDT", "ETHUSDT"])
+
+    def test_reconcile_and_pagination(self):
+        lg = self.ledger
+        for i in range(5):
+            lg.open(f"s{i}", "main", "BTCUSDT" if i % 2 else "SOLUSDT", "SELL", 1.0, 10.0, sl=11.0, ts=DAY + i)
+        lg.fill("main", "SOLUSDT", "SELL", 1.0, 10.0, ts=DAY) # s0 filled, then its stream went quiet
+        closed = lg.reconcile("main", live_symbols={"BTCUSDT"}, now=DAY + 3600)
+        self.assertEqual([c["symbol"] for c in closed], ["SOLUSDT"])
+        statuses = {t["signal_id"]: t["status"] for t in ledger_trades(lg.conn, limit=10)["items"]}
+        self.assertEqual(statuses, {"s0": "closed", "s1": "open", "s2": "void", "s3": "open", "s4": "void"})
+
+        page1 = ledger_trades(lg.conn, limit=2)
+        page2 = ledger_trades(lg.conn, limit=2, before=page1["next"])
+        page3 = ledger_trades(lg.conn, limit=2, before=page2["next"])
+        ids = [t["signal_id"] for p in (page1, page2, page3) for t in p["items"]]
+        self.assertEqual(ids, ["s4", "s3", "s2", "s1", "s0"])
+        self.assertIsNone(page3["next"])
+        self.assertEqual([t["signal_id"] for t in ledger_trades(lg.conn, symbol="BTCUSDT")["items"]], ["s3", "s1"])
+
+if __name__ == '__main__':
+    unittest.main()
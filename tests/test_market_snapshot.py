@@ -0,0 +1,57 @@
+import unittest
+import asyncio
+import gzip
+import json
+import os
+import sys
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from starlette.requests import Request
+from common.market_snapshot import build_snapshot
+from web_api.snapshot import SnapshotCache
+
+def make_request(**headers):
+    raw = [(k.replace('_', '-').encode(), v.encode()) for k, v in headers.items()]
+    return Request({"type": "http", "method": "GET", "path": "/insights/heatmap", "headers": raw})
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+class TestMarketSnapshot(unittest.TestCase):
+    def test_build_snapshot(self):
+        market = {"ETHUSDT": {"price": 3000.0, "change_4h": 1.234},
+                  "BTCUSDT": {"price": 95000.0, "change_24h": -2.345, "change_4h": 9.0}}
+        data = json.loads(build_snapshot(market))
+        self.assertEqual([d["symbol"] for d in data], ["BTCUSDT", "ETHUSDT"])
+        self.assertEqual(data[0]["value"], -2.35) # Stream change preferred
+        self.assertEqual(data[1]["value"], 1.23)
+
+    def test_cache_etag_and_gzip(self):
+        r = FakeRedis()
+        cache = SnapshotCache(r, key="snap", version_key="snap:v")
+        r.data.update({"snap": build_snapshot({"XUSDT": {"price": 1.0, "change_24h": 5.0}}), "snap:v": "1"})
+        self.assertTrue(asyncio.run(cache.refresh()))
+        self.assertFalse(asyncio.run(cache.refresh())) # Same version: body not refetched
+
+        resp = cache.response(make_request(accept_encoding="gzip, br"))
+        self.assertEqual(resp.headers["content-encoding"], "gzip")
+        self.assertEqual(json.loads(gzip.decompress(resp.body))[0]["symbol"], "XUSDT")
+        self.assertEqual(resp.headers["etag"], cache.etag_gzip)
+        self.assertNotEqual(cache.etag_gzip, cache.etag) # Different representation, different ETag
+        # The identity ETag does not validate the gzip variant (and vice versa)
+        self.assertEqual(cache.response(make_request(accept_encoding="gzip", if_none_match=cache.etag)).status_code, 200)
+        self.assertEqual(cache.response(make_request(accept_encoding="gzip", if_none_match=cache.etag_gzip)).status_code, 304)
+        self.assertEqual(cache.response(make_request(if_none_match=cache.etag_gzip)).status_code, 200)
+
+        resp = cache.response(make_request(if_none_match=cache.etag))
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp.body, b"")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+import os
+import sys
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from monitoring.metrics import Registry, render, with_worker
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_histogram_exposition(self):
+        h = self.registry.histogram("op_seconds", "Op latency", ["op"], buckets=(0.1, 1))
+        child = h.labels("scan")
+        for v in (0.05, 0.1, 0.5, 3):
+            child.observe(v)
+        text = render(self.registry.collect())
+        self.assertIn('# TYPE op_seconds histogram', text)
+        self.assertIn('op_seconds_bucket{op="scan",le="0.1"} 2', text) # le is inclusive
+        self.assertIn('op_seconds_bucket{op="scan",le="1.0"} 3', text)
+        self.assertIn('op_seconds_bucket{op="scan",le="+Inf"} 4', text)
+        self.assertIn('op_seconds_count{op="scan"} 4', text)
+        self.assertEqual(child.quantile(0.5), 0.1)
+
+    def test_counters_gauges_and_workers(self):
+        c = self.registry.counter("events_total", "Events", ["kind"])
+        g = self.registry.gauge("depth", 'Queue "depth"')
+        c.labels("a").inc()
+        c.labels("a").inc(2)
+        g.set(7)
+        self.assertIs(self.registry.counter("events_total", "Events", ["kind"]), c)
+        with self.assertRaises(ValueError):
+            self.registry.gauge("events_total", "Events", ["kind"])
+
+        families = with_worker(self.registry.collect(), "api") + with_worker(self.registry.collect(), "executor")
+        text = render(families)
+        self.assertEqual(text.count("# TYPE events_total counter"), 1) # Merged across workers
+        self.assertIn('events_total{kind="a",worker="executor"} 3.0', text)
+        self.assertIn('# HELP depth Queue \\"depth\\"', text)
+        self.assertIn('depth{worker="api"} 7', text)
+
+if __name__ == '__main__':
+    unittest.main()
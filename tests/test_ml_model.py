@@ -0,0 +1,77 @@
+import unittest
+import os
+import sys
+import json
+import math
+import tempfile
+import argparse
+from unittest import mock
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine.ml_model import CandidateModel, FEATURES
+from engine import train_model
+
+SPEC = {
+    "version": "20240101_000000",
+    "features": FEATURES,
+    "mean": [5.0, 1.0, 2.0, 60.0, 0.0001, 10.0],
+    "scale": [2.0, 0.5, 1.0, 10.0, 0.0001, 5.0],
+    "coef": [0.8, 0.2, 0.5, 0.6, -0.3, 0.1],
+    "intercept": -0.4,
+}
+
+class TestCandidateModel(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_save_load_score_round_trip(self):
+        path = os.path.join(self.tmp.name, "models", "candidate_model.json")
+        CandidateModel(SPEC).save(path)
+        model = CandidateModel.load(path)
+        self.assertEqual(model.version, SPEC["version"])
+
+        feats = {"pump_4h": 9.0, "pump_1h": 2.0, "volume_ratio": 3.0, "rsi": 80.0, "funding_rate": 0.0003, "oi_increase": 10.0}
+        z = SPEC["intercept"] + sum(w * (feats[f] - mu) / sd for f, mu, sd, w in
+                                    zip(FEATURES, SPEC["mean"], SPEC["scale"], SPEC["coef"]))
+        self.assertAlmostEqual(model.score(feats), 1 / (1 + math.exp(-z)))
+
+        # Missing / NaN features score at the training mean
+        self.assertAlmostEqual(model.score({"rsi": float("nan")}), 1 / (1 + math.exp(-SPEC["intercept"])))
+        self.assertIsNone(CandidateModel.load(os.path.join(self.tmp.name, "missing.json")))
+
+    def test_promote_validates_before_replacing(self):
+        live = os.path.join(self.tmp.name, "live", "candidate_model.json")
+        good = os.path.join(self.tmp.name, "candidate_model_good.json")
+        bad = os.path.join(self.tmp.name, "candidate_model_bad.json")
+        CandidateModel(SPEC).save(good)
+        with open(bad, "w") as f:
+            json.dump({"version": "broken"}, f)
+
+        with mock.patch.object(train_model, "ML_MODEL_PATH", live):
+            train_model.cmd_promote(argparse.Namespace(path=good))
+            with self.assertRaises(KeyError):
+                train_model.cmd_promote(argparse.Namespace(path=bad))
+        self.assertEqual(CandidateModel.load(live).version, SPEC["version"]) # Still the good one
+
+class TestLoadCandidates(unittest.TestCase):
+    def test_legacy_header_with_newer_rows(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "candidates_log.csv")
+            with open(path, "w") as f:
+                f.write("Timestamp,Symbol,Price,Pump_4h,Pump_1h,Volume,Funding,OI_Increase\n") # Before Volume_Ratio/RSI
+                f.write("2024-01-01T01:00:00,ETHUSDT,50.0,11.0,2.5,3000000,0.0004,18.0\n")
+                f.write("2024-01-01T02:00:00,BTCUSDT,100.0,12.0,3.0,5000000,0.0005,20.0,4.5,81.0\n")
+            df = train_model.load_candidates(path)
+
+        self.assertEqual(list(df["symbol"]), ["ETHUSDT", "BTCUSDT"])
+        old, new = df.iloc[0], df.iloc[1]
+        self.assertEqual((old["pump_4h"], old["oi_increase"]), (11.0, 18.0))
+        self.assertTrue(math.isnan(old["volume_ratio"]) and math.isnan(old["rsi"]))
+        self.assertEqual((new["volume_ratio"], new["rsi"]), (4.5, 81.0))
+        self.assertLess(old["ts_ms"], new["ts_ms"])
+
+if __name__ == '__main__':
+    unittest.main()
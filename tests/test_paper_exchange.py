@@ -0,0 +1,89 @@
+import unittest
+import asyncio
+import json
+import os
+import sys
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from execution.paper_exchange import PaperExchange, TriggerBook
+
+def short_plan(symbol="XUSDT"):
+    # Same legs TradeExecutor.execute_trade sends
+    entry = {'symbol': symbol, 'side': 'SELL', 'type': 'MARKET', 'quantity': '10', 'newClientOrderId': 'eb-1-0-entry'}
+    legs = [
+        {'symbol': symbol, 'side': 'BUY', 'type': 'STOP_MARKET', 'stopPrice': '105', 'quantity': '10', 'reduceOnly': 'true'},
+        {'symbol': symbol, 'side': 'BUY', 'type': 'LIMIT', 'price': '98', 'quantity': '5', 'timeInForce': 'GTC', 'reduceOnly': 'true'},
+        {'symbol': symbol, 'side': 'BUY', 'type': 'LIMIT', 'price': '92', 'quantity': '5', 'timeInForce': 'GTC', 'reduceOnly': 'true'},
+    ]
+    return entry, legs
+
+class TestPaperExchange(unittest.TestCase):
+    def setUp(self):
+        self.ex = PaperExchange(start_balance=1000, taker_fee=0.001, maker_fee=0.0, slippage_bps=0)
+        self.events = []
+        async def listener(event):
+            self.events.append(event)
+        self.ex.add_listener(listener)
+
+    def run_async(self, coro):
+        return asyncio.run(coro)
+
+    def open_short(self):
+        entry, legs = short_plan()
+        self.ex.prices["XUSDT"] = 100.0
+        order = self.run_async(self.ex.request('POST', '/fapi/v1/order', dict(entry)))
+        res = self.run_async(self.ex.request('POST', '/fapi/v1/batchOrders', {'batchOrders': json.dumps(legs)}))
+        return order, res
+
+    def test_entry_and_partial_take_profits(self):
+        order, res = self.open_short()
+        self.assertEqual(order['status'], 'FILLED')
+        self.assertTrue(all(r['status'] == 'NEW' for r in res))
+        self.assertAlmostEqual(self.ex.account().balance, 1000 - 1.0) # Taker fee on 1000 notional
+
+        self.run_async(self.ex.on_tick("XUSDT", 97.5)) # TP1 (maker, at limit price)
+        acct = self.ex.account()
+        self.assertEqual(acct.positions["XUSDT"]['amount'], -5)
+        self.assertAlmostEqual(acct.realized_pnl, 5 * (100 - 98))
+
+        self.run_async(self.ex.on_tick("XUSDT", 91)) # TP2 closes; SL expires with the position
+        self.assertNotIn("XUSDT", acct.positions)
+        self.assertEqual(len(self.ex.orders), 0)
+        self.assertAlmostEqual(acct.realized_pnl, 10 + 40)
+        statuses = [e['o']['X'] for e in self.events if e['e'] == 'ORDER_TRADE_UPDATE']
+        self.assertEqual(statuses.count('FILLED'), 3)
+        self.assertEqual(statuses[-1], 'EXPIRED')
+
+    def test_stop_gap_fills_at_tick_price(self):
+        self.open_short()
+        self.run_async(self.ex.on_tick("XUSDT", 110)) # Gapped through the 105 stop
+        acct = self.ex.account()
+        self.assertNotIn("XUSDT", acct.positions)
+        self.assertAlmostEqual(acct.realized_pnl, -100)
+        self.assertEqual(len(self.ex.orders), 0)
+
+    def test_errors_and_lookups(self):
+        self.ex.prices["XUSDT"] = 100.0
+        with self.assertRaises(Exception) as ctx: # Nothing to reduce
+            self.run_async(self.ex.request('POST', '/fapi/v1/order', short_plan()[1][0]))
+        self.assertIn("-2022", str(ctx.exception))
+        with self.assertRaises(Exception) as ctx:
+            self.run_async(self.ex.request('GET', '/fapi/v1/order', {'symbol': 'XUSDT', 'origClientOrderId': 'nope'}))
+        self.assertIn("-2013", str(ctx.exception))
+        self.open_short()
+        found = self.run_async(self.ex.request('GET', '/fapi/v1/order', {'symbol': 'XUSDT', 'origClientOrderId': 'eb-1-0-entry'}))
+        self.assertEqual(float(found['executedQty']), 10)
+
+    def test_trigger_book_many_orders(self):
+        book = TriggerBook()
+        for i in range(5000):
+            book.add(i, 100 + (i % 50) * 0.1, "up" if i % 2 else "down")
+        fired = book.pop_triggered(102.0)
+        self.assertEqual(len(fired) + len(book), 5000)
+        self.assertTrue(all(level > 102.0 for level in book.up_levels))
+        self.assertTrue(all(level < 102.0 for level in book.down_levels))
+
+if __name__ == '__main__':
+    unittest.main()
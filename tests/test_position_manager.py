@@ -0,0 +1,57 @@
+import unittest
+import os
+import sys
+from unittest import mock
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from execution import position_manager as pm
+from execution.position_manager import evaluate_stop
+
+NOW = 1_700_000_000.0
+
+def short_position(**overrides):
+    pos = {'amount': -10.0, 'entry_price': 100.0, 'stop': 101.5, 'best': 100.0,
+           'tp1_done': False, 'opened_at': NOW - 3600, 'amended_at': 0.0}
+    pos.update(overrides)
+    return pos
+
+class TestEvaluateStop(unittest.TestCase):
+    def test_no_action_before_activation(self):
+        pos = short_position()
+        self.assertIsNone(evaluate_stop(pos, 99.0, NOW))
+        self.assertEqual(pos['best'], 99.0)
+
+    def test_trailing_stop_follows_best_price(self):
+        pos = short_position()
+        kind, stop = evaluate_stop(pos, 95.0, NOW)
+        self.assertEqual(kind, 'amend')
+        self.assertAlmostEqual(stop, 95.0 * (1 + pm.TRAIL_DISTANCE_PCT / 100))
+
+        # Only tightens, and only by more than the minimum step
+        pos['stop'], pos['amended_at'] = stop, NOW
+        self.assertIsNone(evaluate_stop(pos, 96.0, NOW + 10))
+        self.assertIsNone(evaluate_stop(pos, 94.99, NOW + 10))
+
+    def test_breakeven_after_tp1(self):
+        pos = short_position(tp1_done=True)
+        kind, stop = evaluate_stop(pos, 99.5, NOW)
+        self.assertEqual(kind, 'amend')
+        self.assertAlmostEqual(stop, 100.0 * (1 - pm.BREAKEVEN_OFFSET_PCT / 100))
+        # Price above the breakeven level: placing it would trigger at once
+        self.assertIsNone(evaluate_stop(short_position(tp1_done=True), 100.5, NOW))
+
+    @mock.patch.object(pm, "TIME_STOP_HOURS", 0)
+    def test_time_stop_disabled(self):
+        self.assertIsNone(evaluate_stop(short_position(opened_at=NOW - 30 * 86400), 100.0, NOW))
+
+    @mock.patch.object(pm, "TIME_STOP_HOURS", 24)
+    def test_time_stop_and_cooldown(self):
+        old = short_position(opened_at=NOW - pm.TIME_STOP_HOURS * 3600 - 1)
+        self.assertEqual(evaluate_stop(old, 100.0, NOW), ('close', 'time stop'))
+        old['amended_at'] = NOW
+        self.assertIsNone(evaluate_stop(old, 100.0, NOW + 0.5))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+import os
+import sys
+import json
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scanner.rules import RULES, Rule, WINDOW, tail_candles, compute_features, evaluate, explain
+
+def candles(closes, last_volume=1000.0):
+    """1h candles opening at the previous close, volume 100 except the last one."""
+    rows = []
+    for i, c in enumerate(closes):
+        o = closes[i - 1] if i else c
+        rows.append([i * 3600000, o, max(o, c), min(o, c), c, last_volume if i == len(closes) - 1 else 100.0])
+    return rows
+
+def universe(entries, btc_bullish=False):
+    return {
+        "symbols": [e[0] for e in entries],
+        "btc_bullish": btc_bullish,
+        "klines_1h": [e[1] for e in entries],
+        "has_4h": [True] * len(entries),
+        "metrics": [e[2] for e in entries],
+        "oi_history": [[{"oi": 100.0}] * 6] * len(entries),
+    }
+
+# Slow climb then a ~20% pump over the last 4 candles, the last one +10%
+PUMP = [100 + i * 0.5 for i in range(WINDOW - 4)]
+PUMP += [PUMP[-1] * 1.03, PUMP[-1] * 1.06, PUMP[-1] * 1.09, PUMP[-1] * 1.09 * 1.10]
+
+class TestScannerRules(unittest.TestCase):
+    def test_tail_candles(self):
+        rows = candles([float(i + 1) for i in range(50)])
+        raw = json.dumps(rows)
+        self.assertEqual(tail_candles(raw), rows[-WINDOW:])
+        self.assertEqual(tail_candles(json.dumps(rows[:3])), rows[:3]) # Fewer than WINDOW
+
+    def test_candidate_and_failures(self):
+        u = universe([
+            ("HOTUSDT", candles(PUMP), {"funding_rate": "0.0005", "open_interest": "120"}),
+            ("NEGUSDT", candles(PUMP), {"funding_rate": "-0.0001", "open_interest": "120"}),
+            ("FLATUSDT", candles([10.0] * WINDOW), {"funding_rate": "0.0001", "open_interest": "100"}),
+            ("NEWUSDT", candles([10.0, 11.0]), {"funding_rate": "0.0001", "open_interest": "100"}),
+        ])
+        features = compute_features(u)
+        _, _, candidates = evaluate(features)
+        self.assertEqual(list(candidates), [True, False, False, False])
+        self.assertAlmostEqual(features["oi_increase"][0], 20.0)
+        self.assertAlmostEqual(features["volume_ratio"][0], 10.0)
+
+        report = explain(u)
+        self.assertEqual(report["candidates"], 1)
+        self.assertEqual([r["symbol"] for r in report["rows"]], ["HOTUSDT", "NEGUSDT", "FLATUSDT", "NEWUSDT"])
+        neg = report["rows"][1]
+        self.assertEqual(neg["failed"], ["funding_rate"])
+        self.assertAlmostEqual(neg["rules"]["funding_rate"]["distance"], 0.0001)
+        flat = explain(u, symbol="FLAT/USDT")["rows"]
+        self.assertEqual(len(flat), 1)
+        self.assertIsNone(flat[0]["rules"]["rsi"]["value"]) # Flat series: no RSI, fails
+        self.assertFalse(report["rows"][3]["has_data"])
+        self.assertIsNone(report["rows"][3]["gap"])
+        self.assertEqual(len(explain(u, top=2)["rows"]), 2)
+
+    def test_custom_rules(self):
+        u = universe([("HOTUSDT", candles(PUMP), {"funding_rate": "-0.0001", "open_interest": "120"})])
+        loose = [Rule("funding_rate", lo=-0.001, scale=0.0001) if r.name == "funding_rate" else r for r in RULES]
+        self.assertEqual(explain(u)["candidates"], 0)
+        self.assertEqual(explain(u, rules=loose)["candidates"], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import unittest
+import asyncio
+import os
+import sys
+import time
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai.score_cache import ScoreCache
+
+class FakeRedis:
+    """Shared tier: GET / SET ex / TTL / HINCRBY, with its own clock for expiry."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.data = {} # key -> (expires_at, value)
+        self.hashes = {}
+        self.reads = 0
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    def _live(self, key):
+        entry = self.data.get(key)
+        if entry and entry[0] <= self.now:
+            del self.data[key]
+            return None
+        return entry
+
+    async def get(self, key):
+        self.reads += 1
+        entry = self._live(key)
+        return entry[1] if entry else None
+
+    async def ttl(self, key):
+        entry = self._live(key)
+        return int(entry[0] - self.now) if entry else -2
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = (self.now + ex, value)
+
+    async def hincrby(self, name, field, n):
+        h = self.hashes.setdefault(name, {})
+        h[field] = h.get(field, 0) + n
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def get(self, key):
+        self.calls.append(self.redis.get(key))
+
+    def ttl(self, key):
+        self.calls.append(self.redis.ttl(key))
+
+    def hincrby(self, *args):
+        self.calls.append(self.redis.hincrby(*args))
+
+    async def execute(self):
+        return [await c for c in self.calls]
+
+class TestScoreCache(unittest.TestCase):
+    def test_local_lru_evicts_to_redis(self):
+        r = FakeRedis()
+        cache = ScoreCache(r, "pattern", ttl=60, local_size=2)
+        keys = [cache.key("BTCUSDT", i) for i in range(3)]
+
+        async def scenario():
+            for i, key in enumerate(keys):
+                await cache.set(key, {"pattern_score": i})
+            local = list(cache.local)
+            hot = await cache.get(keys[2]) # Local hit, no round trip
+            reads_after_hot = r.reads
+            cold = await cache.get(keys[0]) # Evicted locally, still shared
+            return local, hot, reads_after_hot, cold
+        local, hot, reads_after_hot, cold = asyncio.run(scenario())
+
+        self.assertEqual(local, keys[1:])
+        self.assertEqual((hot, reads_after_hot), ({"pattern_score": 2}, 0))
+        self.assertEqual((cold, r.reads), ({"pattern_score": 0}, 1))
+        self.assertEqual(list(cache.local), [keys[2], keys[0]]) # Refetched key is most recent, keys[1] evicted
+
+    def test_ttl_follows_redis(self):
+        r = FakeRedis()
+        writer = ScoreCache(r, "pattern", ttl=60)
+        reader = ScoreCache(r, "pattern", ttl=60) # Another replica, empty local tier
+        key = writer.key("ETHUSDT", "candles")
+
+        async def scenario():
+            await writer.set(key, {"pattern_score": 0.7})
+            r.now += 50
+            shared = await reader.get(key)
+            expires_at = reader.local[key][0]
+            reader.local[key] = (time.time() - 1, shared) # Local copy lapses with the shared one
+            writer.local.clear()
+            r.now += 10
+            return shared, expires_at, await reader.get(key), await writer.get(key)
+        shared, expires_at, reader_after, writer_after = asyncio.run(scenario())
+
+        self.assertEqual(shared, {"pattern_score": 0.7})
+        self.assertLessEqual(expires_at, time.time() + 10) # Remaining TTL, not a fresh 60s
+        self.assertIsNone(reader_after)
+        self.assertIsNone(writer_after)
+        self.assertNotIn(key, reader.local)
+
+    def test_hit_miss_counters_flushed_to_redis(self):
+        r = FakeRedis()
+        cache = ScoreCache(r, "news", ttl=60)
+        key = cache.key("headlines")
+
+        async def scenario():
+            await cache.get(key) # Miss, first record flushes at once
+            await cache.set(key, {"sentiment": 0.1})
+            await cache.get(key)
+            await cache.get(key) # Batched until the next flush
+            flushed_early = dict(r.hashes["ai_cache:stats"])
+            cache._last_flush = 0.0
+            await cache.get(cache.key("other")) # Miss, flushes the batch
+            return flushed_early
+        flushed_early = asyncio.run(scenario())
+
+        self.assertEqual(flushed_early, {"news:miss": 1})
+        self.assertEqual(r.hashes["ai_cache:stats"], {"news:miss": 2, "news:hit": 2})
+        self.assertEqual(cache.stats()["hit_rate"], 0.5)
+
+if __name__ == '__main__':
+    unittest.main()
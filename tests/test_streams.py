@@ -0,0 +1,76 @@
+import unittest
+import asyncio
+import os
+import sys
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.streams import StreamQueue, dead_stream
+
+class FakeStreams:
+    """Pending entries list of one consumer group: XAUTOCLAIM, XPENDING (range), XADD, XACK."""
+
+    def __init__(self, entries):
+        self.entries = dict(entries) # id -> fields
+        self.deliveries = {entry_id: 1 for entry_id in self.entries} # Already read once
+        self.added = []
+        self.acked = []
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    async def xautoclaim(self, stream, group, consumer, min_idle_time, start_id="0-0", count=10):
+        claimed = []
+        for entry_id in sorted(self.deliveries)[:count]:
+            self.deliveries[entry_id] += 1
+            claimed.append((entry_id, self.entries.get(entry_id)))
+        return ["0-0", claimed, []]
+
+    async def xpending_range(self, stream, group, min, max, count):
+        return [{"message_id": i, "times_delivered": n} for i, n in self.deliveries.items() if min <= i <= max][:count]
+
+    async def xadd(self, stream, fields, maxlen=None, approximate=True):
+        self.added.append((stream, fields))
+        return f"{len(self.added)}-0"
+
+    async def xack(self, stream, group, entry_id):
+        self.acked.append(entry_id)
+        self.deliveries.pop(entry_id, None)
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def xpending_range(self, *args, **kwargs):
+        self.calls.append(self.redis.xpending_range(*args, **kwargs))
+
+    async def execute(self):
+        return [await c for c in self.calls]
+
+class TestStreamQueue(unittest.TestCase):
+    def test_reclaim_dead_letters_after_max_deliveries(self):
+        r = FakeStreams({"1-0": {"data": "BADUSDT"}, "2-0": {"data": "OKUSDT"}})
+        q = StreamQueue(r, "scanner:candidates", "engine", consumer="c1", max_deliveries=3)
+        r.deliveries["2-0"] = -10 # Far from the limit
+
+        async def scenario():
+            return [await q.reclaim() for _ in range(3)]
+        rounds = asyncio.run(scenario())
+        # Deliveries 2 and 3 are retries; the 4th claim moves it to the dead stream
+        self.assertEqual(rounds[0], [("1-0", "BADUSDT"), ("2-0", "OKUSDT")])
+        self.assertEqual(rounds[1], [("1-0", "BADUSDT"), ("2-0", "OKUSDT")])
+        self.assertEqual(rounds[2], [("2-0", "OKUSDT")])
+        self.assertEqual(r.acked, ["1-0"])
+        self.assertEqual(r.added, [(dead_stream("scanner:candidates"),
+                                    {"data": "BADUSDT", "source_id": "1-0", "deliveries": 4})])
+
+    def test_reclaim_skips_trimmed_entries(self):
+        r = FakeStreams({"1-0": None})
+        q = StreamQueue(r, "execution:orders", "executor", consumer="c1")
+        self.assertEqual(asyncio.run(q.reclaim()), [])
+        self.assertEqual(r.added, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import unittest
+import os
+import sys
+import sqlite3
+import tempfile
+import numpy as np
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backtest.sweep import PARAMS, STATS, LIVE_PARAMS, evaluate_set, objective, run_sweep
+from backtest.engine import HOUR_MS
+from scanner.rules import WINDOW, feature_series, compute_features
+
+T0 = 1_700_000_000_000 - 1_700_000_000_000 % (4 * HOUR_MS)
+
+def klines(closes, volumes):
+    rows = []
+    for i, (c, v) in enumerate(zip(closes, volumes)):
+        o = closes[i - 1] if i else c
+        rows.append([T0 + i * HOUR_MS, o, max(o, c) * 1.001, min(o, c) * 0.999, c, v])
+    return rows
+
+def pump_closes(n, at):
+    """Noisy grind, +3% x3 and a +10% blow-off ending at `at`, then a 3%/h dump."""
+    rng = np.random.default_rng(at)
+    closes, price = [], 100.0
+    for h in range(n):
+        if at - 3 <= h < at:
+            price *= 1.03
+        elif h == at:
+            price *= 1.10
+        elif at < h <= at + 6:
+            price *= 0.97
+        else:
+            price *= 1 + rng.normal(0.001, 0.004)
+        closes.append(price)
+    return closes
+
+def event(symbol, hour, up, down, high_ratio=1.0, last_close=1.0, fold=0):
+    return {"symbol": symbol, "time": T0 + hour * HOUR_MS, "pump_4h": 20.0, "pump_1h": 10.0, "volume_ratio": 5.0,
+            "rsi": 90.0, "high_ratio": high_ratio, "up": up, "down": down, "last_close": last_close, "fold": fold}
+
+def table(events):
+    return {name: np.array([e[name] for e in events]) for name in events[0]}
+
+class TestSweep(unittest.TestCase):
+    def test_feature_series_matches_compute_features(self):
+        rows = klines(pump_closes(60, 40), [100.0 + (i % 7) * 10 for i in range(60)])
+        series = feature_series(rows)
+        for t in range(len(rows)):
+            u = {"symbols": ["X"], "btc_bullish": False, "klines_1h": [rows[max(0, t + 1 - WINDOW):t + 1]],
+                 "has_4h": [True], "metrics": [{"funding_rate": "0.0001"}], "oi_history": [[]]}
+            one = compute_features(u)
+            self.assertEqual(bool(series["has_data"][t]), bool(one["has_data"][0]), t)
+            for name in ("pump_4h", "pump_1h", "volume_ratio", "rsi"):
+                a, b = series[name][t], one[name][0]
+                self.assertTrue((a == b) or (a != a and b != b), (name, t, a, b))
+
+    def test_evaluate_set_outcomes(self):
+        ev = table([
+            event(0, 10, up=[0.005, 0.01, 0.01], down=[0.01, 0.06, 0.12]), # TP1 then TP2
+            event(1, 10, up=[0.03, 0.03, 0.03], down=[0.0, 0.07, 0.12]), # Stopped first candle
+            event(0, 11, up=[0.0, 0.0, 0.0], down=[0.2, 0.2, 0.2]), # Symbol 0 still in its trade
+            event(2, 10, up=[0.03, 0.03, 0.03], down=[0.06, 0.06, 0.06], fold=1), # TP1 and SL same candle
+        ])
+        params = [10, 100, 5, 50, 3, 80, 2.0, 5.0, 10.0] # sl 2% over the high, TP 5% / 10%
+        stats = evaluate_set(params, ev, folds=2, taker=0.0, maker=0.0, slippage=0.0)
+        self.assertEqual(stats.shape, (3, len(STATS)))
+        n, wins, sum_r = stats[2, :3]
+        self.assertEqual((n, wins), (3, 1))
+        # 1 - (0.95 + 0.90) / 2 = 0.075 profit over 0.02 risk; stops lose 1R each
+        self.assertAlmostEqual(sum_r, 3.75 - 1 - 1)
+        self.assertEqual(stats[0, 0], 2)
+        self.assertEqual(stats[1, 0], 1)
+        self.assertAlmostEqual(stats[2, 6], 2.0) # Max drawdown in R
+
+        # Fees and slippage only ever cost
+        costed = evaluate_set(params, ev, folds=2)
+        self.assertLess(costed[2, 2], sum_r)
+        # A stricter 1h bound filters every event out
+        self.assertEqual(evaluate_set([10, 100, 20, 50, 3, 80, 2.0, 5.0, 10.0], ev, folds=2).sum(), 0)
+
+    def test_objective_min_trades(self):
+        stats = np.array([[10, 6, 5.0, 9.0, 8.0, 3.0, 1.0], [2, 2, 4.0, 8.0, 4.0, 0.0, 0.0]])
+        self.assertEqual(objective(stats, "avg_r", min_trades=5).tolist(), [0.5, -np.inf])
+        self.assertEqual(objective(stats, "total_r").tolist(), [5.0, 4.0])
+        self.assertEqual(objective(stats, "profit_factor")[1], np.inf)
+
+    def test_run_sweep_end_to_end(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db = os.path.join(tmp, "klines.db")
+            conn = sqlite3.connect(db)
+            conn.execute("CREATE TABLE klines (symbol TEXT, timeframe TEXT, timestamp INTEGER, open REAL, high REAL, "
+                         "low REAL, close REAL, volume REAL, PRIMARY KEY (symbol, timeframe, timestamp))")
+            for s in range(4):
+                pumps = [80 + s * 10 + k * 100 for k in range(4)] # Four pumps per symbol, one per fold
+                closes = pump_closes(480, pumps[0])
+                for at in pumps[1:]:
+                    closes[at - 3:] = [c * f for c, f in zip(closes[at - 3:], np.array(pump_closes(480 - at + 3, 3)) / 100)]
+                volumes = [1000.0 if h in pumps else 100.0 for h in range(480)]
+                conn.executemany("INSERT INTO klines VALUES (?, '1h', ?, ?, ?, ?, ?, ?)",
+                                 [(f"P{s}USDT", *row) for row in klines(closes, volumes)])
+            conn.commit()
+            conn.close()
+
+            report = run_sweep(db_path=db, samples=300, folds=4, min_trades=4, workers=2, top=5)
+        self.assertEqual(report["symbols"], 4)
+        self.assertEqual(report["sets"], 301)
+        self.assertGreater(report["events"], 0)
+        self.assertEqual(report["live"]["params"], LIVE_PARAMS)
+        best = report["ranked"][0]
+        self.assertEqual(set(best["params"]), set(PARAMS))
+        self.assertGreaterEqual(best["trades"], 4)
+        self.assertGreater(best["total_r"], 0) # Every pump dumps 3%/h
+        self.assertEqual([f["fold"] for f in report["walk_forward"]["folds"]], [1, 2, 3])
+
+if __name__ == '__main__':
+    unittest.main()
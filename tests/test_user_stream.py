@@ -0,0 +1,97 @@
+import unittest
+import asyncio
+import os
+import sys
+import json
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from execution import user_stream
+from execution.user_stream import AccountState, UserDataStream
+from execution.executor import TradeExecutor, BASE_URL
+from execution.accounts import load_accounts
+from execution.filters import ExchangeFilters
+from execution.journal import OrderJournal
+from execution.ledger import TradeLedger
+from execution.paper_exchange import PaperExchange
+from common.kill_switch import KillSwitch
+from backtest.engine import MemoryRedis
+
+ACCOUNT_UPDATE = {"e": "ACCOUNT_UPDATE", "E": 1, "a": {
+    "B": [{"a": "USDT", "wb": "1000", "cw": "1000"}],
+    "P": [{"s": "XUSDT", "pa": "-10", "ep": "100", "up": "0"}],
+}}
+
+class TestMarkPnl(unittest.TestCase):
+    def test_mark_reprices_positions(self):
+        state = AccountState()
+        state.apply(ACCOUNT_UPDATE)
+        self.assertTrue(state.mark("XUSDT", 95.0))
+        self.assertAlmostEqual(state.pnl(), 50.0) # Short 10 from 100 to 95
+        self.assertFalse(state.mark("YUSDT", 1.0)) # No position
+
+    def test_mark_ticks_publish_between_fills(self):
+        async def scenario():
+            r = MemoryRedis()
+            stream = UserDataStream(executor=None, redis_client=r, base_url="")
+            await stream.handle_event(ACCOUNT_UPDATE)
+            for mark in (99.0, 98.0, 97.0): # One coalesced publish
+                stream.on_mark("XUSDT", mark)
+            await asyncio.sleep(user_stream.USER_STREAM_PNL_INTERVAL * 2)
+            return stream.mark_pending, await r.hgetall("account:balance"), await r.hget("account:positions", "XUSDT")
+
+        pending, balance, position = asyncio.run(scenario())
+        self.assertFalse(pending)
+        self.assertAlmostEqual(float(balance["pnl"]), 30.0)
+        self.assertAlmostEqual(json.loads(position)["unrealized_pnl"], 30.0)
+
+ACCOUNTS = json.dumps([{"name": "main", "api_key": "k1", "secret_key": "s1"},
+                       {"name": "sub1", "api_key": "k2", "secret_key": "s2", "multiplier": 0.5}])
+SIGNAL = {"symbol": "XUSDT", "side": "sell", "amount": 10, "entry_price": 100.0,
+          "params": {"stop_loss": 105.0, "take_profit_1": 98.0, "take_profit_2": 92.0}}
+
+class TestPerAccountStreams(unittest.TestCase):
+    def executor(self, paper=None):
+        executor = TradeExecutor.__new__(TradeExecutor)
+        executor.redis = MemoryRedis()
+        executor.paper = paper
+        executor.accounts = load_accounts(BASE_URL, paper=paper, config=ACCOUNTS)
+        executor.primary = executor.accounts[0]
+        executor.filters = ExchangeFilters(unrounded=True)
+        executor.journal = OrderJournal(":memory:")
+        executor.ledger = TradeLedger(":memory:")
+        executor.kill_switch = KillSwitch(executor.redis)
+        executor.build_streams()
+        self.addCleanup(executor.journal.close)
+        self.addCleanup(executor.ledger.close)
+        return executor
+
+    def test_fan_out_is_managed_on_every_account(self):
+        executor = self.executor(PaperExchange())
+        async def scenario():
+            await executor.start_streams()
+            await executor.execute_trade(dict(SIGNAL), "1-0")
+            return (await executor.redis.hget("account:positions", "XUSDT"),
+                    await executor.redis.hget("account:sub1:positions", "XUSDT"))
+        main_pos, sub_pos = asyncio.run(scenario())
+
+        self.assertEqual(executor.position_managers["main"].positions["XUSDT"]["amount"], -10)
+        self.assertEqual(executor.position_managers["sub1"].positions["XUSDT"]["amount"], -5)
+        self.assertIsNotNone(executor.position_managers["sub1"].positions["XUSDT"]["stop"]) # Its own SL order
+        self.assertEqual((json.loads(main_pos)["amount"], json.loads(sub_pos)["amount"]), (-10, -5))
+
+    def test_snapshot_reconciles_its_own_account(self):
+        executor = self.executor()
+        for n, name in enumerate(("main", "sub1")):
+            executor.ledger.open(f"{n}-0", name, "XUSDT", "SELL", 10, 100.0, ts=1.0)
+            executor.ledger.fill(name, "XUSDT", "SELL", 10, 100.0, ts=1.0)
+            executor.user_streams[name].state.positions["XUSDT"] = {"amount": -10.0, "entry_price": 100.0, "unrealized_pnl": 0.0}
+        del executor.user_streams["sub1"].state.positions["XUSDT"] # Closed while sub1's stream was down
+
+        asyncio.run(executor.on_ledger_event({"e": "SNAPSHOT", "E": 2000, "account": "sub1"}))
+        status = dict(executor.ledger.conn.execute("SELECT account, status FROM trades").fetchall())
+        self.assertEqual(status, {"main": "open", "sub1": "closed"})
+
+if __name__ == '__main__':
+    unittest.main()
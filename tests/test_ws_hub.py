@@ -0,0 +1,125 @@
+import unittest
+import asyncio
+import json
+import os
+import sys
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web_api.ws_hub import WebSocketHub
+from web_api.coalescer import FrameCoalescer
+
+class FakeSocket:
+    def __init__(self, stalled=False):
+        self.stalled = stalled
+        self.sent = []
+        self.closed = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        if self.stalled:
+            await asyncio.sleep(3600)
+        self.sent.append(data)
+
+    async def close(self, code=1000):
+        self.closed = code
+
+class TestWebSocketHub(unittest.TestCase):
+    def test_slow_client_is_isolated_and_evicted(self):
+        async def scenario():
+            hub = WebSocketHub(queue_size=4, slow_seconds=0.05, send_timeout=10)
+            fast, slow = FakeSocket(), FakeSocket(stalled=True)
+            await hub.connect(fast)
+            await hub.connect(slow)
+            for i in range(10):
+                await hub.broadcast({"n": i})
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.05)
+            await hub.broadcast({"n": "last"})
+            await asyncio.sleep(0.01)
+            return hub, fast, slow
+
+        hub, fast, slow = asyncio.run(scenario())
+        self.assertEqual(len(fast.sent), 11) # Never held up by the stalled socket
+        self.assertNotIn(slow, hub.clients)
+        self.assertEqual(slow.closed, 1013)
+        self.assertEqual(hub.stats()["evicted"], 1)
+
+    def test_message_serialized_once(self):
+        async def scenario():
+            hub = WebSocketHub()
+            a, b = FakeSocket(), FakeSocket()
+            await hub.connect(a)
+            await hub.connect(b)
+            await hub.broadcast({"type": "log"})
+            await asyncio.sleep(0.01)
+            return a, b
+
+        a, b = asyncio.run(scenario())
+        self.assertIs(a.sent[0], b.sent[0])
+
+class FakeSnapshot:
+    def __init__(self, rows):
+        self.body = json.dumps([{"symbol": s, "value": v, "price": p} for s, (v, p) in rows.items()])
+
+class TestFrameCoalescer(unittest.TestCase):
+    def test_batches_and_market_deltas(self):
+        async def scenario():
+            hub = WebSocketHub()
+            snap = FakeSnapshot({"AUSDT": (1.0, 10.0), "BUSDT": (2.0, 20.0)})
+            co = FrameCoalescer(hub, snap)
+            all_ws, btc_ws = FakeSocket(), FakeSocket()
+            await hub.connect(all_ws)
+            await hub.connect(btc_ws)
+            co.subscribe(all_ws, {"action": "subscribe", "channels": ["trade_updates", "market_updates"]})
+            co.subscribe(btc_ws, {"action": "subscribe", "topics": ["pipeline", "stats", "market"], "symbols": ["B/USDT"]})
+            for i in range(3):
+                co.publish("pipeline_events", {"symbol": "A/USDT" if i < 2 else "BUSDT", "n": i})
+                co.publish("bot_stats", {"balance": i})
+            co.flush()
+            snap.body = FakeSnapshot({"AUSDT": (1.0, 10.0), "BUSDT": (2.5, 21.0)}).body
+            co.flush()
+            co.flush() # Nothing new: no frame
+            await asyncio.sleep(0.01)
+            return [json.loads(m) for m in all_ws.sent], [json.loads(m) for m in btc_ws.sent]
+
+        all_frames, btc_frames = asyncio.run(scenario())
+        self.assertEqual(len(all_frames), 2)
+        self.assertEqual([e["n"] for e in all_frames[0]["pipeline"]], [0, 1, 2]) # Every event, in order
+        self.assertNotIn("stats", all_frames[0]) # Not subscribed
+        self.assertTrue(all_frames[0]["market"]["full"])
+        self.assertEqual(all_frames[1]["market"], {"full": False, "d": {"BUSDT": [2.5, 21.0]}})
+
+        self.assertEqual([e["n"] for e in btc_frames[0]["pipeline"]], [2])
+        self.assertEqual(btc_frames[0]["stats"], {"balance": 2}) # Latest only
+        self.assertEqual(btc_frames[0]["market"]["d"], {"BUSDT": [2.0, 20.0]})
+        self.assertEqual(btc_frames[1]["market"]["d"], {"BUSDT": [2.5, 21.0]})
+
+    def test_dropped_frame_resyncs_market(self):
+        async def scenario():
+            hub = WebSocketHub(queue_size=1, slow_seconds=60)
+            snap = FakeSnapshot({"AUSDT": (1.0, 10.0)})
+            co = FrameCoalescer(hub, snap)
+            ws = FakeSocket(stalled=True) # Writer holds the first frame, the queue holds one more
+            client = await hub.connect(ws)
+            co.subscribe(ws, {"topics": ["market"]})
+            co.flush()
+            await asyncio.sleep(0.01)
+            for price in (11.0, 12.0): # Second delta pushes the first one out
+                snap.body = FakeSnapshot({"AUSDT": (1.0, price), "BUSDT": (2.0, price)}).body
+                co.flush()
+            synced_after_drop = client.market_synced
+            co.flush() # No market change, but the client gets the full market again
+            return client, synced_after_drop, [json.loads(client.queue.get_nowait())]
+
+        client, synced_after_drop, queued = asyncio.run(scenario())
+        self.assertEqual(client.dropped, 2)
+        self.assertFalse(synced_after_drop)
+        self.assertEqual(queued[0]["market"], {"full": True, "d": {"AUSDT": [1.0, 12.0], "BUSDT": [2.0, 12.0]}})
+        self.assertTrue(client.market_synced)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+import os
+import json
+import time
+import asyncio
+import logging
+
+from monitoring import metrics
+
+logger = logging.getLogger("API")
+
+# Coalesced live-update frames for dashboard WebSockets.
+# Redis pub/sub messages are buffered per topic and flushed every
+# WS_FRAME_INTERVAL seconds as one "batch" frame:
+#   pipeline, logs  - every event, in order (a client too far behind loses the
+#                     oldest frames, see web_api/ws_hub.py)
+#   stats           - latest value only
+#   market          - changed symbols only ({symbol: [change, price]}), a full
+#                     market on (re)subscribe or after a dropped frame, from
+#                     the heatmap snapshot cache
+# Clients pick topics / symbols with {"action": "subscribe", "topics": [...],
+# "symbols": [...]}; each distinct subscription gets its frame serialized once.
+
+WS_FRAME_INTERVAL = float(os.getenv("WS_FRAME_INTERVAL", 0.1)) # 10 frames / s
+
+CHANNEL_TOPICS = {"pipeline_events": "pipeline", "bot_logs": "logs", "bot_stats": "stats"}
+TOPICS = {"pipeline", "logs", "stats", "market"}
+DEFAULT_TOPICS = frozenset({"pipeline", "logs", "stats"})
+
+# Older dashboard channel names
+TOPIC_ALIASES = {"bot_status": "stats", "trade_updates": "pipeline", "market_updates": "market", "bot_logs": "logs"}
+
+WS_FRAMES = metrics.counter("ws_frames_total", "Batch frames queued to clients")
+WS_EVENTS = metrics.counter("ws_events_total", "Pub/sub messages coalesced into frames", ["topic"])
+
+
+def normalize_symbol(symbol):
+    return symbol.replace('/', '').upper()
+
+
+def market_delta(old, new):
+    """Returns ({symbol: row} changed or added, [symbols removed])."""
+    changed = {s: row for s, row in new.items() if old.get(s) != row}
+    removed = [s for s in old if s not in new]
+    return changed, removed
+
+
+class FrameCoalescer:
+    def __init__(self, hub, snapshot=None, interval=WS_FRAME_INTERVAL):
+        self.hub = hub
+        self.snapshot = snapshot # SnapshotCache (market topic)
+        self.interval = interval
+        self.pipeline = []
+        self.logs = []
+        self.stats = None
+        self.market = {} # symbol -> [change, price] as last sent
+        self.market_body = None
+        self.frames = 0
+
+    # --- Input ---
+    def publish(self, channel, payload):
+        topic = CHANNEL_TOPICS.get(channel)
+        if topic:
+            WS_EVENTS.labels(topic).inc()
+        if topic == "pipeline":
+            self.pipeline.append(payload)
+        elif topic == "logs":
+            self.logs.append(payload)
+        elif topic == "stats":
+            self.stats = payload # Latest wins
+
+    def subscribe(self, websocket, message):
+        client = self.hub.clients.get(websocket)
+        if client is None:
+            return
+        names = message.get("topics") or message.get("channels")
+        if names:
+            topics = {TOPIC_ALIASES.get(n, n) for n in names} & TOPICS
+            client.topics = frozenset(topics) or DEFAULT_TOPICS
+        symbols = message.get("symbols")
+        client.symbols = frozenset(normalize_symbol(s) for s in symbols) if symbols else None
+        client.market_synced = False # Resend the (filtered) full market
+        logger.info(f"WS Subscribe: topics={sorted(client.topics)} symbols={len(client.symbols or [])}")
+
+    # --- Output ---
+    def _market_update(self):
+        if self.snapshot is None or self.snapshot.body is self.market_body:
+            return {}, []
+        self.market_body = self.snapshot.body
+        new = {item["symbol"]: [item["value"], item["price"]] for item in json.loads(self.market_body)}
+        changed, removed = market_delta(self.market, new)
+        self.market = new
+        return changed, removed
+
+    @staticmethod
+    def _wanted(symbols, symbol):
+        return symbols is None or symbol == "ALL" or normalize_symbol(symbol or "") in symbols
+
+    def build_frame(self, topics, symbols, full_market, changed, removed, pipeline, logs, stats):
+        frame = {"type": "batch", "ts": time.time()}
+        if "pipeline" in topics:
+            events = [e for e in pipeline if self._wanted(symbols, e.get("symbol"))]
+            if events:
+                frame["pipeline"] = events
+        if "logs" in topics and logs:
+            frame["logs"] = logs
+        if "stats" in topics and stats is not None:
+            frame["stats"] = stats
+        if "market" in topics:
+            rows = self.market if full_market else changed
+            if symbols is not None:
+                rows = {s: r for s, r in rows.items() if s in symbols}
+            gone = [] if full_market else [s for s in removed if symbols is None or s in symbols]
+            if rows or gone or full_market:
+                frame["market"] = {"full": full_market, "d": rows}
+                if gone:
+                    frame["market"]["rm"] = gone
+        return frame if len(frame) > 2 else None
+
+    def flush(self):
+        pipeline, logs, stats = self.pipeline, self.logs, self.stats
+        self.pipeline, self.logs, self.stats = [], [], None
+        changed, removed = self._market_update()
+        if not self.hub.clients:
+            return 0
+
+        frames = {} # subscription -> serialized frame (or None), built once per group
+        sent = 0
+        for client in list(self.hub.clients.values()):
+            full_market = "market" in client.topics and not client.market_synced
+            key = (client.topics, client.symbols, full_market)
+            if key not in frames:
+                frame = self.build_frame(client.topics, client.symbols, full_market, changed, removed, pipeline, logs, stats)
+                frames[key] = json.dumps(frame, separators=(',', ':')) if frame else None
+            if frames[key] is not None:
+                self.hub.send(client, frames[key]) # Drops the client's oldest frame when it is behind
+                sent += 1
+            if full_market:
+                client.market_synced = True # After send: a full market supersedes any dropped delta
+        self.frames += sent
+        WS_FRAMES.inc(sent)
+        return sent
+
+    async def run(self):
+        logger.info(f"Frame Coalescer Running ({1 / self.interval:.0f} frames/s)...")
+        while True:
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Frame Coalescer Error: {e}")
+            await asyncio.sleep(self.interval)
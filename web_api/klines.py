@@ -0,0 +1,148 @@
+import os
+import gzip
+import json
+import time
+import sqlite3
+import asyncio
+import numpy as np
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+
+from common.sqlite_pool import ReadOnlyPool
+
+# Historical candles from the collector's SQLite `klines` table.
+# Range queries walk the (symbol, timeframe, timestamp) primary key on a small
+# pool of read-only connections, off the event loop. A range with more candles
+# than the chart can draw (`points`) is downsampled here:
+#   ohlc - min-max buckets: first open, max high, min low, last close, summed volume
+#   lttb - Largest-Triangle-Three-Buckets on close, returns original candles
+# Full-resolution ranges above KLINES_STREAM_ROWS are streamed in batches;
+# other bodies are gzipped when the client accepts it.
+
+DB_PATH = os.getenv("DB_PATH", "exhaustion_bot.db")
+KLINES_POOL_SIZE = int(os.getenv("KLINES_POOL_SIZE", 4))
+KLINES_DEFAULT_POINTS = 800
+KLINES_MAX_POINTS = 5000
+KLINES_MAX_ROWS = int(os.getenv("KLINES_MAX_ROWS", 200000)) # Full resolution cap per request
+KLINES_STREAM_ROWS = int(os.getenv("KLINES_STREAM_ROWS", 5000))
+KLINES_STREAM_BATCH = 2000
+KLINES_GZIP_MIN = 1024
+
+TIMEFRAME_MS = {"5m": 300_000, "15m": 900_000, "1h": 3_600_000, "4h": 14_400_000}
+RANGE_SQL = (
+    "SELECT timestamp, open, high, low, close, volume FROM klines "
+    "WHERE symbol = ? AND timeframe = ? AND timestamp >= ? AND timestamp < ? ORDER BY timestamp"
+)
+COUNT_SQL = "SELECT COUNT(*) FROM klines WHERE symbol = ? AND timeframe = ? AND timestamp >= ? AND timestamp < ?"
+
+
+def _dumps(obj):
+    return json.dumps(obj, separators=(',', ':'))
+
+
+def minmax_ohlc(rows, points):
+    """Merges consecutive candles into `points` buckets, keeping every high / low extreme."""
+    n = len(rows)
+    if points <= 0 or n <= points:
+        return [list(r) for r in rows]
+    a = np.asarray(rows, dtype=float)
+    starts = (np.arange(points) * n) // points # Strictly increasing since n > points
+    ends = np.append(starts[1:], n) - 1
+    out = np.empty((points, 6))
+    out[:, 0] = a[starts, 0]
+    out[:, 1] = a[starts, 1]
+    out[:, 2] = np.maximum.reduceat(a[:, 2], starts)
+    out[:, 3] = np.minimum.reduceat(a[:, 3], starts)
+    out[:, 4] = a[ends, 4]
+    out[:, 5] = np.add.reduceat(a[:, 5], starts)
+    return [[int(r[0]), *r[1:]] for r in out.tolist()]
+
+
+def lttb(rows, points):
+    """Largest-Triangle-Three-Buckets over close: picks `points` original candles that keep the line's shape."""
+    n = len(rows)
+    if points < 3 or n <= points:
+        return [list(r) for r in rows]
+    a = np.asarray(rows, dtype=float)
+    x, y = a[:, 0], a[:, 4]
+    every = (n - 2) / (points - 2)
+    keep = [0]
+    prev = 0
+    for i in range(points - 2):
+        lo, hi = int(i * every) + 1, int((i + 1) * every) + 1
+        nlo, nhi = hi, min(int((i + 2) * every) + 1, n)
+        avg_x, avg_y = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        # Twice the triangle area (prev kept point, candidate, next bucket average)
+        area = np.abs((x[prev] - avg_x) * (y[lo:hi] - y[prev]) - (x[prev] - x[lo:hi]) * (avg_y - y[prev]))
+        prev = lo + int(area.argmax())
+        keep.append(prev)
+    keep.append(n - 1)
+    return [list(rows[k]) for k in keep]
+
+
+REDUCERS = {"ohlc": minmax_ohlc, "lttb": lttb}
+
+
+class KlineStore:
+    def __init__(self, db_path=DB_PATH, pool_size=KLINES_POOL_SIZE):
+        self.pool = ReadOnlyPool(db_path, pool_size)
+
+    def close(self):
+        self.pool.close()
+
+    # --- Queries (worker thread) ---
+    def query(self, symbol, timeframe, start, end, points, mode):
+        """(rows, downsampled); rows is None when a full-resolution range should be streamed."""
+        args = (symbol, timeframe, start, end)
+        with self.pool.connection() as conn:
+            count = conn.execute(COUNT_SQL, args).fetchone()[0]
+            if not points and count > KLINES_MAX_ROWS:
+                raise HTTPException(status_code=400, detail=f"{count} candles in range (max {KLINES_MAX_ROWS}), pass points or narrow the range")
+            if not points and count > KLINES_STREAM_ROWS:
+                return None, False
+            rows = conn.execute(RANGE_SQL, args).fetchall()
+        if points and len(rows) > points:
+            return REDUCERS[mode](rows, points), True
+        return rows, False
+
+    def stream(self, meta, symbol, timeframe, start, end):
+        # Sync generator: Starlette iterates it in its threadpool
+        with self.pool.connection() as conn:
+            cur = conn.execute(RANGE_SQL, (symbol, timeframe, start, end))
+            yield _dumps(meta)[:-1] + ',"candles":['
+            sep = ""
+            while True:
+                batch = cur.fetchmany(KLINES_STREAM_BATCH)
+                if not batch:
+                    break
+                yield sep + _dumps(batch)[1:-1]
+                sep = ","
+            yield "]}"
+
+    async def response(self, request: Request, symbol, timeframe="1h", start=None, end=None, points=KLINES_DEFAULT_POINTS, mode="ohlc"):
+        tf_ms = TIMEFRAME_MS.get(timeframe)
+        if tf_ms is None:
+            raise HTTPException(status_code=400, detail=f"Unknown timeframe {timeframe} (one of {list(TIMEFRAME_MS)})")
+        if mode not in REDUCERS:
+            raise HTTPException(status_code=400, detail=f"Unknown mode {mode} (one of {list(REDUCERS)})")
+        points = max(0, min(points, KLINES_MAX_POINTS))
+        symbol = symbol.replace('/', '').upper()
+        end = end if end is not None else int(time.time() * 1000)
+        start = start if start is not None else end - (points or KLINES_DEFAULT_POINTS) * tf_ms # One screen by default
+        if start >= end:
+            raise HTTPException(status_code=400, detail="start must be before end")
+
+        meta = {"symbol": symbol, "timeframe": timeframe, "start": start, "end": end}
+        try:
+            rows, downsampled = await asyncio.to_thread(self.query, symbol, timeframe, start, end, points, mode)
+        except sqlite3.OperationalError as e:
+            raise HTTPException(status_code=503, detail=f"Klines DB unavailable: {e}")
+        if rows is None:
+            return StreamingResponse(self.stream({**meta, "downsampled": False}, symbol, timeframe, start, end),
+                                     media_type="application/json")
+        body = _dumps({**meta, "downsampled": downsampled, "candles": rows}).encode()
+        headers = {"Vary": "Accept-Encoding"}
+        if len(body) >= KLINES_GZIP_MIN and "gzip" in request.headers.get("accept-encoding", ""):
+            body = gzip.compress(body, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+        return Response(content=body, media_type="application/json", headers=headers)
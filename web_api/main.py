@@ -3,24 +3,43 @@ import asyncio
 import json
 import logging
 import time
+import sqlite3
 import redis.asyncio as redis
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from fastapi.routing import APIRoute
 
+from common.streams import StreamQueue, dead_stream, CANDIDATES_STREAM, CANDIDATES_GROUP, ORDERS_STREAM, ORDERS_GROUP
+from monitoring import metrics
+from supervisor import WORKER_NAMES, WORKER_HEARTBEAT_KEY, WORKER_HEARTBEAT_TIMEOUT, heartbeat_loop
+from common.kill_switch import KILL_SWITCH_KEY, set_kill_switch
+from web_api.snapshot import SnapshotCache
+from web_api.ws_hub import WebSocketHub
+from web_api.coalescer import FrameCoalescer
+from web_api.klines import KlineStore, KLINES_DEFAULT_POINTS
+from common.sqlite_pool import ReadOnlyPool
+from scanner.rules import load_universe, explain as explain_universe
+from execution.ledger import LEDGER_DB_PATH, STATS_SORTS, ledger_stats, ledger_stats_page, ledger_trades
+
+# RUN_ENGINES=1: engines run as tasks inside this process (server.py / uvicorn alone).
+# RUN_ENGINES=0: thin read-only front end, engines run as supervisor.py worker processes.
+RUN_ENGINES = os.getenv("RUN_ENGINES", "1") == "1"
+
 # Import Core Engines
 # These imports work because we run from the project root (server.py)
-try:
-    from collector.collector import MarketCollector
-    from scanner.scanner import MarketScanner
-    from engine.decision import DecisionEngine
-    from execution.executor import TradeExecutor
-    from monitoring.telegram_bot import start_telegram_bot # Import Bot
-    IMPORTS_OK = True
-except ImportError as e:
-    print(f"CRITICAL IMPORT ERROR: {e}")
-    IMPORTS_OK = False
+IMPORTS_OK = False
+if RUN_ENGINES:
+    try:
+        from collector.collector import MarketCollector
+        from scanner.scanner import MarketScanner
+        from engine.decision import DecisionEngine
+        from execution.executor import TradeExecutor
+        from monitoring.telegram_bot import start_telegram_bot # Import Bot
+        IMPORTS_OK = True
+    except ImportError as e:
+        print(f"CRITICAL IMPORT ERROR: {e}")
 
 # Logging
 logging.basicConfig(level=logging.INFO)
@@ -31,30 +50,20 @@ REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
 REDIS_URL = f"redis://{REDIS_HOST}:{REDIS_PORT}"
 
-# --- WebSocket Manager ---
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: list[WebSocket] = []
-    
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-        logger.info(f"WS Client Connected. Total: {len(self.active_connections)}")
-    
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-        logger.info(f"WS Client Disconnected. Total: {len(self.active_connections)}")
-
-    async def broadcast(self, message: dict):
-        data = json.dumps(message)
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(data)
-            except Exception as e:
-                logger.error(f"WS Broadcast Error: {e}")
+# Metrics
+API_REQUEST_SECONDS = metrics.histogram("api_request_seconds", "HTTP handler latency", ["method", "route"])
+STREAM_LENGTH = metrics.gauge("stream_length", "Entries in a Redis stream (sampled on scrape)", ["stream"])
+STREAM_PENDING = metrics.gauge("stream_pending", "Delivered but un-ACKed entries (sampled on scrape)", ["stream"])
+WS_CLIENTS = metrics.gauge("ws_clients", "Connected dashboard WebSockets")
+WS_QUEUED = metrics.gauge("ws_queued_frames", "Frames waiting in client queues")
 
-manager = ConnectionManager()
+# --- WebSocket Hub (per-client queues + writer tasks) ---
+manager = WebSocketHub()
 redis_client = None
+market_snapshot = None
+coalescer = None
+kline_store = KlineStore() # Read-only SQLite pool, connects on first request
+ledger_pool = ReadOnlyPool(LEDGER_DB_PATH) # Trade ledger (written by the executor)
 
 # Background Task References
 collector = None
@@ -62,47 +71,23 @@ scanner = None
 engine = None
 executor = None
 
-async def scanner_loop(scanner_instance):
-    logger.info("Scanner Loop Started")
-    while True:
-        try:
-            status = await redis_client.get("bot_status")
-            if status == "active":
-                logger.info("Running Scan...")
-                await scanner_instance.scan()
-            else:
-                logger.info("Scanner Idle (Bot Paused)")
-            
-            await asyncio.sleep(60 * 15) # Scan every 15 Minutes
-        except asyncio.CancelledError:
-            break
-        except Exception as e:
-            logger.error(f"Scanner Loop Error: {e}")
-            await asyncio.sleep(60)
-
 async def redis_event_listener():
-    """Listens to Redis PubSub channels and broadcasts to WebSockets"""
+    """Listens to Redis PubSub channels and hands messages to the frame coalescer (batched per interval)"""
     logger.info("Starting Redis Event Listener (Bridge)...")
     pubsub = redis_client.pubsub()
     await pubsub.subscribe("pipeline_events", "bot_logs", "bot_stats")
     
     async for message in pubsub.listen():
         if message['type'] == 'message':
-            channel = message['channel']
-            data = message['data']
-            # Broadcast to WS
-            if channel == "pipeline_events":
-                await manager.broadcast({"type": "pipeline_event", "payload": json.loads(data)})
-            elif channel == "bot_logs":
-                await manager.broadcast({"type": "log", "payload": json.loads(data)})
-            elif channel == "bot_stats":
-                # NEW: Stats Update
-                await manager.broadcast({"type": "stats_update", "payload": json.loads(data)})
+            try:
+                coalescer.publish(message['channel'], json.loads(message['data']))
+            except ValueError as e:
+                logger.error(f"Bad Event on {message['channel']}: {e}")
 
 # --- Lifespan Manager (The Brain) ---
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global redis_client, collector, scanner, engine, executor
+    global redis_client, market_snapshot, coalescer, collector, scanner, engine, executor
     
     logger.info(">>> STARTING BOT SYSTEMS <<<")
     
@@ -123,6 +108,21 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"Redis Connection Failed: {e}")
 
+    # Heatmap served from memory (collector rebuilds the snapshot a few times per second)
+    market_snapshot = SnapshotCache(redis_client)
+    asyncio.create_task(market_snapshot.run())
+    # Live updates: batched WS frames (10/s) instead of one frame per Redis message
+    coalescer = FrameCoalescer(manager, market_snapshot)
+    asyncio.create_task(coalescer.run())
+
+    if redis_client:
+        asyncio.create_task(redis_event_listener()) # Bridge Redis -> WebSocket
+
+    if not RUN_ENGINES:
+        logger.info("API-only mode: engines run under supervisor.py")
+        if redis_client:
+            asyncio.create_task(heartbeat_loop(redis_client, "api", time.time()))
+
     # 1.5 Start Telegram Bot (Singleton via Redis Lock)
     if IMPORTS_OK and redis_client:
         # Try to acquire a lock for 10 seconds (just to check), but real logic is "am I the leader?"
@@ -164,11 +164,10 @@ async def lifespan(app: FastAPI):
         asyncio.create_task(collector.run())     # Data Collection Loop
         asyncio.create_task(engine.run())        # Decision Engine Loop
         asyncio.create_task(executor.run())      # Trade Execution Loop
-        asyncio.create_task(scanner_loop(scanner)) # Scanner Loop
-        asyncio.create_task(redis_event_listener()) # NEW: Bridge Redis -> WebSocket
+        asyncio.create_task(scanner.run())       # Scanner Loop
         
         logger.info("All Bot Engines Launched.")
-    else:
+    elif RUN_ENGINES:
         logger.warning("ENGINES NOT STARTED DUE TO IMPORT ERRORS")
     
     yield # API Runs Here
@@ -177,6 +176,8 @@ async def lifespan(app: FastAPI):
     if collector: await collector.close()
     if executor: await executor.close()
     if redis_client: await redis_client.close()
+    kline_store.close()
+    ledger_pool.close()
 
 # --- FastAPI App ---
 app = FastAPI(title="Exhaustion Bot API", description="Trading Bot Backend", lifespan=lifespan)
@@ -189,6 +190,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    t0 = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    # Route template (not the raw path) keeps label cardinality bounded
+    API_REQUEST_SECONDS.labels(request.method, route.path if route else "unmatched").observe(time.perf_counter() - t0)
+    return response
+
 # --- Routes ---
 
 @app.get("/")
@@ -196,7 +206,7 @@ async def root():
     return {
         "status": "online",
         "system": "Exhaustion Bot",
-        "components": ["Collector", "Scanner", "Engine", "Executor"] if IMPORTS_OK else ["IMPORTS_FAILED"]
+        "components": ["Collector", "Scanner", "Engine", "Executor"] if IMPORTS_OK else ["IMPORTS_FAILED"] if RUN_ENGINES else ["Supervised"]
     }
 
 @app.api_route("/health", methods=["GET", "HEAD"])
@@ -214,6 +224,8 @@ async def start_bot():
     logger.info("ENDPOINT CALL: /control/start")
     if not redis_client: return {"error": "No Redis"}
     await redis_client.set("bot_status", "active")
+    if await redis_client.get(KILL_SWITCH_KEY) == "1":
+        await set_kill_switch(redis_client, False, "api /control/start")
     await manager.broadcast({"type": "status_change", "status": "active"})
     return {"status": "active"}
 
@@ -225,32 +237,127 @@ async def stop_bot():
     await manager.broadcast({"type": "status_change", "status": "offline"})
     return {"status": "offline"}
 
+@app.post("/control/kill")
+async def kill_bot():
+    """Kill switch: stops every loop and flattens all positions (executor reports time-to-flat)."""
+    logger.info("ENDPOINT CALL: /control/kill")
+    if not redis_client: return {"error": "No Redis"}
+    await set_kill_switch(redis_client, True, "api /control/kill")
+    await redis_client.set("bot_status", "offline")
+    await manager.broadcast({"type": "status_change", "status": "offline"})
+    return {"status": "killed"}
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus scrape: this process plus every worker that published to prom:{worker}."""
+    ws_stats = manager.stats()
+    WS_CLIENTS.set(ws_stats["clients"])
+    WS_QUEUED.set(ws_stats["queued"])
+    families = None
+    if redis_client:
+        try:
+            pipe = redis_client.pipeline()
+            for stream, group in ((CANDIDATES_STREAM, CANDIDATES_GROUP), (ORDERS_STREAM, ORDERS_GROUP)):
+                pipe.xlen(stream)
+                pipe.xpending(stream, group)
+            for stream in (CANDIDATES_STREAM, ORDERS_STREAM):
+                pipe.xlen(dead_stream(stream)) # Entries that exhausted STREAM_MAX_DELIVERIES
+            results = await pipe.execute(raise_on_error=False)
+            for i, stream in enumerate((CANDIDATES_STREAM, ORDERS_STREAM)):
+                length, pending = results[2 * i], results[2 * i + 1]
+                if not isinstance(length, Exception):
+                    STREAM_LENGTH.labels(stream).set(length)
+                if isinstance(pending, dict):
+                    STREAM_PENDING.labels(stream).set(pending.get("pending", 0))
+            for stream, length in zip((CANDIDATES_STREAM, ORDERS_STREAM), results[4:]):
+                if not isinstance(length, Exception):
+                    STREAM_LENGTH.labels(dead_stream(stream)).set(length)
+            families = await metrics.collect_all(redis_client)
+        except Exception as e:
+            logger.error(f"Metrics Error: {e}")
+    if families is None:
+        families = await metrics.collect_all()
+    return PlainTextResponse(metrics.render(families), media_type="text/plain; version=0.0.4")
+
 # Heatmap Endpoint for Dashboard
 @app.get("/insights/heatmap")
-async def get_heatmap():
-    if not redis_client: return []
+async def get_heatmap(request: Request):
+    # Precomputed snapshot (ETag / 304, gzip): no Redis round trip per request
+    if not market_snapshot: return []
+    return market_snapshot.response(request)
+
+@app.get("/klines/{symbol}")
+async def get_klines(request: Request, symbol: str, timeframe: str = "1h", start: int = None, end: int = None,
+                     points: int = KLINES_DEFAULT_POINTS, mode: str = "ohlc"):
+    """Historical candles for [start, end) (epoch ms), downsampled to `points` (0 = full resolution)."""
+    return await kline_store.response(request, symbol, timeframe, start, end, points, mode)
+
+@app.get("/scanner/explain")
+async def scanner_explain(symbol: str = None, top: int = 50):
+    """Why (not) a candidate: every scanner filter for every symbol (the scan's own rules), nearest misses first."""
+    if not redis_client: return {"error": "No Redis"}
+    universe = await load_universe(redis_client, [symbol.replace('/', '').upper()] if symbol else None)
+    return explain_universe(universe, symbol=symbol, top=max(top, 0) or None)
+
+# --- Trade Ledger (SQLite, aggregates maintained by the executor) ---
+ANALYTICS_SCOPES = {"daily": "day", "symbols": "symbol", "accounts": "account"}
+
+async def ledger_query(fn, *args):
+    def run():
+        with ledger_pool.connection() as conn:
+            return fn(conn, *args)
     try:
-        keys = await redis_client.keys("metrics:*")
-        data = []
-        for k in keys:
-            symbol = k.split(":")[1]
-            # OLD: raw = await redis_client.get(k); m = json.loads(raw)
-            # NEW: Redis Hash
-            m = await redis_client.hgetall(k)
-            
-            if m:
-                # Prefer change_24h (Stream) -> change_4h (Poll) -> 0
-                change_val = float(m.get("change_24h", m.get("change_4h", 0)))
-                
-                data.append({
-                    "symbol": symbol,
-                    "value": round(change_val, 2),
-                    "price": float(m.get("price", 0))
-                })
-        return data
-    except Exception as e:
-        logger.error(f"Heatmap Error: {e}")
-        return []
+        return await asyncio.to_thread(run)
+    except sqlite3.OperationalError as e:
+        raise HTTPException(status_code=503, detail=f"Trade ledger unavailable: {e}")
+
+@app.get("/analytics/summary")
+async def analytics_summary(symbol: str = None, account: str = None):
+    """Win rate, PnL, average R (overall, or for one symbol / account): a single primary-key read."""
+    if symbol:
+        return await ledger_query(ledger_stats, "symbol", symbol.replace('/', '').upper())
+    if account:
+        return await ledger_query(ledger_stats, "account", account)
+    return await ledger_query(ledger_stats)
+
+@app.get("/analytics/{breakdown}")
+async def analytics_breakdown(breakdown: str, limit: int = 30, offset: int = 0, sort: str = "key"):
+    """Per day / symbol / account aggregates, paginated (`sort`: key, pnl, trades, win_rate)."""
+    scope = ANALYTICS_SCOPES.get(breakdown)
+    if scope is None:
+        raise HTTPException(status_code=404, detail=f"Unknown breakdown {breakdown} (one of {list(ANALYTICS_SCOPES)})")
+    if sort not in STATS_SORTS:
+        raise HTTPException(status_code=400, detail=f"Unknown sort {sort} (one of {list(STATS_SORTS)})")
+    return await ledger_query(ledger_stats_page, scope, max(1, min(limit, 500)), max(0, offset), sort)
+
+@app.get("/trades")
+async def get_trades(limit: int = 50, before: int = None, symbol: str = None, account: str = None, status: str = None):
+    """Trade history, newest first; pass `next` from the previous page as `before`."""
+    if symbol:
+        symbol = symbol.replace('/', '').upper()
+    return await ledger_query(ledger_trades, max(1, min(limit, 500)), before, symbol, account, status)
+
+@app.get("/workers")
+async def get_workers():
+    """Supervised worker health from their Redis heartbeats."""
+    if not redis_client: return {"error": "No Redis"}
+    pipe = redis_client.pipeline()
+    for name in WORKER_NAMES:
+        pipe.hgetall(WORKER_HEARTBEAT_KEY.format(name))
+    beats = await pipe.execute()
+    now = time.time()
+    workers = {}
+    for name, beat in zip(WORKER_NAMES, beats):
+        if not beat:
+            workers[name] = {"status": "embedded" if RUN_ENGINES else "down"}
+            continue
+        age = now - float(beat["ts"]) if "ts" in beat else None
+        workers[name] = {
+            **beat,
+            "heartbeat_age": round(age, 1) if age is not None else None,
+            "status": "up" if age is not None and age < WORKER_HEARTBEAT_TIMEOUT else "stale"
+        }
+    return workers
 
 @app.get("/debug/system")
 async def debug_system():
@@ -273,8 +380,13 @@ async def debug_system():
         try:
             stats["data_counts"]["metrics"] = len(await redis_client.keys("metrics:*"))
             stats["data_counts"]["klines"] = len(await redis_client.keys("klines:*"))
-            stats["data_counts"]["orders"] = await redis_client.llen("execution:orders")
+            stats["data_counts"]["candidates"] = await redis_client.xlen(CANDIDATES_STREAM)
+            stats["data_counts"]["orders"] = await redis_client.xlen(ORDERS_STREAM)
             stats["bot_status"] = await redis_client.get("bot_status")
+            stats["websockets"] = {**manager.stats(), "frames": coalescer.frames if coalescer else 0}
+            stats["ai_cache"] = await redis_client.hgetall("ai_cache:stats")
+            if engine:
+                stats["ai_gateway"] = engine.pattern_analyzer.gateway.snapshot()
         except Exception as e:
             stats["redis_error"] = str(e)
             
@@ -298,7 +410,7 @@ async def debug_trade():
         "scores": {"debug": 100}
     }
     
-    await redis_client.lpush("execution:orders", json.dumps(signal))
+    await StreamQueue(redis_client, ORDERS_STREAM, ORDERS_GROUP).push(json.dumps(signal))
     logger.info(" injected DEBUG signal")
     return {"status": "injected", "signal": signal}
 
@@ -362,9 +474,17 @@ async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
     try:
         while True:
-            await websocket.receive_text()
-            # Keep connection open
+            text = await websocket.receive_text()
+            # {"action": "subscribe", "topics": [...], "symbols": [...]}
+            try:
+                message = json.loads(text)
+            except ValueError:
+                continue
+            if isinstance(message, dict) and message.get("action") == "subscribe" and coalescer:
+                coalescer.subscribe(websocket, message)
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
+        pass
     except Exception as e:
         logger.error(f"WS Error: {e}")
+    finally:
+        manager.disconnect(websocket) # No-op if the hub already evicted it
@@ -0,0 +1,68 @@
+import gzip
+import asyncio
+import hashlib
+import logging
+from fastapi import Request, Response
+
+from common.market_snapshot import MARKET_SNAPSHOT_KEY, MARKET_SNAPSHOT_VERSION_KEY
+
+logger = logging.getLogger("API")
+
+# In-process copy of the collector's market snapshot.
+# Refreshed in the background (version check, body only when it changed); the
+# ETag and gzip body are computed once per refresh, so a heatmap request is a
+# dict lookup: 304 if the client already has it, else the pre-encoded bytes.
+
+SNAPSHOT_REFRESH_INTERVAL = 0.25
+
+
+class SnapshotCache:
+    def __init__(self, redis_client, key=MARKET_SNAPSHOT_KEY, version_key=MARKET_SNAPSHOT_VERSION_KEY,
+                 interval=SNAPSHOT_REFRESH_INTERVAL):
+        self.redis = redis_client
+        self.key = key
+        self.version_key = version_key
+        self.interval = interval
+        self.version = None
+        self.load("[]")
+
+    def load(self, body):
+        self.body = body.encode() if isinstance(body, str) else body
+        self.gzipped = gzip.compress(self.body, compresslevel=5)
+        digest = hashlib.blake2b(self.body, digest_size=8).hexdigest()
+        # Strong ETags: gzip and identity bodies are different representations (RFC 9110)
+        self.etag = f'"{digest}"'
+        self.etag_gzip = f'"{digest}-gz"'
+
+    async def refresh(self):
+        version = await self.redis.get(self.version_key)
+        if version is None or version == self.version:
+            return False
+        body = await self.redis.get(self.key)
+        if body is None:
+            return False
+        self.load(body)
+        self.version = version
+        return True
+
+    async def run(self):
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Snapshot Refresh Error: {e}")
+                await asyncio.sleep(1)
+            await asyncio.sleep(self.interval)
+
+    def response(self, request: Request):
+        gzipped = "gzip" in request.headers.get("accept-encoding", "")
+        etag = self.etag_gzip if gzipped else self.etag
+        headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+        if etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=headers)
+        if gzipped:
+            headers["Content-Encoding"] = "gzip"
+            return Response(content=self.gzipped, media_type="application/json", headers=headers)
+        return Response(content=self.body, media_type="application/json", headers=headers)
@@ -0,0 +1,125 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from fastapi import WebSocket
+
+from web_api.coalescer import DEFAULT_TOPICS
+from monitoring import metrics
+
+logger = logging.getLogger("API")
+
+# WebSocket broadcast hub.
+# Every client gets a bounded outbound queue drained by its own writer task, so
+# broadcast() never awaits a socket: it serializes the message once and puts the
+# same string on each queue. A client whose queue stays full for longer than
+# WS_SLOW_CLIENT_SECONDS (oldest frames are dropped meanwhile, and its market
+# view is resent in full), or whose send times out / fails, is evicted.
+
+WS_QUEUE_SIZE = int(os.getenv("WS_QUEUE_SIZE", 256))
+WS_SLOW_CLIENT_SECONDS = float(os.getenv("WS_SLOW_CLIENT_SECONDS", 10))
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", 5))
+
+WS_EVICTIONS = metrics.counter("ws_evictions_total", "Slow / dead WebSocket clients evicted")
+WS_DROPPED = metrics.counter("ws_dropped_frames_total", "Frames dropped for clients behind (oldest first)")
+
+
+class HubClient:
+    def __init__(self, websocket, maxsize):
+        self.websocket = websocket
+        self.queue = asyncio.Queue(maxsize)
+        self.behind_since = None # Queue full since (monotonic)
+        self.dropped = 0
+        self.writer = None
+        # Subscription (FrameCoalescer.subscribe)
+        self.topics = DEFAULT_TOPICS
+        self.symbols = None # None = all
+        self.market_synced = False
+
+
+class WebSocketHub:
+    def __init__(self, queue_size=WS_QUEUE_SIZE, slow_seconds=WS_SLOW_CLIENT_SECONDS, send_timeout=WS_SEND_TIMEOUT):
+        self.queue_size = queue_size
+        self.slow_seconds = slow_seconds
+        self.send_timeout = send_timeout
+        self.clients = {} # websocket -> HubClient
+        self.evicted = 0
+
+    @property
+    def active_connections(self):
+        return list(self.clients)
+
+    async def connect(self, websocket: WebSocket):
+        await websocket.accept()
+        client = HubClient(websocket, self.queue_size)
+        client.writer = asyncio.create_task(self._writer(client))
+        self.clients[websocket] = client
+        logger.info(f"WS Client Connected. Total: {len(self.clients)}")
+        return client
+
+    def disconnect(self, websocket: WebSocket):
+        client = self.clients.pop(websocket, None)
+        if client is None:
+            return # Already evicted
+        if client.writer and client.writer is not asyncio.current_task():
+            client.writer.cancel()
+        logger.info(f"WS Client Disconnected. Total: {len(self.clients)}")
+
+    async def evict(self, client, reason):
+        if client.websocket not in self.clients:
+            return
+        self.evicted += 1
+        WS_EVICTIONS.inc()
+        logger.warning(f"WS Client Evicted ({reason}), {client.dropped} frames dropped")
+        self.disconnect(client.websocket)
+        try:
+            await client.websocket.close(code=1013) # Try again later
+        except Exception:
+            pass
+
+    async def _writer(self, client):
+        ws = client.websocket
+        try:
+            while True:
+                data = await client.queue.get()
+                await asyncio.wait_for(ws.send_text(data), self.send_timeout)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            await self.evict(client, f"send failed: {e!r}")
+
+    def send(self, client, data):
+        """Queues an already serialized frame for one client (never blocks)."""
+        try:
+            client.queue.put_nowait(data)
+            client.behind_since = None
+            return
+        except asyncio.QueueFull:
+            pass
+        now = time.monotonic()
+        if client.behind_since is None:
+            client.behind_since = now
+        elif now - client.behind_since > self.slow_seconds:
+            asyncio.create_task(self.evict(client, f"behind for {now - client.behind_since:.0f}s"))
+            return
+        # Still within grace: keep the newest frames
+        client.queue.get_nowait()
+        client.dropped += 1
+        WS_DROPPED.inc()
+        client.market_synced = False # The dropped frame may hold a market delta: resend the full market
+        client.queue.put_nowait(data)
+
+    async def broadcast(self, message: dict):
+        data = json.dumps(message) # Once, shared by every queue
+        for client in list(self.clients.values()):
+            self.send(client, data)
+
+    def stats(self):
+        return {
+            "clients": len(self.clients),
+            "queued": sum(c.queue.qsize() for c in self.clients.values()),
+            "behind": sum(1 for c in self.clients.values() if c.behind_since is not None),
+            "dropped": sum(c.dropped for c in self.clients.values()),
+            "evicted": self.evicted
+        }